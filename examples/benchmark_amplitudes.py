@@ -0,0 +1,29 @@
+from livepng import LivePNG, amplitude
+from pydub import AudioSegment
+import time, sys
+
+# Compare the pure Python and the NumPy amplitude engines
+audio_file = sys.argv[1] if len(sys.argv) > 1 else "audio/kuri.wav"
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+audio = AudioSegment.from_file(audio_file)
+# Repeat the audio to simulate a long clip
+samples = audio.get_array_of_samples() * repeat
+print("Samples: {}, duration: {:.1f}s".format(len(samples), len(samples) / audio.frame_rate))
+
+model = LivePNG("models/kurisu/model.json")
+results = {}
+for use_numpy in (False, True):
+    if use_numpy and not amplitude.has_numpy():
+        print("NumPy is not installed, skipping")
+        continue
+    start = time.perf_counter()
+    results[use_numpy] = amplitude.calculate_amplitudes(audio.frame_rate, samples, frame_rate=10, use_numpy=use_numpy)
+    elapsed = time.perf_counter() - start
+    print("{}: {:.3f}s".format("NumPy" if use_numpy else "Python", elapsed))
+
+if len(results) == 2:
+    print("Identical results: {}".format(results[False] == results[True]))
+start = time.perf_counter()
+model.calculate_frames(audio.frame_rate, samples, frame_rate=10)
+print("calculate_frames: {:.3f}s".format(time.perf_counter() - start))
@@ -0,0 +1,87 @@
+from livepng import ModelDefinition
+from livepng.objects import Style
+from livepng.thresholds import calculate_intervals, get_raw_images, get_raw_variants
+import json, time, sys, tracemalloc
+
+# Compare the memory used by the styles, expressions and variants of many loaded models
+# with the dict backed objects used before __slots__ and interning, then measure the whole definitions.
+# The definitions are not shared, every model is parsed again
+model_file = sys.argv[1] if len(sys.argv) > 1 else "models/kurisu/model.json"
+count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+class DictVariant:
+    """Variant as it was stored before: an instance dict, a list of the strings parsed from the json,
+    the thresholds of every image and its own lookup table"""
+
+    def __init__(self, name: str, images: list) -> None:
+        self.name = name
+        self.images = list(images)
+        self.thresholds = dict(zip(self.images, calculate_intervals(len(self.images))))
+        intervals = [self.thresholds[image] for image in self.images]
+        self.boundaries = sorted(set(bound for interval in intervals for bound in interval))
+        self.segments = []
+        for start, end in zip(self.boundaries, self.boundaries[1:]):
+            self.segments.append(next((i for i, (low, high) in enumerate(intervals) if low <= start and end <= high), 0))
+
+
+class DictExpression:
+    def __init__(self, name: str, variants: dict) -> None:
+        self.name = name
+        self.variants = {variant: DictVariant(variant, get_raw_images(images)) for variant, images in get_raw_variants(variants).items()}
+
+
+class DictStyle:
+    def __init__(self, name: str, style: dict) -> None:
+        self.name = name
+        self.lazy = False
+        self.expressions = {expression: DictExpression(expression, variants) for expression, variants in style["expressions"].items()}
+
+
+def build_slots(name: str, style: dict) -> Style:
+    result = Style(name, style["expressions"])
+    # Create the data used while speaking
+    for expression in result.get_expressions().values():
+        expression.get_default_variant()
+        for variant in expression.get_variants().values():
+            variant.get_image_index(0.0)
+    return result
+
+
+def measure_styles(build) -> int:
+    """Parse the model count times and keep only its styles, returns the bytes used by the styles of every model"""
+    tracemalloc.start()
+    catalogs = []
+    for _ in range(count):
+        with open(model_file) as f:
+            model_info = json.load(f)
+        catalogs.append([build(name, style) for name, style in model_info["styles"].items()])
+        del model_info
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+baseline = measure_styles(DictStyle)
+slots = measure_styles(build_slots)
+print("Styles of {} models".format(count))
+print("Dict backed: {:.1f}KiB per model".format(baseline / count / 1024))
+print("Slots:       {:.1f}KiB per model, {:.1f}% less".format(slots / count / 1024, (1 - slots / baseline) * 100))
+
+tracemalloc.start()
+start = time.perf_counter()
+models = []
+for _ in range(count):
+    definition = ModelDefinition(model_file)
+    # Create every expression and variant, and the data used while speaking
+    for style in definition.styles.values():
+        for expression in style.get_expressions().values():
+            expression.get_default_variant()
+            for variant in expression.get_variants().values():
+                variant.get_image_index(0.0)
+    models.append(definition)
+elapsed = time.perf_counter() - start
+current, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print("Definitions: {}, load time: {:.2f}ms per model".format(count, elapsed / count * 1000))
+print("Memory: {:.1f}KiB per model, peak {:.1f}MiB".format(current / count / 1024, peak / 1024 / 1024))
@@ -0,0 +1,42 @@
+from livepng import amplitude
+from livepng.wav import load_wav
+from pydub import AudioSegment
+import os, resource, subprocess, sys, tempfile, time, wave
+
+# Compare decoding a large WAV file with pydub and with the memory mapped WAV reader of LivePNG.
+# Every reader runs in its own process, so that the peak RSS is measured separately
+minutes = float(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != "--child" else 10
+
+
+def run_child(reader: str, path: str):
+    # ru_maxrss is in KiB on Linux
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    audio = AudioSegment.from_file(path) if reader == "pydub" else load_wav(path)
+    samples = audio.get_array_of_samples()
+    decoded = time.perf_counter() - start
+    amplitudes = amplitude.calculate_amplitudes(audio.frame_rate, samples, frame_rate=10)
+    total = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{:<8} decode: {:7.3f}s  amplitudes: {:7.3f}s  peak RSS: {:7.1f}MiB (+{:.1f}MiB after imports)  frames: {}".format(
+        reader, decoded, total - decoded, peak, peak - baseline, len(amplitudes)))
+
+
+if len(sys.argv) > 1 and sys.argv[1] == "--child":
+    run_child(sys.argv[2], sys.argv[3])
+    sys.exit(0)
+
+source = AudioSegment.from_file("audio/kuri.wav")
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "long.wav")
+    # Repeat the example audio to get a long clip
+    repeat = int(minutes * 60 / source.duration_seconds) + 1
+    with wave.open(path, "wb") as f:
+        f.setnchannels(source.channels)
+        f.setsampwidth(source.sample_width)
+        f.setframerate(source.frame_rate)
+        for _ in range(repeat):
+            f.writeframes(source.raw_data)
+    print("File: {:.1f}MiB, {:.1f} minutes".format(os.path.getsize(path) / 1024 / 1024, repeat * source.duration_seconds / 60))
+    for reader in ("pydub", "livepng"):
+        subprocess.run([sys.executable, __file__, "--child", reader, path], check=True)
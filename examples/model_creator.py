@@ -1,11 +1,14 @@
 from livepng import ModelInspector
 import os
 
-for f in os.listdir("models"):
-    path = os.path.join("models", f)
-    if os.path.isdir(path):
-        model_name = f
-        inspector = ModelInspector(model_name)
-        inspector.analyze_directory(path)
-        inspector.save_model()
-        print("Model {} saved".format(model_name))
\ No newline at end of file
+paths = [os.path.join("models", f) for f in os.listdir("models") if os.path.isdir(os.path.join("models", f))]
+# Only the directories modified since the last run are scanned, and unchanged models are not saved again
+results = ModelInspector.inspect_models(paths, incremental=True)
+for path, result in results.items():
+    model_name = os.path.basename(path)
+    if isinstance(result, Exception):
+        print("Model {} not saved: {}".format(model_name, result))
+    elif result:
+        print("Model {} saved".format(model_name))
+    else:
+        print("Model {} unchanged".format(model_name))
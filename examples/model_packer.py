@@ -0,0 +1,9 @@
+from livepng.atlas import pack_model
+import os, sys
+
+# Pack the given models, or every model in the models folder, in a single atlas file
+paths = sys.argv[1:] if len(sys.argv) > 1 else [os.path.join("models", f, "model.json") for f in os.listdir("models")]
+for path in paths:
+    if os.path.isfile(path):
+        model_info = pack_model(path)
+        print("Model {} packed, {} images".format(model_info["name"], len(model_info["atlas"]["images"])))
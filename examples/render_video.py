@@ -0,0 +1,14 @@
+from livepng import LivePNG
+from livepng.render import FrameRenderer
+from livepng.exceptions import NotFoundException
+import sys
+
+# Render the lipsync of an audio file without a GUI, the video needs ffmpeg
+model = LivePNG("models/kurisu/model.json")
+audio = sys.argv[1] if len(sys.argv) > 1 else "audio/kuri.wav"
+renderer = FrameRenderer(model, background=(255, 255, 255, 255))
+print("Image sequence:", renderer.render_image_sequence(audio, "render", frame_rate=30))
+try:
+    print("Video:", renderer.render_video(audio, "render.mp4", frame_rate=30))
+except NotFoundException:
+    print("ffmpeg is not installed, the video was not rendered")
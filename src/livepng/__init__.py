@@ -1,4 +1,8 @@
 from livepng.model import LivePNG
 from livepng.objects import Style, Expression, Variant
 from livepng.inspector import ModelInspector
-from livepng.validator import ModelValidator
\ No newline at end of file
+from livepng.validator import ModelValidator
+from livepng.definition import ModelDefinition
+from livepng.batch import TimelineFile, render_timelines
+from livepng.analyzers import AmplitudeAnalyzer, MeanAbsAnalyzer, RMSAnalyzer, PeakAnalyzer, EnvelopeAnalyzer, HysteresisAnalyzer
+from livepng.calibration import CalibratedAnalyzer, CalibrationCache
\ No newline at end of file
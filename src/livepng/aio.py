@@ -0,0 +1,84 @@
+from collections.abc import Awaitable, Callable
+import asyncio
+
+
+def is_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    """Check if the given event loop is running in the calling thread"""
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+class FrameQueue:
+    """Queue of frames consumed by an async iterator on an event loop. Frames can be put from any thread.
+    If the consumer is slower than the frames, the oldest ones are dropped, since only the last frame matters"""
+    loop : asyncio.AbstractEventLoop
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 8) -> None:
+        """Initialize the queue
+
+        Args:
+            loop (asyncio.AbstractEventLoop): event loop of the consumer
+            maxsize (int, optional): maximum number of frames waiting to be consumed. Defaults to 8.
+        """
+        self.loop = loop
+        self.__queue = asyncio.Queue(maxsize)
+
+    def put(self, frame):
+        """Add a frame, it can be called from any thread
+
+        Args:
+            frame: the frame
+        """
+        if is_loop_thread(self.loop):
+            self.__put(frame)
+        else:
+            self.loop.call_soon_threadsafe(self.__put, frame)
+
+    def __put(self, frame):
+        """Add a frame from the loop thread, dropping the oldest if the queue is full"""
+        if self.__queue.full():
+            self.__queue.get_nowait()
+        self.__queue.put_nowait(frame)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.__queue.get()
+
+
+class AsyncCallback:
+    """Coroutine function called on its event loop, from any thread"""
+    loop : asyncio.AbstractEventLoop
+    callback : Callable[..., Awaitable]
+
+    def __init__(self, callback: Callable[..., Awaitable], loop: asyncio.AbstractEventLoop) -> None:
+        """Initialize the callback
+
+        Args:
+            callback (Callable[..., Awaitable]): coroutine function
+            loop (asyncio.AbstractEventLoop): event loop on which it is run
+        """
+        self.callback = callback
+        self.loop = loop
+        self.__tasks = set()
+
+    def __call__(self, *args):
+        """Schedule the coroutine on the event loop, without waiting for it"""
+        if is_loop_thread(self.loop):
+            # Keep a reference to the task until it is done
+            task = self.loop.create_task(self.callback(*args))
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(self.callback(*args), self.loop)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AsyncCallback):
+            return self.callback == other.callback and self.loop is other.loop
+        return self.callback == other
+
+    def __hash__(self) -> int:
+        return hash(self.callback)
@@ -0,0 +1,148 @@
+from collections.abc import Sequence
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""Value used to normalize the amplitude of 16 bit samples"""
+SAMPLE_NORMALIZATION = 32768
+"""Available methods to calculate the amplitude of a window"""
+METHODS = ("mean", "rms", "peak")
+"""Samples converted at once by the NumPy engine"""
+AMPLITUDE_BLOCK_SAMPLES = 1 << 20
+
+
+def has_numpy() -> bool:
+    """Check if the NumPy amplitude engine is available
+
+    Returns:
+        bool: if NumPy is installed
+    """
+    return numpy is not None
+
+
+def window_size(sample_rate: int, frame_rate: int) -> int:
+    """Get the number of samples in a frame window
+
+    Args:
+        sample_rate (int): Sample rate of the audio
+        frame_rate (int): Frame rate of the lipsync
+
+    Returns:
+        int: number of samples for every frame
+    """
+    return sample_rate // frame_rate
+
+
+def calculate_amplitudes(sample_rate: int, audio_data: Sequence[int], frame_rate: int = 10, method: str = "mean", use_numpy: bool | None = None,
+                         normalization: int = SAMPLE_NORMALIZATION, channels: int = 1) -> list[float]:
+    """Calculate the normalized amplitude of every frame window
+
+    Args:
+        sample_rate (int): Sample rate for the audio file
+        audio_data (Sequence[int]): Audio samples
+        frame_rate (int, optional): Frame rate. Defaults to 10.
+        method (str, optional): "mean" for the mean of the absolute values, "rms" or "peak". Defaults to "mean".
+        use_numpy (bool | None, optional): Force or disable the NumPy engine, if None it is used when available. Defaults to None.
+        normalization (int, optional): value that normalizes the samples to [-1, 1]. Defaults to SAMPLE_NORMALIZATION, for 16 bit samples.
+        channels (int, optional): number of interleaved channels, they are downmixed to their mean. Defaults to 1.
+
+    Raises:
+        ValueError: if the method is not valid
+
+    Returns:
+        list[float]: List of the amplitudes
+    """
+    if method not in METHODS:
+        raise ValueError("Amplitude method not valid: " + str(method))
+    if use_numpy is None:
+        use_numpy = has_numpy()
+    size = window_size(sample_rate, frame_rate)
+    # The channels are summed, dividing by their number is part of the normalization
+    normalization *= channels
+    if use_numpy and numpy is not None:
+        return _calculate_amplitudes_numpy(audio_data, size, method, normalization, channels)
+    return _calculate_amplitudes_python(audio_data, size, method, normalization, channels)
+
+
+def window_amplitude(segment: Sequence[int], method: str = "mean", normalization: int = SAMPLE_NORMALIZATION) -> float:
+    """Calculate the normalized amplitude of a single window
+
+    Args:
+        segment (Sequence[int]): samples of the window
+        method (str, optional): "mean", "rms" or "peak". Defaults to "mean".
+        normalization (int, optional): value that normalizes the samples to [-1, 1]. Defaults to SAMPLE_NORMALIZATION.
+
+    Returns:
+        float: normalized amplitude
+    """
+    if method == "rms":
+        value = math.sqrt(sum(sample * sample for sample in segment) / len(segment))
+    elif method == "peak":
+        value = max(abs(sample) for sample in segment)
+    else:
+        absolute_segment = [abs(sample) for sample in segment]
+        value = sum(absolute_segment) / len(absolute_segment)
+    # Normalize the amplitude
+    return value / normalization
+
+
+def _calculate_amplitudes_python(audio_data: Sequence[int], size: int, method: str, normalization: int, channels: int) -> list[float]:
+    """Pure Python fallback of calculate_amplitudes"""
+    if channels > 1:
+        count = len(audio_data) // channels
+        audio_data = [sum(audio_data[i * channels:(i + 1) * channels]) for i in range(count)]
+    amplitudes = []
+    for i in range(0, len(audio_data), size):
+        amplitudes.append(window_amplitude(audio_data[i:i + size], method, normalization))
+    return amplitudes
+
+
+def _calculate_amplitudes_numpy(audio_data: Sequence[int], size: int, method: str, normalization: int, channels: int) -> list[float]:
+    """NumPy implementation of calculate_amplitudes
+
+    The samples are reshaped into a (windows, size) matrix so every window is computed in a single call.
+    Sums are done on 64 bit integers, and the squares of rms on 64 bit floats so that 32 bit samples do not overflow.
+    For 16 bit samples both are exact, so the result is identical to the pure Python path.
+    The samples are converted one block of windows at a time, so a memory mapped file is never copied whole.
+    """
+    assert numpy is not None
+    samples = numpy.asarray(audio_data)
+    frames = len(samples) // channels
+    full = frames // size
+    amplitudes = []
+    block = max(1, AMPLITUDE_BLOCK_SAMPLES // (size * channels))
+    for first in range(0, full, block):
+        last = min(full, first + block)
+        windows = _downmix(samples[first * size * channels:last * size * channels], channels).reshape(last - first, size)
+        amplitudes.extend(_reduce_windows(windows, size, method, normalization).tolist())
+    # The last window can be shorter than the others
+    if frames > full * size:
+        tail = _downmix(samples[full * size * channels:frames * channels], channels).reshape(1, -1)
+        amplitudes.extend(_reduce_windows(tail, tail.shape[1], method, normalization).tolist())
+    return amplitudes
+
+
+def _downmix(samples, channels: int):
+    """Convert a block of interleaved samples to 64 bit integers, summing the channels of every frame"""
+    assert numpy is not None
+    samples = samples.astype(numpy.int64)
+    if channels > 1:
+        return samples.reshape(-1, channels).sum(axis=1)
+    return samples
+
+
+def _reduce_windows(windows, size: int, method: str, normalization: int):
+    """Reduce every row of the windows matrix to its normalized amplitude"""
+    assert numpy is not None
+    if method == "rms":
+        squares = windows.astype(numpy.float64)
+        squares *= squares
+        values = numpy.sqrt(squares.sum(axis=1) / size)
+    elif method == "peak":
+        values = numpy.abs(windows).max(axis=1).astype(numpy.float64)
+    else:
+        values = numpy.abs(windows).sum(axis=1) / size
+    return values / normalization
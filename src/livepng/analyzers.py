@@ -0,0 +1,299 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections.abc import Sequence
+import copy
+
+from livepng import amplitude
+from livepng.constants import MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD
+from livepng.objects import Variant
+
+
+def get_normalization(sample_width: int) -> int:
+    """Get the value that normalizes the samples of a sample width to [-1, 1].
+    24 bit samples are expanded to 32 bit by pydub and by livepng.stream, so they are normalized like 32 bit samples
+
+    Args:
+        sample_width (int): bytes per sample
+
+    Returns:
+        int: the absolute value of the smallest sample
+    """
+    return 1 << (8 * (4 if sample_width == 3 else sample_width) - 1)
+
+
+class AmplitudeAnalyzer(ABC):
+    """Streaming stage that turns PCM samples into one normalized amplitude per frame window.
+    Analyzers keep their state between calls, so the same instance can analyze a whole file at once
+    or one window at a time while the audio is streamed. LivePNG analyzes every audio with a copy given by start,
+    so an instance can be passed to many models"""
+
+    @abstractmethod
+    def process(self, samples: Sequence[int], sample_rate: int, frame_rate: int = 10, sample_width: int = 2, channels: int = 1) -> list[float]:
+        """Analyze consecutive frame windows of audio, the last window can be shorter
+
+        Args:
+            samples (Sequence[int]): interleaved signed samples, like pydub get_array_of_samples
+            sample_rate (int): sample rate of the audio
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+            sample_width (int, optional): bytes per sample. Defaults to 2.
+            channels (int, optional): number of channels. Defaults to 1.
+
+        Returns:
+            list[float]: amplitude of every window
+        """
+        pass
+
+    @abstractmethod
+    def get_key(self) -> str:
+        """Get a name that identifies the analyzer and its parameters, used as method in the amplitude cache"""
+        pass
+
+    def reset(self):
+        """Forget the state of the previous audio"""
+        pass
+
+    def bind(self, variant: Variant):
+        """Adapt the analyzer to the thresholds of the variant the amplitudes are used for
+
+        Args:
+            variant (Variant): the variant
+        """
+        pass
+
+    def set_streaming(self):
+        """Prepare the analyzer to receive the audio one window at a time, instead of all at once"""
+        pass
+
+    def get_cached_source(self) -> "AmplitudeAnalyzer | None":
+        """Get the analyzer whose amplitudes are cached instead of the ones of this analyzer, because this one
+        must see every audio, like CalibratedAnalyzer that updates the calibration of the voice.
+        The cached amplitudes are completed by process_amplitudes
+
+        Returns:
+            AmplitudeAnalyzer | None: the cached source, None if the amplitudes of this analyzer can be cached
+        """
+        return None
+
+    def process_amplitudes(self, values: list[float]) -> list[float]:
+        """Complete the analysis from the amplitudes of get_cached_source
+
+        Args:
+            values (list[float]): amplitudes of the cached source, they can be modified
+
+        Returns:
+            list[float]: amplitude of every window
+        """
+        raise NotImplementedError("The amplitudes of this analyzer are cached directly")
+
+    def start(self, variant: Variant | None = None, streaming: bool = False) -> "AmplitudeAnalyzer":
+        """Get a copy of the analyzer with an empty state, to analyze a new audio
+
+        Args:
+            variant (Variant | None, optional): bind the copy to a variant. Defaults to None.
+            streaming (bool, optional): the audio is processed one window at a time. Defaults to False.
+
+        Returns:
+            AmplitudeAnalyzer: the new analyzer
+        """
+        analyzer = copy.deepcopy(self)
+        analyzer.reset()
+        if variant is not None:
+            analyzer.bind(variant)
+        if streaming:
+            analyzer.set_streaming()
+        return analyzer
+
+
+class WindowAnalyzer(AmplitudeAnalyzer):
+    """Analyzer that reduces every window independently with livepng.amplitude. The channels are downmixed to their mean
+    and the samples are normalized by their sample width"""
+    method : str
+    use_numpy : bool | None
+
+    def __init__(self, method: str, use_numpy: bool | None = None) -> None:
+        """Initialize the analyzer
+
+        Args:
+            method (str): "mean" for the mean of the absolute values, "rms" or "peak"
+            use_numpy (bool | None, optional): Force or disable the NumPy engine, if None it is used when available. Defaults to None.
+
+        Raises:
+            ValueError: if the method is not valid
+        """
+        if method not in amplitude.METHODS:
+            raise ValueError("Amplitude method not valid: " + str(method))
+        self.method = method
+        self.use_numpy = use_numpy
+
+    def get_key(self) -> str:
+        return self.method
+
+    def process(self, samples: Sequence[int], sample_rate: int, frame_rate: int = 10, sample_width: int = 2, channels: int = 1) -> list[float]:
+        return amplitude.calculate_amplitudes(sample_rate, samples, frame_rate, self.method, self.use_numpy, get_normalization(sample_width), channels)
+
+
+class MeanAbsAnalyzer(WindowAnalyzer):
+    """Mean of the absolute values of every window, the default amplitude of LivePNG"""
+
+    def __init__(self, use_numpy: bool | None = None) -> None:
+        super().__init__("mean", use_numpy)
+
+
+class RMSAnalyzer(WindowAnalyzer):
+    """Root mean square of every window, closer to the perceived loudness"""
+
+    def __init__(self, use_numpy: bool | None = None) -> None:
+        super().__init__("rms", use_numpy)
+
+
+class PeakAnalyzer(WindowAnalyzer):
+    """Largest absolute value of every window"""
+
+    def __init__(self, use_numpy: bool | None = None) -> None:
+        super().__init__("peak", use_numpy)
+
+
+class EnvelopeAnalyzer(AmplitudeAnalyzer):
+    """Smooth the amplitudes of another analyzer with an exponential moving average,
+    with separate coefficients for rising and falling amplitudes"""
+    source : AmplitudeAnalyzer
+    attack : float
+    release : float
+
+    def __init__(self, source: AmplitudeAnalyzer | None = None, attack: float = 0.6, release: float = 0.3) -> None:
+        """Initialize the analyzer
+
+        Args:
+            source (AmplitudeAnalyzer | None, optional): analyzer of the windows, if None MeanAbsAnalyzer. Defaults to None.
+            attack (float, optional): weight of a new amplitude higher than the envelope, between 0 and 1. Defaults to 0.6.
+            release (float, optional): weight of a new amplitude lower than the envelope, between 0 and 1. Defaults to 0.3.
+
+        Raises:
+            ValueError: if a coefficient is not between 0 and 1
+        """
+        if not (0 < attack <= 1 and 0 < release <= 1):
+            raise ValueError("The attack and the release must be between 0 and 1")
+        self.source = source if source is not None else MeanAbsAnalyzer()
+        self.attack = attack
+        self.release = release
+        self.__envelope = None
+
+    def get_key(self) -> str:
+        return "envelope-{}-{}-{}".format(self.attack, self.release, self.source.get_key())
+
+    def reset(self):
+        self.source.reset()
+        self.__envelope = None
+
+    def bind(self, variant: Variant):
+        self.source.bind(variant)
+
+    def set_streaming(self):
+        self.source.set_streaming()
+
+    def get_cached_source(self) -> AmplitudeAnalyzer | None:
+        return self.source.get_cached_source()
+
+    def process_amplitudes(self, values: list[float]) -> list[float]:
+        return self.__smooth(self.source.process_amplitudes(values))
+
+    def process(self, samples: Sequence[int], sample_rate: int, frame_rate: int = 10, sample_width: int = 2, channels: int = 1) -> list[float]:
+        return self.__smooth(self.source.process(samples, sample_rate, frame_rate, sample_width, channels))
+
+    def __smooth(self, values: list[float]) -> list[float]:
+        """Apply the envelope to the amplitudes of the source"""
+        envelope = self.__envelope
+        for i, value in enumerate(values):
+            if envelope is None:
+                envelope = value
+            else:
+                envelope += (self.attack if value > envelope else self.release) * (value - envelope)
+            values[i] = envelope
+        self.__envelope = envelope
+        return values
+
+
+class HysteresisAnalyzer(AmplitudeAnalyzer):
+    """Keep the amplitudes of another analyzer in the same threshold band until they leave it by a margin
+    for some consecutive frames, so that the mouth does not flicker between two images"""
+    source : AmplitudeAnalyzer
+    margin : float
+    hold : int
+    boundaries : tuple[float, ...]
+
+    def __init__(self, source: AmplitudeAnalyzer | None = None, margin: float = 0.005, hold: int = 2, boundaries: Sequence[float] | None = None) -> None:
+        """Initialize the analyzer
+
+        Args:
+            source (AmplitudeAnalyzer | None, optional): analyzer of the windows, if None MeanAbsAnalyzer. Defaults to None.
+            margin (float, optional): how far past a boundary an amplitude must be to change band. Defaults to 0.005.
+            hold (int, optional): consecutive frames an amplitude must stay in a new band to change band. Defaults to 2.
+            boundaries (Sequence[float] | None, optional): boundaries of the bands, if None the ones of the bound variant,
+                or the default thresholds. Defaults to None.
+
+        Raises:
+            ValueError: if hold is lower than 1 or margin is negative
+        """
+        if hold < 1 or margin < 0:
+            raise ValueError("The hold must be at least 1 and the margin must not be negative")
+        self.source = source if source is not None else MeanAbsAnalyzer()
+        self.margin = margin
+        self.hold = hold
+        self.boundaries = tuple(sorted(boundaries)) if boundaries is not None else (0, MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD, 1)
+        self.__fixed = boundaries is not None
+        self.__band = None
+        self.__last = 0.0
+        self.__pending = 0
+
+    def get_key(self) -> str:
+        bounds = "_".join("{:g}".format(bound) for bound in self.boundaries)
+        return "hysteresis-{}-{}-{}-{}".format(self.margin, self.hold, bounds, self.source.get_key())
+
+    def reset(self):
+        self.source.reset()
+        self.__band = None
+        self.__last = 0.0
+        self.__pending = 0
+
+    def bind(self, variant: Variant):
+        self.source.bind(variant)
+        if not self.__fixed:
+            self.boundaries = variant.get_boundaries()
+
+    def set_streaming(self):
+        self.source.set_streaming()
+
+    def get_cached_source(self) -> AmplitudeAnalyzer | None:
+        return self.source.get_cached_source()
+
+    def process_amplitudes(self, values: list[float]) -> list[float]:
+        return self.__hold(self.source.process_amplitudes(values))
+
+    def process(self, samples: Sequence[int], sample_rate: int, frame_rate: int = 10, sample_width: int = 2, channels: int = 1) -> list[float]:
+        return self.__hold(self.source.process(samples, sample_rate, frame_rate, sample_width, channels))
+
+    def __hold(self, values: list[float]) -> list[float]:
+        """Keep the amplitudes of the source in their band"""
+        boundaries = self.boundaries
+        last_band = len(boundaries) - 1
+        for i, value in enumerate(values):
+            band = bisect_right(boundaries, value) - 1
+            current = self.__band
+            if current is None or band == current:
+                self.__band = band
+                self.__pending = 0
+                self.__last = value
+                continue
+            # Distance past the boundary of the current band
+            if band > current:
+                beyond = value - boundaries[current + 1] if current + 1 <= last_band else 0
+            else:
+                beyond = boundaries[current] - value if current >= 0 else 0
+            self.__pending = self.__pending + 1 if beyond >= self.margin else 0
+            if self.__pending >= self.hold:
+                self.__band = band
+                self.__pending = 0
+                self.__last = value
+            else:
+                values[i] = self.__last
+        return values
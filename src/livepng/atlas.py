@@ -0,0 +1,131 @@
+from threading import Lock
+import json
+import mmap
+import os
+
+from livepng import constants
+from livepng.exceptions import InvalidModelException, NotFoundException
+from livepng.thresholds import get_raw_images, get_raw_variants
+
+
+def get_atlas_key(style: str, expression: str, variant: str, image: str) -> str:
+    """Get the key of an image in the atlas index
+
+    Args:
+        style (str): style of the image
+        expression (str): expression of the image
+        variant (str): variant of the image
+        image (str): image name
+
+    Returns:
+        str: key of the image
+    """
+    return "/".join((str(style), str(expression), str(variant), image))
+
+
+class ModelAtlas:
+    """Packed model assets: every image is stored in a single file, and the model.json contains
+    the region (offset and length) of every image in the file.
+    The file is opened once and memory mapped, images are returned as zero copy views"""
+    path : str
+    regions : dict[str, tuple[int, int]]
+
+    def __init__(self, model_path: str, atlas_info: dict) -> None:
+        """Initialize the atlas
+
+        Args:
+            model_path (str): path to the folder of the model
+            atlas_info (dict): the "atlas" entry of the model.json file
+        """
+        self.path = os.path.join(model_path, atlas_info["file"])
+        self.regions = {key: (region[0], region[1]) for key, region in atlas_info["images"].items()}
+        self.__map = None
+        self.__lock = Lock()
+
+    def get_region(self, style: str, expression: str, variant: str, image: str) -> tuple[int, int]:
+        """Get the region of an image in the atlas file
+
+        Args:
+            style (str): style of the image
+            expression (str): expression of the image
+            variant (str): variant of the image
+            image (str): image name
+
+        Raises:
+            NotFoundException: if the image is not in the atlas
+
+        Returns:
+            tuple[int, int]: offset and length of the image in the atlas file
+        """
+        key = get_atlas_key(style, expression, variant, image)
+        if key not in self.regions:
+            raise NotFoundException("Image not found in the atlas: " + key)
+        return self.regions[key]
+
+    def get_image(self, style: str, expression: str, variant: str, image: str) -> memoryview:
+        """Get the content of an image without copying it
+
+        Args:
+            style (str): style of the image
+            expression (str): expression of the image
+            variant (str): variant of the image
+            image (str): image name
+
+        Returns:
+            memoryview: view on the content of the image
+        """
+        offset, length = self.get_region(style, expression, variant, image)
+        return self.get_view()[offset:offset + length]
+
+    def get_view(self) -> memoryview:
+        """Get a view on the whole atlas file, the file is opened the first time
+
+        Returns:
+            memoryview: view on the atlas file
+        """
+        with self.__lock:
+            if self.__map is None:
+                with open(self.path, "rb") as f:
+                    self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.__map)
+
+
+def pack_model(path: str, atlas_name: str = constants.ATLAS_FILE_NAME) -> dict:
+    """Convert a directory model to a packed model. The images are written in a single atlas file
+    and the model.json is updated with its index. The assets directory is left untouched, and can be deleted.
+
+    Args:
+        path (str): path to the model.json file
+        atlas_name (str, optional): name of the atlas file, in the model folder. Defaults to constants.ATLAS_FILE_NAME.
+
+    Raises:
+        InvalidModelException: if the model is already packed
+
+    Returns:
+        dict: the new content of model.json
+    """
+    with open(path, "r") as f:
+        model_info = json.loads(f.read())
+    if "atlas" in model_info:
+        raise InvalidModelException("The model is already packed")
+    model_dir = os.path.dirname(path)
+    assets_dir = os.path.join(model_dir, constants.ASSETS_DIR_NAME)
+    regions = {}
+    offset = 0
+    atlas_path = os.path.join(model_dir, atlas_name)
+    tmp = atlas_path + ".tmp"
+    with open(tmp, "wb") as atlas:
+        for style, style_info in model_info["styles"].items():
+            for expression, variants in style_info["expressions"].items():
+                for variant, images in get_raw_variants(variants).items():
+                    for image in get_raw_images(images):
+                        with open(os.path.join(assets_dir, style, expression, variant, image), "rb") as f:
+                            data = f.read()
+                        atlas.write(data)
+                        regions[get_atlas_key(style, expression, variant, image)] = [offset, len(data)]
+                        offset += len(data)
+    os.replace(tmp, atlas_path)
+    model_info["atlas"] = {"file": atlas_name, "images": regions}
+    with open(path, "w") as f:
+        f.write(json.dumps(model_info, indent=2))
+    return model_info
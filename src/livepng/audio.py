@@ -0,0 +1,231 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import deque
+from threading import Condition
+import time
+import pyaudio
+
+
+class AudioOutput(ABC):
+    """Audio device that plays PCM data and reports how much of it has been heard"""
+
+    @abstractmethod
+    def open(self, sample_rate: int, sample_width: int, channels: int):
+        """Open the device
+
+        Args:
+            sample_rate (int): sample rate of the audio
+            sample_width (int): bytes per sample
+            channels (int): number of channels
+        """
+        pass
+
+    @abstractmethod
+    def write(self, data: bytes):
+        """Queue PCM data for playback, it may block if too much data is already queued
+
+        Args:
+            data (bytes): raw PCM data
+        """
+        pass
+
+    @abstractmethod
+    def get_position(self) -> float:
+        """Get the playback position
+
+        Returns:
+            float: seconds of audio heard by the listener since the device was opened
+        """
+        pass
+
+    @abstractmethod
+    def close(self, drain: bool = True):
+        """Close the device
+
+        Args:
+            drain (bool, optional): wait for the queued audio to be played. Defaults to True.
+        """
+        pass
+
+
+class BufferedAudioOutput(AudioOutput):
+    """Base class for outputs that pull the queued audio from a buffer"""
+
+    def __init__(self, max_buffer: float | None = 1.0) -> None:
+        """Initialize the output
+
+        Args:
+            max_buffer (float | None, optional): seconds of audio after which write blocks. If None it never blocks. Defaults to 1.0.
+        """
+        self.max_buffer = max_buffer
+        self.sample_rate = 0
+        self.frame_size = 0
+        self.consumed = 0
+        self.latency = 0.0
+        self.closed = False
+        self._buffer = bytearray()
+        self._condition = Condition()
+        # (time, frames consumed) after every read, to know what is heard after the latency
+        self._history = deque(maxlen=512)
+
+    def open(self, sample_rate: int, sample_width: int, channels: int):
+        self.sample_rate = sample_rate
+        self.frame_size = sample_width * channels
+        self.consumed = 0
+        self.closed = False
+        self._buffer.clear()
+        self._history.clear()
+
+    def write(self, data: bytes):
+        with self._condition:
+            if self.max_buffer is not None:
+                limit = self.max_buffer * self.sample_rate * self.frame_size
+                self._condition.wait_for(lambda: self.closed or len(self._buffer) < limit)
+            if not self.closed:
+                self._buffer.extend(data)
+
+    def read(self, frames: int) -> bytes:
+        """Take some frames from the buffer, padding with silence if there is not enough data
+
+        Args:
+            frames (int): number of frames requested by the device
+
+        Returns:
+            bytes: PCM data
+        """
+        size = frames * self.frame_size
+        with self._condition:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self.consumed += len(data) // self.frame_size
+            self._history.append((time.monotonic(), self.consumed))
+            self._condition.notify_all()
+        return data + bytes(size - len(data))
+
+    def get_position(self) -> float:
+        """Get the frames sent to the device one latency ago, they are the ones heard now"""
+        if self.sample_rate == 0:
+            return 0.0
+        with self._condition:
+            history = list(self._history)
+        index = bisect_right(history, time.monotonic() - self.latency, key=lambda entry: entry[0])
+        if index == 0:
+            return 0.0
+        return history[index - 1][1] / self.sample_rate
+
+    def buffered(self) -> float:
+        """Seconds of audio queued and not yet sent to the device"""
+        with self._condition:
+            return len(self._buffer) / (self.sample_rate * self.frame_size)
+
+    def wait_drain(self):
+        """Wait until every queued frame has been sent to the device"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or len(self._buffer) == 0)
+
+    def _mark_closed(self):
+        """Wake up every writer and drop the queued audio"""
+        with self._condition:
+            self.closed = True
+            self._buffer.clear()
+            self._condition.notify_all()
+
+
+class PyAudioOutput(BufferedAudioOutput):
+    """Play the audio with a callback mode PyAudio stream, the position is calculated from
+    the frames consumed by the device minus its output latency"""
+
+    def __init__(self, max_buffer: float | None = 1.0) -> None:
+        super().__init__(max_buffer)
+        self.p = None
+        self.stream = None
+
+    def open(self, sample_rate: int, sample_width: int, channels: int):
+        super().open(sample_rate, sample_width, channels)
+        self.p = pyaudio.PyAudio()
+        self.stream = self.p.open(format=self.p.get_format_from_width(sample_width),
+                    channels=channels,
+                    rate=sample_rate,
+                    output=True,
+                    stream_callback=self.__callback)
+        self.latency = self.stream.get_output_latency()
+
+    def __callback(self, in_data, frame_count, time_info, status):
+        """Called by PyAudio when the device needs more data"""
+        latency = time_info.get("output_buffer_dac_time", 0) - time_info.get("current_time", 0)
+        if latency > 0:
+            self.latency = latency
+        return (self.read(frame_count), pyaudio.paContinue)
+
+    def close(self, drain: bool = True):
+        if drain:
+            self.wait_drain()
+            # Wait for the device to play its buffer
+            time.sleep(self.latency)
+        self._mark_closed()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+        if self.p is not None:
+            self.p.terminate()
+        self.stream = None
+        self.p = None
+
+
+class FakeAudioOutput(BufferedAudioOutput):
+    """Output device that does not play anything, but consumes the audio in real time.
+    Useful for tests and headless use"""
+
+    def __init__(self, latency: float = 0.0, max_buffer: float | None = 1.0) -> None:
+        """Initialize the fake device
+
+        Args:
+            latency (float, optional): simulated output latency in seconds. Defaults to 0.0.
+            max_buffer (float | None, optional): seconds of audio after which write blocks. Defaults to 1.0.
+        """
+        super().__init__(max_buffer)
+        self.latency = latency
+        self.start_time = None
+        self.written = 0
+        self.__device_frames = 0
+
+    def open(self, sample_rate: int, sample_width: int, channels: int):
+        super().open(sample_rate, sample_width, channels)
+        self.start_time = None
+        self.written = 0
+        self.__device_frames = 0
+
+    def write(self, data: bytes):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        self.written += len(data)
+        # Nothing consumes the buffer in background, so wait here instead of in the base class
+        while self.max_buffer is not None and not self.closed and self.buffered() >= self.max_buffer:
+            time.sleep(0.005)
+        super().write(data)
+
+    def __consume(self):
+        """Consume the frames that the fake device would have requested since the last call"""
+        if self.start_time is None or self.frame_size == 0:
+            return
+        device_frames = int((time.monotonic() - self.start_time) * self.sample_rate)
+        if device_frames > self.__device_frames:
+            self.read(device_frames - self.__device_frames)
+            self.__device_frames = device_frames
+
+    def buffered(self) -> float:
+        self.__consume()
+        return super().buffered()
+
+    def get_position(self) -> float:
+        self.__consume()
+        return super().get_position()
+
+    def wait_drain(self):
+        while not self.closed and self.buffered() > 0:
+            time.sleep(0.005)
+
+    def close(self, drain: bool = True):
+        if drain:
+            self.wait_drain()
+        self._mark_closed()
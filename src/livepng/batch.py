@@ -0,0 +1,362 @@
+from array import array
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+from livepng import constants, amplitude
+from livepng.definition import ModelDefinition
+from livepng.exceptions import NotFoundException, WrongFormatException
+from livepng.analyzers import get_normalization
+from livepng.objects import Variant, get_index_typecode
+from livepng.wav import load_audio
+
+"""Magic bytes at the start of a timeline file"""
+TIMELINE_MAGIC = b"LPTL"
+"""Version of the timeline file format"""
+TIMELINE_VERSION = 2
+"""Array typecodes of the frame indexes by their size in bytes"""
+INDEX_TYPECODES = {1: "B", 2: "H", 4: "I"}
+
+
+class TimelineFile:
+    """Precalculated lipsync of an audio file: the amplitude of every frame, and the frames as indexes of the images of a variant.
+
+    File layout (little endian): magic, version (uint16), length of the metadata (uint32), metadata as JSON,
+    frame indexes (one unsigned integer of index_size bytes per frame, from the metadata), amplitudes (one float64 per frame).
+    The amplitudes are stored with full precision, so that the indexes calculated again for another variant are the same
+    of analyzing the audio. Version 1 files, with uint8 indexes and float32 amplitudes, can still be read"""
+    frame_rate : int
+    amplitudes : array
+    indexes : array
+    metadata : dict
+
+    def __init__(self, frame_rate: int, amplitudes: Iterable[float], indexes: Iterable[int], metadata: dict | None = None) -> None:
+        """Initialize the timeline
+
+        Args:
+            frame_rate (int): frame rate of the timeline
+            amplitudes (Iterable[float]): amplitude of every frame
+            indexes (Iterable[int]): frames, as indexes of the images of the variant in the metadata.
+                Arrays are kept as they are, the other iterables are stored with the smallest unsigned typecode
+            metadata (dict | None, optional): information about the audio and the variant. Defaults to None.
+        """
+        self.frame_rate = frame_rate
+        self.amplitudes = array("d", amplitudes)
+        if not isinstance(indexes, array):
+            indexes = list(indexes)
+            indexes = array(get_index_typecode(max(indexes, default=0) + 1), indexes)
+        self.indexes = indexes
+        self.metadata = metadata if metadata is not None else {}
+        if len(self.amplitudes) != len(self.indexes):
+            raise ValueError("The number of amplitudes does not match the number of frames")
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def get_duration(self) -> float:
+        """Duration of the timeline in seconds"""
+        return len(self) / self.frame_rate
+
+    def get_indexes(self, variant: Variant) -> array:
+        """Get the frames for a variant. The stored indexes are used if they were calculated for a variant with the same images
+        and thresholds, otherwise they are calculated from the amplitudes
+
+        Args:
+            variant (Variant): variant to show
+
+        Returns:
+            array: indexes of the images of the variant
+        """
+        if self.metadata.get("images") == list(variant.get_images()) and self.metadata.get("thresholds") == get_intervals(variant):
+            return self.indexes
+        return variant.get_image_indexes(self.amplitudes, compact=True)
+
+    def save(self, path: str):
+        """Write the timeline to a file, atomically
+
+        Args:
+            path (str): path of the file
+        """
+        metadata = dict(self.metadata)
+        metadata["frame_rate"] = self.frame_rate
+        metadata["frames"] = len(self)
+        metadata["index_size"] = self.indexes.itemsize
+        header = json.dumps(metadata).encode("utf-8")
+        indexes = array(self.indexes.typecode, self.indexes)
+        amplitudes = array("d", self.amplitudes)
+        if sys.byteorder == "big":
+            indexes.byteswap()
+            amplitudes.byteswap()
+        tmp = path + ".tmp" + str(os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(TIMELINE_MAGIC)
+            f.write(struct.pack("<HI", TIMELINE_VERSION, len(header)))
+            f.write(header)
+            f.write(indexes.tobytes())
+            f.write(amplitudes.tobytes())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str) -> "TimelineFile":
+        """Read a timeline file
+
+        Args:
+            path (str): path of the file
+
+        Raises:
+            WrongFormatException: if the file is not a valid timeline
+
+        Returns:
+            TimelineFile: the timeline
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != TIMELINE_MAGIC:
+            raise WrongFormatException("Not a timeline file: " + path)
+        version, header_size = struct.unpack_from("<HI", data, 4)
+        if version not in (1, TIMELINE_VERSION):
+            raise WrongFormatException("Unsupported timeline version: " + str(version))
+        offset = 4 + struct.calcsize("<HI")
+        metadata = json.loads(data[offset:offset + header_size].decode("utf-8"))
+        offset += header_size
+        frames = metadata["frames"]
+        index_size = metadata.get("index_size", 1) if version > 1 else 1
+        amplitude_typecode = "d" if version > 1 else "f"
+        if index_size not in INDEX_TYPECODES:
+            raise WrongFormatException("Unsupported index size: " + str(index_size))
+        indexes = array(INDEX_TYPECODES[index_size])
+        amplitudes = array(amplitude_typecode)
+        end = offset + frames * (index_size + amplitudes.itemsize)
+        if len(data) != end:
+            raise WrongFormatException("Truncated timeline file: " + path)
+        indexes.frombytes(data[offset:offset + frames * index_size])
+        amplitudes.frombytes(data[offset + frames * index_size:end])
+        if sys.byteorder == "big":
+            indexes.byteswap()
+            amplitudes.byteswap()
+        return TimelineFile(metadata["frame_rate"], amplitudes, indexes, metadata)
+
+
+class BatchReport:
+    """Result of the analysis of many audio files"""
+    outputs : dict[str, str]
+    errors : dict[str, str]
+    elapsed : float
+
+    def __init__(self) -> None:
+        self.outputs = {}
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def get_throughput(self) -> float:
+        """Analyzed audio files per second"""
+        if self.elapsed == 0:
+            return 0.0
+        return len(self.outputs) / self.elapsed
+
+    def __str__(self) -> str:
+        return "{} clips in {:.2f}s ({:.1f} clips/s), {} errors".format(len(self.outputs), self.elapsed, self.get_throughput(), len(self.errors))
+
+
+def get_variant(definition: ModelDefinition, style: str | None = None, expression: str | None = None, variant: str | None = None) -> Variant:
+    """Get a variant of a model, the default one is used for every level that is not given
+
+    Args:
+        definition (ModelDefinition): the model
+        style (str | None, optional): name of the style. Defaults to None.
+        expression (str | None, optional): name of the expression. Defaults to None.
+        variant (str | None, optional): name of the variant. Defaults to None.
+
+    Raises:
+        NotFoundException: if one of them does not exist
+
+    Returns:
+        Variant: the variant
+    """
+    if style is not None and style not in definition.styles:
+        raise NotFoundException("Style not found: " + style)
+    stl = definition.styles[style] if style is not None else definition.get_default_style()
+    if expression is not None and expression not in stl.get_expressions():
+        raise NotFoundException("Expression not found: " + expression)
+    expr = stl.get_expressions()[expression] if expression is not None else stl.get_default_expression()
+    if variant is not None and variant not in expr.get_variants():
+        raise NotFoundException("Variant not found: " + variant)
+    return expr.get_variants()[variant] if variant is not None else expr.get_default_variant()
+
+
+def get_intervals(variant: Variant) -> list[list[float]]:
+    """Get the amplitude interval of every image of a variant, as stored in the metadata of the timelines"""
+    thresholds = variant.get_thresholds()
+    return [list(thresholds[image]) for image in variant.get_images()]
+
+
+def analyze_audio(audio_file: str, variant: Variant, frame_rate: int = 10, method: str = "mean") -> TimelineFile:
+    """Decode and analyze an audio file
+
+    Args:
+        audio_file (str): path of the audio file
+        variant (Variant): variant whose frames are calculated
+        frame_rate (int, optional): frame rate. Defaults to 10.
+        method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+
+    Returns:
+        TimelineFile: the timeline of the audio
+    """
+    audio = load_audio(audio_file)
+    amplitudes = amplitude.calculate_amplitudes(audio.frame_rate, audio.get_array_of_samples(), frame_rate=frame_rate, method=method,
+                                                normalization=get_normalization(audio.sample_width), channels=audio.channels)
+    metadata = {
+        "audio": os.path.basename(audio_file),
+        "sample_rate": audio.frame_rate,
+        "duration": audio.duration_seconds,
+        "method": method,
+        "variant": variant.path,
+        "images": list(variant.get_images()),
+        "thresholds": get_intervals(variant)
+    }
+    return TimelineFile(frame_rate, amplitudes, variant.get_image_indexes(amplitudes, compact=True), metadata)
+
+
+def get_timeline_path(audio_file: str, output_dir: str | None = None, base_dir: str | None = None) -> str:
+    """Get the path of the timeline file of an audio file
+
+    Args:
+        audio_file (str): path of the audio file
+        output_dir (str | None, optional): directory of the timelines, if None it is the directory of the audio file. Defaults to None.
+        base_dir (str | None, optional): directory of the audio files whose subdirectories are kept under output_dir,
+            if None only the name of the audio file is kept. Defaults to None.
+
+    Returns:
+        str: path of the timeline file
+    """
+    name = os.path.splitext(os.path.basename(audio_file))[0] + constants.TIMELINE_FILE_EXTENSION
+    if output_dir is None:
+        return os.path.join(os.path.dirname(audio_file), name)
+    if base_dir is not None:
+        directory = os.path.relpath(os.path.dirname(os.path.abspath(audio_file)), base_dir)
+        return os.path.normpath(os.path.join(output_dir, directory, name))
+    return os.path.join(output_dir, name)
+
+
+def get_timeline_paths(audio_files: Iterable[str], output_dir: str | None = None) -> dict[str, str]:
+    """Get the paths of the timeline files of many audio files.
+    Under output_dir the audio files keep their paths relative to the directory that contains all of them
+
+    Args:
+        audio_files (Iterable[str]): paths of the audio files
+        output_dir (str | None, optional): directory of the timelines, if None they are next to the audio files. Defaults to None.
+
+    Raises:
+        ValueError: if two audio files would write the same timeline file
+
+    Returns:
+        dict[str, str]: timeline path of every audio file
+    """
+    audio_files = list(audio_files)
+    base_dir = None
+    if output_dir is not None and len(audio_files) > 0:
+        try:
+            base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(audio_file)) for audio_file in audio_files])
+        except ValueError:
+            # Files on different drives, the collisions are reported below
+            base_dir = None
+    paths = {}
+    sources = {}
+    for audio_file in audio_files:
+        path = get_timeline_path(audio_file, output_dir, base_dir)
+        key = os.path.normcase(os.path.abspath(path))
+        source = sources.setdefault(key, audio_file)
+        if os.path.abspath(source) != os.path.abspath(audio_file):
+            raise ValueError("{} and {} would write the same timeline file: {}".format(source, audio_file, path))
+        paths[audio_file] = path
+    return paths
+
+
+"""Models loaded by the current worker process"""
+_worker_models : dict[tuple, Variant] = {}
+
+
+def _analyze_task(task: tuple) -> tuple[str, str | None, str | None]:
+    """Analyze an audio file in a worker process, returns the audio file, the timeline path and the error"""
+    model_file, selection, audio_file, path, frame_rate, method = task
+    try:
+        key = (model_file, selection)
+        if key not in _worker_models:
+            _worker_models[key] = get_variant(ModelDefinition.load(model_file), *selection)
+        timeline = analyze_audio(audio_file, _worker_models[key], frame_rate, method)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        timeline.save(path)
+        return audio_file, path, None
+    except Exception as e:
+        return audio_file, None, "{}: {}".format(type(e).__name__, e)
+
+
+def render_timelines(model_file: str, audio_files: Iterable[str], output_dir: str | None = None, frame_rate: int = 10, method: str = "mean",
+                     workers: int | None = None, style: str | None = None, expression: str | None = None, variant: str | None = None) -> BatchReport:
+    """Analyze many audio files on a process pool and write their timeline files
+
+    Args:
+        model_file (str): path to the json file of the model
+        audio_files (Iterable[str]): paths of the audio files
+        output_dir (str | None, optional): directory of the timelines, if None they are written next to the audio files.
+            The subdirectories of the audio files are kept, relative to the directory that contains all of them. Defaults to None.
+        frame_rate (int, optional): frame rate. Defaults to 10.
+        method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+        workers (int | None, optional): number of processes, if None the number of CPUs. Defaults to None.
+        style (str | None, optional): style of the frames, if None the default one. Defaults to None.
+        expression (str | None, optional): expression of the frames, if None the default one. Defaults to None.
+        variant (str | None, optional): variant of the frames, if None the default one. Defaults to None.
+
+    Raises:
+        ValueError: if two audio files would write the same timeline file
+
+    Returns:
+        BatchReport: timeline path of every audio file, and the errors
+    """
+    start = time.perf_counter()
+    # Check the model, the variant and the outputs before starting the workers
+    get_variant(ModelDefinition.load(model_file), style, expression, variant)
+    paths = get_timeline_paths(audio_files, output_dir)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    tasks = [(model_file, (style, expression, variant), audio_file, path, frame_rate, method) for audio_file, path in paths.items()]
+    report = BatchReport()
+    if workers is None:
+        # The default of ProcessPoolExecutor, which is limited to 61 processes on Windows
+        workers = os.cpu_count() or 1
+        if sys.platform == "win32":
+            workers = min(workers, 61)
+    chunksize = max(1, len(tasks) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for audio_file, path, error in executor.map(_analyze_task, tasks, chunksize=chunksize):
+            if path is not None:
+                report.outputs[audio_file] = path
+            else:
+                report.errors[audio_file] = str(error)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command line entry point: python -m livepng model.json audio files..."""
+    parser = argparse.ArgumentParser(prog="python -m livepng", description="Precalculate the lipsync of many audio files")
+    parser.add_argument("model", help="path to the model.json file")
+    parser.add_argument("audio", nargs="+", help="audio files")
+    parser.add_argument("-o", "--output", default=None, help="directory of the timeline files, next to the audio files if omitted")
+    parser.add_argument("-f", "--frame-rate", type=int, default=10, help="frame rate")
+    parser.add_argument("-m", "--method", default="mean", choices=amplitude.METHODS, help="amplitude method")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--style", default=None)
+    parser.add_argument("--expression", default=None)
+    parser.add_argument("--variant", default=None)
+    args = parser.parse_args(argv)
+    report = render_timelines(args.model, args.audio, args.output, args.frame_rate, args.method, args.workers, args.style, args.expression, args.variant)
+    for audio_file, error in report.errors.items():
+        print("{}: {}".format(audio_file, error), file=sys.stderr)
+    print(report)
+    return 1 if len(report.errors) > 0 else 0
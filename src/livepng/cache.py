@@ -0,0 +1,200 @@
+from collections import OrderedDict
+from array import array
+from threading import Lock
+import hashlib
+import mmap
+import os
+import sys
+
+"""Size of the blocks of the mapped audio files passed to the hash"""
+HASH_BLOCK_SIZE = 1 << 20
+"""Number of files whose content hash is remembered, so that unchanged files are not hashed again"""
+MAX_HASHED_FILES = 1024
+"""Version of the amplitude files on disk, files of other versions are ignored.
+Version 2 stores little endian doubles, and the amplitudes of the files with many channels or wide samples are normalized"""
+CACHE_FILE_VERSION = 2
+
+
+class AmplitudeCache:
+    """Cache of the amplitudes of audio files, keyed by content hash, frame rate and amplitude method.
+    Entries are kept in memory with LRU eviction and optionally stored on disk"""
+    max_entries : int
+    directory : str | None
+
+    def __init__(self, max_entries: int = 128, directory: str | None = None) -> None:
+        """Initialize the cache
+
+        Args:
+            max_entries (int, optional): maximum number of amplitude sequences kept in memory. Defaults to 128.
+            directory (str | None, optional): directory where the amplitudes are stored, if None they are only kept in memory. Defaults to None.
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.__entries = OrderedDict()
+        self.__hashes = OrderedDict()
+        self.__lock = Lock()
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """Hash the content of a file
+
+        Args:
+            path (str): path of the file
+
+        Returns:
+            str: hex digest of the content
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return digest.hexdigest()
+            # The mapped file is hashed in place, without reading it into Python objects
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                for start in range(0, len(view), HASH_BLOCK_SIZE):
+                    digest.update(view[start:start + HASH_BLOCK_SIZE])
+        return digest.hexdigest()
+
+    def get_content_hash(self, path: str) -> str:
+        """Get the hash of the content of a file. It is calculated again only if the size,
+        the modification time or the inode of the file changed
+
+        Args:
+            path (str): path of the file
+
+        Returns:
+            str: hex digest of the content
+        """
+        path = os.path.abspath(path)
+        signature = self.__get_signature(path)
+        with self.__lock:
+            remembered = self.__hashes.get(path)
+            if remembered is not None and remembered[0] == signature:
+                self.__hashes.move_to_end(path)
+                return remembered[1]
+        content_hash = self.hash_file(path)
+        # The file could be written while it is hashed, in that case the hash is not remembered
+        if self.__get_signature(path) == signature:
+            with self.__lock:
+                self.__hashes[path] = (signature, content_hash)
+                self.__hashes.move_to_end(path)
+                while len(self.__hashes) > MAX_HASHED_FILES:
+                    self.__hashes.popitem(last=False)
+        return content_hash
+
+    @staticmethod
+    def __get_signature(path: str) -> tuple[int, int, int]:
+        """Get what identifies a version of a file without reading it"""
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    @staticmethod
+    def get_key(content_hash: str, frame_rate: int, method: str) -> tuple[str, int, str]:
+        """Get the key of an entry"""
+        return (content_hash, frame_rate, method)
+
+    def get(self, key: tuple[str, int, str]) -> list[float] | None:
+        """Get the cached amplitudes, from memory or from disk
+
+        Args:
+            key (tuple[str, int, str]): key of the entry
+
+        Returns:
+            list[float] | None: the amplitudes, None if they are not cached
+        """
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.__entries[key].tolist()
+        amplitudes = self.__load(key)
+        if amplitudes is not None:
+            self.__remember(key, amplitudes)
+            return amplitudes.tolist()
+        return None
+
+    def put(self, key: tuple[str, int, str], amplitudes: list[float]):
+        """Add amplitudes to the cache
+
+        Args:
+            key (tuple[str, int, str]): key of the entry
+            amplitudes (list[float]): amplitudes to store
+        """
+        data = array("d", amplitudes)
+        self.__remember(key, data)
+        self.__store(key, data)
+
+    def get_amplitudes(self, path: str, frame_rate: int, method: str, calculate) -> list[float]:
+        """Get the amplitudes of an audio file, calculating them only if they are not cached
+
+        Args:
+            path (str): path of the audio file
+            frame_rate (int): frame rate
+            method (str): amplitude method
+            calculate (Callable[[], list[float]]): function that calculates the amplitudes
+
+        Returns:
+            list[float]: the amplitudes
+        """
+        key = self.get_key(self.get_content_hash(path), frame_rate, method)
+        amplitudes = self.get(key)
+        if amplitudes is None:
+            amplitudes = calculate()
+            self.put(key, amplitudes)
+        return amplitudes
+
+    def clear(self):
+        """Remove every entry and every remembered hash from memory"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__hashes.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __remember(self, key: tuple[str, int, str], data: array):
+        """Add an entry in memory, evicting the least recently used"""
+        with self.__lock:
+            self.__entries[key] = data
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def __get_file(self, key: tuple[str, int, str]) -> str | None:
+        """Get the path of the file for the given entry"""
+        if self.directory is None:
+            return None
+        content_hash, frame_rate, method = key
+        # Analyzer keys can contain any character, they are hashed to get a valid file name
+        if not method.isalnum():
+            method = hashlib.blake2b(method.encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(self.directory, "{}_{}_{}.v{}.amp".format(content_hash, frame_rate, method, CACHE_FILE_VERSION))
+
+    def __load(self, key: tuple[str, int, str]) -> array | None:
+        """Load an entry from disk"""
+        path = self.__get_file(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            content = f.read()
+        data = array("d")
+        # A truncated file is calculated again
+        if len(content) % data.itemsize != 0:
+            return None
+        data.frombytes(content)
+        # The files are little endian
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+
+    def __store(self, key: tuple[str, int, str], data: array):
+        """Store an entry on disk, the file is written atomically"""
+        path = self.__get_file(key)
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp" + str(os.getpid())
+        if sys.byteorder == "big":
+            data = array("d", data)
+            data.byteswap()
+        with open(tmp, "wb") as f:
+            data.tofile(f)
+        os.replace(tmp, path)
@@ -0,0 +1,256 @@
+from collections import deque
+from collections.abc import Sequence
+from threading import Lock
+import json
+import os
+
+from livepng.analyzers import AmplitudeAnalyzer, MeanAbsAnalyzer
+from livepng.constants import MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD
+from livepng.objects import Variant
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Get a percentile of some values, interpolating between the closest ones
+
+    Args:
+        values (Sequence[float]): sorted values
+        fraction (float): percentile between 0 and 1
+
+    Returns:
+        float: the percentile
+    """
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Calibration:
+    """Amplitudes of a voice that correspond to the closed and to the open mouth"""
+    __slots__ = ("closed", "open")
+    closed : float
+    open : float
+
+    def __init__(self, closed: float, open: float) -> None:
+        """Initialize the calibration
+
+        Args:
+            closed (float): amplitude of the voice mapped to the closed threshold
+            open (float): amplitude of the voice mapped to the open threshold
+        """
+        self.closed = closed
+        self.open = open
+
+    def apply(self, amplitude: float, closed_threshold: float = MOUTH_CLOSED_THRESHOLD, open_threshold: float = MOUTH_OPEN_THRESHOLD) -> float:
+        """Map an amplitude of the voice to the scale of the thresholds, linearly between 0, closed and open
+
+        Args:
+            amplitude (float): amplitude of the voice
+            closed_threshold (float, optional): amplitude at which the mouth starts opening. Defaults to MOUTH_CLOSED_THRESHOLD.
+            open_threshold (float, optional): amplitude at which the mouth is fully open. Defaults to MOUTH_OPEN_THRESHOLD.
+
+        Returns:
+            float: calibrated amplitude
+        """
+        if amplitude <= self.closed:
+            return amplitude * closed_threshold / self.closed
+        return closed_threshold + (amplitude - self.closed) * (open_threshold - closed_threshold) / (self.open - self.closed)
+
+    def __repr__(self) -> str:
+        return "Calibration(closed={:.5f}, open={:.5f})".format(self.closed, self.open)
+
+
+class CalibrationCache:
+    """Calibrations of many voices, shared by all the analyzers that use it. It can be saved to a JSON file"""
+
+    def __init__(self, path: str | None = None) -> None:
+        """Initialize the cache
+
+        Args:
+            path (str | None, optional): JSON file loaded now if it exists, and written by save. Defaults to None.
+        """
+        self.path = path
+        self.__entries = {}
+        self.__lock = Lock()
+        if path is not None and os.path.isfile(path):
+            with open(path, "r") as f:
+                for voice, bounds in json.loads(f.read()).items():
+                    self.__entries[voice] = Calibration(*bounds)
+
+    def get(self, voice: str) -> Calibration | None:
+        """Get the calibration of a voice, None if it has not been calibrated"""
+        with self.__lock:
+            return self.__entries.get(voice)
+
+    def put(self, voice: str, calibration: Calibration):
+        """Set the calibration of a voice"""
+        with self.__lock:
+            self.__entries[voice] = calibration
+
+    def save(self, path: str | None = None):
+        """Write the calibrations to a JSON file, atomically
+
+        Args:
+            path (str | None, optional): path of the file, if None the path of the cache. Defaults to None.
+
+        Raises:
+            ValueError: if there is no path
+        """
+        path = path if path is not None else self.path
+        if path is None:
+            raise ValueError("No path given for the calibration cache")
+        with self.__lock:
+            data = {voice: [calibration.closed, calibration.open] for voice, calibration in self.__entries.items()}
+        tmp = path + ".tmp" + str(os.getpid())
+        with open(tmp, "w") as f:
+            f.write(json.dumps(data, indent=2))
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __deepcopy__(self, memo: dict) -> "CalibrationCache":
+        # The analyzers are copied for every audio, they must keep sharing the cache
+        return self
+
+
+"""Calibrations shared by the analyzers created without a cache"""
+DEFAULT_CACHE = CalibrationCache()
+"""Seconds of the rolling window of the analyzers without a window, when the audio is streamed one window at a time"""
+STREAM_WINDOW_SECONDS = 10
+
+
+class CalibratedAnalyzer(AmplitudeAnalyzer):
+    """Adapt the amplitudes of another analyzer to the loudness of the voice: the closed and open percentiles of the amplitudes
+    are mapped to the closed and open thresholds of the bound variant, or to the default ones, so the mouth moves in the same way
+    for quiet and loud voices.
+    The percentiles are taken over the whole audio, or over a rolling window of frames. A streamed audio is processed one window
+    at a time, so if the analyzer is started for streaming without a window, a rolling window of STREAM_WINDOW_SECONDS is used.
+    Until there are enough frames, the last calibration of the voice is used, or the amplitudes are not changed.
+    The amplitude cache of LivePNG stores the amplitudes of the source, so the calibration of the voice is updated by every audio"""
+    source : AmplitudeAnalyzer
+    voice : str | None
+    closed_percentile : float
+    open_percentile : float
+    window : int | None
+    min_frames : int
+    silence : float
+    cache : CalibrationCache
+    calibration : Calibration | None
+    thresholds : tuple[float, float]
+
+    def __init__(self, source: AmplitudeAnalyzer | None = None, voice: str | None = None, closed_percentile: float = 0.25, open_percentile: float = 0.9,
+                 window: int | None = None, min_frames: int = 10, silence: float = 0.002, cache: CalibrationCache | None = None) -> None:
+        """Initialize the analyzer
+
+        Args:
+            source (AmplitudeAnalyzer | None, optional): analyzer of the windows, if None MeanAbsAnalyzer. Defaults to None.
+            voice (str | None, optional): name of the voice or of the audio source, its calibration is stored in the cache. Defaults to None.
+            closed_percentile (float, optional): percentile of the amplitudes that closes the mouth, between 0 and 1. Defaults to 0.25.
+            open_percentile (float, optional): percentile of the amplitudes that opens the mouth, between 0 and 1. Defaults to 0.9.
+            window (int | None, optional): number of frames of the rolling window, if None the percentiles of every call to process are used,
+                or the last STREAM_WINDOW_SECONDS while streaming. Defaults to None.
+            min_frames (int, optional): minimum number of frames, excluding silence, to calculate the percentiles. Defaults to 10.
+            silence (float, optional): amplitudes below this value are not used to calculate the percentiles. Defaults to 0.002.
+            cache (CalibrationCache | None, optional): cache of the calibrations, if None a cache shared by the whole process. Defaults to None.
+
+        Raises:
+            ValueError: if the percentiles are not valid
+        """
+        if not (0 < closed_percentile < open_percentile <= 1):
+            raise ValueError("The percentiles must be between 0 and 1, and the closed one must be lower than the open one")
+        self.source = source if source is not None else MeanAbsAnalyzer()
+        self.voice = voice
+        self.closed_percentile = closed_percentile
+        self.open_percentile = open_percentile
+        self.window = window
+        self.min_frames = min_frames
+        self.silence = silence
+        self.cache = cache if cache is not None else DEFAULT_CACHE
+        self.calibration = None
+        self.thresholds = (MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD)
+        self.__history = deque(maxlen=window) if window is not None else None
+        self.__streaming = False
+
+    def get_key(self) -> str:
+        return "calibrated-{}-{}-{}-{}-{}-{}".format(self.voice, self.closed_percentile, self.open_percentile, self.window, self.silence, self.source.get_key())
+
+    def reset(self):
+        self.source.reset()
+        self.calibration = None
+        self.__history = deque(maxlen=self.window) if self.window is not None else None
+        self.__streaming = False
+
+    def bind(self, variant: Variant):
+        self.source.bind(variant)
+        # The first image ends at the closed threshold, the last one starts at the open threshold
+        inner = [bound for bound in variant.get_boundaries() if 0 < bound < 1]
+        if len(inner) >= 2:
+            self.thresholds = (inner[0], inner[-1])
+        else:
+            self.thresholds = (MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD)
+
+    def set_streaming(self):
+        self.source.set_streaming()
+        # The rolling window needs the frame rate, it is created by process
+        self.__streaming = True
+
+    def get_cached_source(self) -> AmplitudeAnalyzer | None:
+        source = self.source.get_cached_source()
+        return source if source is not None else self.source
+
+    def process_amplitudes(self, values: list[float]) -> list[float]:
+        if self.source.get_cached_source() is not None:
+            values = self.source.process_amplitudes(values)
+        return self.__calibrate_values(values)
+
+    def calibrate(self, amplitudes: Sequence[float]) -> Calibration | None:
+        """Calculate the calibration for some amplitudes, and store it for the voice
+
+        Args:
+            amplitudes (Sequence[float]): amplitudes of the voice
+
+        Returns:
+            Calibration | None: the calibration, None if there are not enough frames with voice
+        """
+        voiced = sorted(value for value in amplitudes if value >= self.silence)
+        if len(voiced) < self.min_frames:
+            return None
+        closed = percentile(voiced, self.closed_percentile)
+        opened = percentile(voiced, self.open_percentile)
+        if closed <= 0 or opened <= closed:
+            return None
+        calibration = Calibration(closed, opened)
+        if self.voice is not None:
+            self.cache.put(self.voice, calibration)
+        return calibration
+
+    def get_calibration(self) -> Calibration | None:
+        """Get the calibration in use, or the last one of the voice"""
+        if self.calibration is None and self.voice is not None:
+            return self.cache.get(self.voice)
+        return self.calibration
+
+    def process(self, samples: Sequence[int], sample_rate: int, frame_rate: int = 10, sample_width: int = 2, channels: int = 1) -> list[float]:
+        if self.__history is None and self.__streaming:
+            self.__history = deque(maxlen=STREAM_WINDOW_SECONDS * frame_rate)
+        return self.__calibrate_values(self.source.process(samples, sample_rate, frame_rate, sample_width, channels))
+
+    def __calibrate_values(self, values: list[float]) -> list[float]:
+        """Calibrate the amplitudes of the source"""
+        history = self.__history
+        if history is None:
+            calibration = self.calibrate(values)
+            if calibration is not None:
+                self.calibration = calibration
+            calibration = self.get_calibration()
+            return [calibration.apply(value, *self.thresholds) for value in values] if calibration is not None else values
+        for i, value in enumerate(values):
+            history.append(value)
+            calibration = self.calibrate(history)
+            if calibration is not None:
+                self.calibration = calibration
+            calibration = self.get_calibration()
+            if calibration is not None:
+                values[i] = calibration.apply(value, *self.thresholds)
+        return values
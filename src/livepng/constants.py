@@ -6,6 +6,12 @@ VERSION = 1
 ASSETS_DIR_NAME = "assets"
 """Name of the model file"""
 MODEL_FILE_NAME = "model.json"
+"""Name of the atlas file of packed models"""
+ATLAS_FILE_NAME = "assets.atlas"
+"""Name of the directory where cached data is stored"""
+CACHE_DIR_NAME = ".cache"
+"""Extension of the precalculated lipsync files"""
+TIMELINE_FILE_EXTENSION = ".timeline"
 """Amplitude to consider the mouth closed"""
 MOUTH_CLOSED_THRESHOLD = 0.02
 """Amplitude to consider the mouth fully open"""
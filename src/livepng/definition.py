@@ -0,0 +1,271 @@
+from collections.abc import Callable, Iterable
+from threading import Lock, Thread
+from weakref import WeakValueDictionary
+import json
+import os
+import time
+
+from livepng import constants
+from livepng.exceptions import InvalidModelException
+from livepng.objects import Style
+from livepng.thresholds import THRESHOLDS_KEY
+from .validator import ModelValidator
+from .images import ImageStore
+from .atlas import ModelAtlas
+
+
+class ModelDefinition:
+    """Parsed and validated content of a model. A definition is not modified after it is loaded,
+    so it can be shared by every LivePNG instance using the same model: reloading the model creates a new definition.
+    Definitions loaded with ModelDefinition.load are kept in a registry keyed by path and modification time"""
+    model_file : str
+    path : str
+    model_info : dict
+    name : str
+    version : int
+    styles : dict[str, Style]
+    atlas : ModelAtlas | None
+    has_assets : bool
+    image_store : ImageStore
+    lazy : bool
+    load_time : float
+
+    __registry = WeakValueDictionary()
+    __registry_lock = Lock()
+    __loading_locks = {}
+
+    def __init__(self, path: str, lazy: bool = False, background_validation: bool = True, previous: "ModelDefinition | None" = None, changed_styles: Iterable[str] | None = None) -> None:
+        """Load a model definition
+
+        Args:
+            path (str): path to the json file of the model
+            lazy (bool, optional): Only validate the root of the model, expressions and variants are created the first time they are accessed,
+                and every style is validated before it is used. Defaults to False.
+            background_validation (bool, optional): In lazy mode, validate the styles on another thread after loading. Defaults to True.
+            previous (ModelDefinition | None, optional): previous definition of the same model, its styles are reused if they did not change. Defaults to None.
+            changed_styles (Iterable[str] | None, optional): styles whose assets changed, rebuilt even if their entry in model.json is the same as in the previous definition. Defaults to None.
+
+        Raises:
+            InvalidModelException: if the model is not valid
+        """
+        start_time = time.perf_counter()
+        self.model_file = path
+        self.path = os.path.dirname(path)
+        self.lazy = lazy
+        self.__validated_styles = {}
+        self.__validation_lock = Lock()
+        self.__frame_paths = {}
+        with open(path, "r") as f:
+            self.model_info = json.loads(f.read())
+        if previous is None:
+            if lazy:
+                ModelValidator.validate_root(self.model_info, self.path)
+            else:
+                ModelValidator.validate_json(self.model_info, self.path)
+            self.image_store = ImageStore()
+            self.atlas = ModelAtlas(self.path, self.model_info["atlas"]) if "atlas" in self.model_info else None
+            self.styles = {}
+            for style in self.model_info["styles"]:
+                self.styles[style] = self.__create_style(style)
+        else:
+            self.__load_changes(previous, changed_styles)
+        self.version = self.model_info["version"]
+        self.name = self.model_info["name"]
+        # Packed models can be distributed without the assets folder, their images have no path
+        self.has_assets = os.path.isdir(os.path.join(self.path, constants.ASSETS_DIR_NAME))
+        self.load_time = time.perf_counter() - start_time
+        if lazy and background_validation and previous is None:
+            Thread(target=self.validate, daemon=True).start()
+
+    def __load_changes(self, previous: "ModelDefinition", changed_styles: Iterable[str] | None):
+        """Build only the styles that changed from the previous definition, the others are shared"""
+        errors = ModelValidator.get_root_errors(self.model_info, self.path)
+        if len(errors) > 0:
+            raise InvalidModelException(errors[0])
+        old_styles = previous.model_info["styles"]
+        new_styles = self.model_info["styles"]
+        atlas_info = self.model_info.get("atlas")
+        changed = set(changed_styles) if changed_styles is not None else set()
+        changed.update(style for style in new_styles if style not in old_styles or old_styles[style] != new_styles[style])
+        if atlas_info != previous.model_info.get("atlas") or self.model_info.get(THRESHOLDS_KEY) != previous.model_info.get(THRESHOLDS_KEY):
+            changed.update(new_styles)
+        self.styles = {}
+        for style in new_styles:
+            if style not in changed:
+                self.styles[style] = previous.styles[style]
+                continue
+            if atlas_info is None:
+                errors = ModelValidator.get_style_errors(new_styles[style], style, os.path.join(self.path, constants.ASSETS_DIR_NAME, style))
+                if len(errors) > 0:
+                    raise InvalidModelException(errors[0])
+            self.styles[style] = self.__create_style(style)
+            self.__validated_styles[style] = None
+        # Keep the validation of the shared styles
+        with previous.__validation_lock:
+            for style, error in previous.__validated_styles.items():
+                if style in self.styles and self.styles[style] is previous.styles.get(style):
+                    self.__validated_styles[style] = error
+        self.image_store = previous.image_store
+        # The atlas file is mapped again if its index changed, or if it was rewritten with the same index
+        if atlas_info != previous.model_info.get("atlas") or (changed_styles is not None and atlas_info is not None):
+            self.atlas = ModelAtlas(self.path, atlas_info) if atlas_info is not None else None
+        else:
+            self.atlas = previous.atlas
+
+    def __create_style(self, style: str) -> Style:
+        """Create a style of the model, with the threshold override of the style or of the model"""
+        style_info = self.model_info["styles"][style]
+        return Style(style, style_info["expressions"], self.lazy, style_info.get(THRESHOLDS_KEY, self.model_info.get(THRESHOLDS_KEY)))
+
+    @staticmethod
+    def load(path: str, lazy: bool = False, background_validation: bool = True) -> "ModelDefinition":
+        """Get the definition of a model, it is loaded only if no other instance is using the same version of the file
+
+        Args:
+            path (str): path to the json file of the model
+            lazy (bool, optional): load the model lazily, see ModelDefinition. Defaults to False.
+            background_validation (bool, optional): In lazy mode, validate the styles on another thread after loading. Defaults to True.
+
+        Raises:
+            InvalidModelException: if the model is not valid
+
+        Returns:
+            ModelDefinition: the shared definition
+        """
+        key = ModelDefinition.__get_key(path, lazy)
+        return ModelDefinition.__get_or_create(key, lambda: ModelDefinition(path, lazy, background_validation))
+
+    @staticmethod
+    def clear_registry():
+        """Forget the loaded definitions, the next load reads the model files again"""
+        with ModelDefinition.__registry_lock:
+            ModelDefinition.__registry.clear()
+
+    @staticmethod
+    def __get_or_create(key: tuple[str, int, bool], create: Callable[[], "ModelDefinition"], reuse: bool = True) -> "ModelDefinition":
+        """Get a definition from the registry, or create it and register it.
+        The registry lock is not held while the model is parsed, a lock for every key prevents parsing the same version twice at the same time"""
+        with ModelDefinition.__registry_lock:
+            definition = ModelDefinition.__registry.get(key)
+            if reuse and definition is not None:
+                return definition
+            lock = ModelDefinition.__loading_locks.setdefault(key, Lock())
+        try:
+            with lock:
+                if reuse:
+                    # Another thread may have loaded it while this one was waiting
+                    with ModelDefinition.__registry_lock:
+                        definition = ModelDefinition.__registry.get(key)
+                    if definition is not None:
+                        return definition
+                definition = create()
+                with ModelDefinition.__registry_lock:
+                    ModelDefinition.__registry[key] = definition
+                return definition
+        finally:
+            with ModelDefinition.__registry_lock:
+                if ModelDefinition.__loading_locks.get(key) is lock:
+                    del ModelDefinition.__loading_locks[key]
+
+    @staticmethod
+    def __get_key(path: str, lazy: bool) -> tuple[str, int, bool]:
+        """Get the key of a model file in the registry"""
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns, lazy)
+
+    def reload(self, changed_styles: Iterable[str] | None = None) -> "ModelDefinition":
+        """Get the definition of the current version of the model file, only the changed styles are rebuilt
+
+        Args:
+            changed_styles (Iterable[str] | None, optional): styles whose assets changed, rebuilt even if their entry in model.json did not change. Defaults to None.
+
+        Raises:
+            InvalidModelException: if the new model or one of the changed styles is not valid
+
+        Returns:
+            ModelDefinition: the new definition, or this one if nothing changed
+        """
+        if changed_styles is not None:
+            changed_styles = list(changed_styles)
+            if len(changed_styles) == 0:
+                changed_styles = None
+        key = ModelDefinition.__get_key(self.model_file, self.lazy)
+        # Another instance may have already reloaded the same version
+        return ModelDefinition.__get_or_create(key, lambda: ModelDefinition(self.model_file, self.lazy, previous=self, changed_styles=changed_styles),
+                                               reuse=changed_styles is None)
+
+    def get_changed_styles(self, previous: "ModelDefinition") -> list[str]:
+        """Get the styles rebuilt or removed since a previous definition
+
+        Args:
+            previous (ModelDefinition): previous definition of the model
+
+        Returns:
+            list[str]: names of the rebuilt and removed styles
+        """
+        changed = [style for style in self.styles if previous.styles.get(style) is not self.styles[style]]
+        return changed + [style for style in previous.styles if style not in self.styles]
+
+    def get_default_style(self) -> Style:
+        """Get the default style for the model
+
+        Returns:
+            Style: default style
+        """
+        if "default" in self.styles:
+            return self.styles["default"]
+        else:
+            return self.styles[list(self.styles.keys())[0]]
+
+    def validate_style(self, style: str):
+        """Validate a style of the model, if it has not been validated yet
+
+        Args:
+            style (str): name of the style
+
+        Raises:
+            InvalidModelException: if the style is not valid
+        """
+        with self.__validation_lock:
+            error = self.__validated_styles.get(style, False)
+        if error is False:
+            error = None
+            # Models loaded eagerly are already validated
+            if self.lazy:
+                try:
+                    ModelValidator.validate_style(self.model_info, style, self.path)
+                except InvalidModelException as e:
+                    error = e
+            with self.__validation_lock:
+                self.__validated_styles[style] = error
+        if error is not None:
+            raise error
+
+    def validate(self) -> dict[str, InvalidModelException]:
+        """Validate every style of the model
+
+        Returns:
+            dict[str, InvalidModelException]: the errors of the invalid styles
+        """
+        errors = {}
+        for style in self.model_info["styles"]:
+            try:
+                self.validate_style(style)
+            except InvalidModelException as e:
+                errors[style] = e
+        return errors
+
+    def get_frame_paths(self, key: tuple, calculate: Callable[[], list[str]]) -> list[str]:
+        """Get the resolved paths of the images of a variant, they are calculated only once for every instance
+
+        Args:
+            key (tuple): style, expression, variant and output type
+            calculate (Callable[[], list[str]]): function that resolves the paths
+
+        Returns:
+            list[str]: paths of the images
+        """
+        paths = self.__frame_paths.get(key)
+        if paths is None:
+            paths = calculate()
+            self.__frame_paths[key] = paths
+        return paths
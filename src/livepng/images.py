@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from threading import Lock, Thread
+import mmap
+import os
+
+
+class ImageStore:
+    """Cache of the content of the image files. Every file is read once as bytes, or memory mapped,
+    and kept in memory until the byte budget is exceeded, evicting the least recently used"""
+    max_bytes : int | None
+    use_mmap : bool
+
+    def __init__(self, max_bytes: int | None = None, use_mmap: bool = False) -> None:
+        """Initialize the store
+
+        Args:
+            max_bytes (int | None, optional): maximum size of the cached images in bytes, if None there is no limit. Defaults to None.
+            use_mmap (bool, optional): memory map the files instead of reading them. Defaults to False.
+        """
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        self.size = 0
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, path: str) -> bytes | memoryview:
+        """Get the content of an image file
+
+        Args:
+            path (str): path of the image
+
+        Returns:
+            bytes | memoryview: the content of the file, a memoryview if the file is memory mapped
+        """
+        with self.__lock:
+            if path in self.__entries:
+                self.__entries.move_to_end(path)
+                return self.__view(self.__entries[path])
+        data = self.__read(path)
+        self.__add(path, data)
+        return self.__view(data)
+
+    def preload(self, paths: Iterable[str], background: bool = True) -> Thread | None:
+        """Load some images in the store
+
+        Args:
+            paths (Iterable[str]): paths of the images
+            background (bool, optional): load them on another thread. Defaults to True.
+
+        Returns:
+            Thread | None: the started thread, if background is True
+        """
+        paths = list(paths)
+        if background:
+            t = Thread(target=self.__preload, args=(paths, ), daemon=True)
+            t.start()
+            return t
+        self.__preload(paths)
+        return None
+
+    def is_cached(self, path: str) -> bool:
+        """Check if an image is in the store"""
+        return path in self.__entries
+
+    def invalidate(self, directory: str):
+        """Remove the images in a directory from the store, after they changed on disk
+
+        Args:
+            directory (str): path of the directory
+        """
+        prefix = os.path.join(directory, "")
+        with self.__lock:
+            for path in [path for path in self.__entries if path.startswith(prefix)]:
+                self.size -= len(self.__entries.pop(path))
+
+    def clear(self):
+        """Remove every image from the store"""
+        with self.__lock:
+            self.__entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __preload(self, paths: list[str]):
+        """Load the images that are not in the store yet"""
+        for path in paths:
+            if not self.is_cached(path):
+                self.get(path)
+
+    def __read(self, path: str) -> bytes | mmap.mmap:
+        """Read a file as bytes, or memory map it"""
+        with open(path, "rb") as f:
+            if self.use_mmap and os.fstat(f.fileno()).st_size > 0:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def __view(self, data: bytes | mmap.mmap) -> bytes | memoryview:
+        """Return the bytes, or a zero copy view of a mapped file"""
+        if isinstance(data, mmap.mmap):
+            return memoryview(data)
+        return data
+
+    def __add(self, path: str, data: bytes | mmap.mmap):
+        """Add an entry, evicting the least recently used ones if the budget is exceeded"""
+        with self.__lock:
+            if path in self.__entries:
+                return
+            self.__entries[path] = data
+            self.size += len(data)
+            # Always keep the last image, even if it is bigger than the budget
+            while self.max_bytes is not None and self.size > self.max_bytes and len(self.__entries) > 1:
+                _, evicted = self.__entries.popitem(last=False)
+                self.size -= len(evicted)
@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 from . import constants
 from .exceptions import NoFolderInspectedException, WrongFormatException 
+from .thresholds import THRESHOLDS_KEY, get_raw_images, get_raw_variants
 import json
 
 class ModelInspector:
@@ -15,24 +17,203 @@ class ModelInspector:
         self.name = name 
         self.json_model = None
         self.directory = None
+        self.scanned_directories = 0
+        self.__previous = None
+        self.__existing = None
+        self.__reference_time = None
 
-    def analyze_directory(self, path: str):
+    def analyze_directory(self, path: str, incremental: bool = False) -> bool:
         """Analyze the model from the given path
 
         Args:
             path (str): path of the folder
+            incremental (bool, optional): reuse the content of the existing model.json for the directories
+                that have not been modified since it was saved. Defaults to False.
 
         Raises:
             WrongFormatException: if the modle is in the wrong format
+
+        Returns:
+            bool: True if the model data is different from the existing model.json
         """
         assets_dir = os.path.join(path, constants.ASSETS_DIR_NAME)
+        previous = self.__load_previous(path)
+        if not os.path.isdir(assets_dir) and isinstance(previous, dict) and "atlas" in previous:
+            self.__reference_time = None
+            self.analyze_atlas(path)
+            return self.json_model != previous
         if not os.path.isdir(assets_dir):
+            self.__reference_time = None
             raise WrongFormatException("There is no " + constants.ASSETS_DIR_NAME + " directory in the specified path")
+        self.__previous = previous if incremental else None
+        self.__existing = previous
+        self.scanned_directories = 0
         self.json_model = {}
         self.__set_root_info()
-        self.__inspect_assets(assets_dir)
+        try:
+            self.__inspect_assets(assets_dir)
+        finally:
+            self.__previous = None
+            self.__existing = None
+            self.__reference_time = None
+        self.__keep_thresholds(previous)
+        self.__keep_extra_keys(previous)
         self.directory = path
+        # The kept keys are equal to the existing ones, only the generated part can differ
+        return self.json_model != previous
+
+    @staticmethod
+    def inspect_models(paths: list[str], workers: int | None = None, incremental: bool = True) -> dict[str, bool | WrongFormatException]:
+        """Create the model.json of many models in parallel, the name of every model is the name of its folder.
+        The model.json files are only written if they changed
+
+        Args:
+            paths (list[str]): paths of the model folders
+            workers (int | None, optional): number of threads. Defaults to None, the ThreadPoolExecutor default.
+            incremental (bool, optional): only scan the directories modified since the last run. Defaults to True.
+
+        Returns:
+            dict[str, bool | WrongFormatException]: path -> if the model changed, or the exception if the model is in the wrong format
+        """
+        def inspect(path: str) -> bool | WrongFormatException:
+            inspector = ModelInspector(os.path.basename(os.path.normpath(path)))
+            try:
+                changed = inspector.analyze_directory(path, incremental)
+            except WrongFormatException as e:
+                return e
+            if changed:
+                inspector.save_model()
+            return changed
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(paths, executor.map(inspect, paths)))
     
+    def analyze_atlas(self, path: str):
+        """Analyze a packed model from the index of its atlas
+
+        Args:
+            path (str): path of the folder
+
+        Raises:
+            WrongFormatException: if the model is not packed
+        """
+        if not self.__is_packed(path):
+            raise WrongFormatException("The model in the specified path is not packed")
+        with open(os.path.join(path, constants.MODEL_FILE_NAME), "r") as f:
+            existing = json.loads(f.read())
+        atlas = existing["atlas"]
+        self.json_model = {}
+        self.__set_root_info()
+        for key in atlas["images"]:
+            style, expression, variant, image = key.split("/", 3)
+            expressions = self.json_model["styles"].setdefault(style, {"expressions": {}})["expressions"]
+            expressions.setdefault(expression, {}).setdefault(variant, []).append(image)
+        if len(self.json_model["styles"]) == 0:
+            raise WrongFormatException("There are no styles in the atlas")
+        self.__keep_thresholds(existing)
+        self.__keep_extra_keys(existing)
+        self.directory = path
+
+    def __is_packed(self, path: str) -> bool:
+        """Check if the model in the given folder is packed"""
+        model_file = os.path.join(path, constants.MODEL_FILE_NAME)
+        if not os.path.isfile(model_file):
+            return False
+        with open(model_file, "r") as f:
+            return "atlas" in json.loads(f.read())
+
+    def __load_previous(self, path: str) -> dict | None:
+        """Load the existing model.json and remember when it was written"""
+        model_file = os.path.join(path, constants.MODEL_FILE_NAME)
+        try:
+            with open(model_file, "r") as f:
+                previous = json.loads(f.read())
+            self.__reference_time = os.stat(model_file).st_mtime_ns
+        except (OSError, ValueError):
+            return None
+        if not isinstance(previous, dict):
+            return None
+        return previous
+
+    def __list_directory(self, path: str, previous: dict | list | None) -> tuple[list[str], list[str]] | None:
+        """List the subdirectories and the files of a directory with scandir.
+        If the directory has not been modified since the previous model.json was written, returns None
+        so that its previous content is reused"""
+        if previous is not None and self.__reference_time is not None:
+            # Adding, removing or renaming an entry updates the mtime of its directory
+            if os.stat(path).st_mtime_ns < self.__reference_time:
+                return None
+        self.scanned_directories += 1
+        directories = []
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        return directories, files
+
+    def __get_previous(self, *keys: str) -> dict | list | None:
+        """Get an entry of the previous model.json, None if it is missing or if the inspection is not incremental"""
+        node = self.__previous
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    def __keep_order(self, images: list[str], style: str, expression: str, variant: str) -> list[str]:
+        """Sort the scanned images of a variant like in the existing model.json, since their order is the animation order.
+        New images follow in the order of the directory listing"""
+        existing = self.__existing
+        for key in ("styles", style, "expressions", expression):
+            if not isinstance(existing, dict) or key not in existing:
+                return images
+            existing = existing[key]
+        existing = get_raw_variants(existing).get(variant)
+        if existing is None:
+            return images
+        scanned = set(images)
+        ordered = [image for image in get_raw_images(existing) if image in scanned]
+        kept = set(ordered)
+        return ordered + [image for image in images if image not in kept]
+
+    def __keep_thresholds(self, existing: dict | None):
+        """Copy the threshold overrides of the existing model.json, since they can not be inferred from the directories"""
+        if self.json_model is None or not isinstance(existing, dict):
+            return
+        if THRESHOLDS_KEY in existing:
+            self.json_model[THRESHOLDS_KEY] = existing[THRESHOLDS_KEY]
+        existing_styles = existing.get("styles")
+        if not isinstance(existing_styles, dict):
+            return
+        for style, style_info in self.json_model["styles"].items():
+            existing_style = existing_styles.get(style)
+            if not isinstance(existing_style, dict) or not isinstance(existing_style.get("expressions"), dict):
+                continue
+            if THRESHOLDS_KEY in existing_style:
+                style_info[THRESHOLDS_KEY] = existing_style[THRESHOLDS_KEY]
+            expressions = style_info["expressions"]
+            for expression, variants in expressions.items():
+                existing_expression = existing_style["expressions"].get(expression)
+                if not isinstance(existing_expression, dict):
+                    continue
+                existing_variants = get_raw_variants(existing_expression)
+                for variant, images in variants.items():
+                    existing_variant = existing_variants.get(variant)
+                    if isinstance(existing_variant, dict) and THRESHOLDS_KEY in existing_variant:
+                        variants[variant] = {"images": images, THRESHOLDS_KEY: existing_variant[THRESHOLDS_KEY]}
+                if existing_variants is not existing_expression and THRESHOLDS_KEY in existing_expression:
+                    expressions[expression] = {"variants": variants, THRESHOLDS_KEY: existing_expression[THRESHOLDS_KEY]}
+
+    def __keep_extra_keys(self, existing: dict | None):
+        """Copy the root keys of the existing model.json that are not generated by the inspector, like the atlas of packed models"""
+        if self.json_model is None or not isinstance(existing, dict):
+            return
+        for key, value in existing.items():
+            if key not in self.json_model:
+                self.json_model[key] = value
+
     def __set_root_info(self):
         """Set the name and the version of the model"""
         if self.json_model is None:
@@ -45,7 +226,9 @@ class ModelInspector:
         """Analyze styles subdirectories from the given model path"""
         if self.json_model is None:
             return
-        styles = [subpath for subpath in os.listdir(path) if os.path.isdir(os.path.join(path, subpath))]
+        previous = self.__get_previous("styles")
+        listing = self.__list_directory(path, previous)
+        styles = list(previous) if listing is None else listing[0]
         if len(styles) == 0:
             raise WrongFormatException("There are no styles in the assets dir")
         for style in styles:
@@ -53,12 +236,13 @@ class ModelInspector:
 
     def __inspect_style(self, style_path:str, style:str):
         """Analyze expressions in the given style"""
-        print(style_path)
         if self.json_model is None:
             return
         self.json_model["styles"][style] = {}
         self.json_model["styles"][style]["expressions"] = {}
-        expressions = [subpath for subpath in os.listdir(style_path) if os.path.isdir(os.path.join(style_path, subpath))]
+        previous = self.__get_previous("styles", style, "expressions")
+        listing = self.__list_directory(style_path, previous)
+        expressions = list(previous) if listing is None else listing[0]
         if len(expressions) == 0:
             raise WrongFormatException("Style " + style + " has no expressions")
         for expression in expressions:
@@ -68,17 +252,25 @@ class ModelInspector:
         if self.json_model is None:
             return
         self.json_model["styles"][style]["expressions"][expression] = {}
-        variants = [subpath for subpath in os.listdir(expression_path) if os.path.isdir(os.path.join(expression_path, subpath))]
+        previous = self.__get_previous("styles", style, "expressions", expression)
+        if isinstance(previous, dict):
+            previous = get_raw_variants(previous)
+        listing = self.__list_directory(expression_path, previous)
+        variants = list(previous) if listing is None else listing[0]
         if len(variants) == 0:
             raise WrongFormatException("Expression " + expression + " of style " + style + " has no variants")
         for variant in variants:
-            self.__inspect_images(os.path.join(expression_path, variant), style, expression, variant)
+            self.__inspect_images(os.path.join(expression_path, variant), style, expression, variant,
+                                  previous.get(variant) if isinstance(previous, dict) else None)
 
-    def __inspect_images(self, variant_path, style, expression, variant):
+    def __inspect_images(self, variant_path, style, expression, variant, previous):
         if self.json_model is None:
             return
         self.json_model["styles"][style]["expressions"][expression][variant] = []
-        images = [file for file in os.listdir(variant_path) if os.path.isfile(os.path.join(variant_path, file))]
+        if previous is not None:
+            previous = get_raw_images(previous)
+        listing = self.__list_directory(variant_path, previous)
+        images = list(previous) if listing is None else self.__keep_order(listing[1], style, expression, variant)
         for image in images:
             self.json_model["styles"][style]["expressions"][expression][variant].append(image)
     
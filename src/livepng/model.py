@@ -1,74 +1,237 @@
-from collections.abc import Callable
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+from collections import deque
+from queue import Empty, Full, Queue
 import os, json
+import copy
+import asyncio
+import random
+import time
 from threading import Semaphore
 import threading
 from pydub import AudioSegment
-from time import sleep
 import pyaudio
 
-from livepng import constants
+from livepng import constants, amplitude
 from livepng.constants import FilepathOutput 
-from livepng.exceptions import NotFoundException, NotLoadedException
+from livepng.exceptions import InvalidModelException, NotFoundException, NotLoadedException
 from livepng.observer import LivePNGModelObserver
 from livepng.objects import Variant, Style, Expression
 from .validator import ModelValidator
+from .cache import AmplitudeCache
+from .images import ImageStore
+from .atlas import ModelAtlas
+from .definition import ModelDefinition
+from .audio import AudioOutput, PyAudioOutput
+from .scheduler import FrameScheduler, FrameStats, SharedScheduler, Timeline
+from .watcher import ModelWatcher
+from .aio import AsyncCallback, FrameQueue
+from .batch import TimelineFile
+from .analyzers import AmplitudeAnalyzer, get_normalization
+from .stream import PCMWindower, WavStream, STREAM_LOOKAHEAD, STREAM_QUEUE_TIMEOUT, STREAM_STOP_TIMEOUT, is_async_iterable, iterate_chunks
+from .wav import WavAudio, load_audio
+
+"""Error given when the path of an image of a packed model without the assets folder is requested"""
+NO_ASSETS_MESSAGE = "The model is packed without the assets folder, its images have no path: use FilepathOutput.IMAGE_DATA"
 
 class LivePNG:
     """Main class rapresenting a LivePNG model"""
     observers : list[LivePNGModelObserver]
     callbackfunctions : list[Callable]
+    indexcallbackfunctions : list[Callable]
 
-    name : str
-    version : int
-    styles : dict[str, Style]
     current_style : Style
     current_expression : Expression
     current_variant : Variant
     output_type : FilepathOutput
-    path : str
+    definition : ModelDefinition
+    amplitude_cache : AmplitudeCache | None
+    image_store : ImageStore
+
+    frame_stats : FrameStats
+    load_time : float
+    rng : random.Random | None
 
     __speak_lock : Semaphore
-    __request_interrupt : bool
+    __request_interrupt : threading.Event
 
-    def __init__(self, path: str, output_type:FilepathOutput=FilepathOutput.LOCAL_PATH) -> None:
+    def __init__(self, path: str | ModelDefinition, output_type:FilepathOutput|None=None, amplitude_cache: AmplitudeCache | None = None, image_store: ImageStore | None = None, lazy: bool = False, background_validation: bool = True, shared: bool = True) -> None:
         """Initialize a LivePNG model
 
         Args:
-            path (str): path to the json file of the model
-            output_type (FilepathOutput, optional): What type of output to give for the images. Defaults to FilepathOutput.LOCAL_PATH.
+            path (str | ModelDefinition): path to the json file of the model, or an already loaded model definition
+            output_type (FilepathOutput | None, optional): What type of output to give for the images. If None, FilepathOutput.LOCAL_PATH,
+                or FilepathOutput.IMAGE_DATA for packed models without the assets folder, whose images have no path. Defaults to None.
+            amplitude_cache (AmplitudeCache | None, optional): Cache for the amplitudes of the audio files, can be shared between models. Defaults to None.
+            image_store (ImageStore | None, optional): Cache for the content of the images, if None the one of the model definition is used. Defaults to None.
+            lazy (bool, optional): Only parse model.json when the model is loaded. Expressions and variants are created the first time they are accessed, 
+                and every style is validated before it is used. If False, the whole model is validated when it is loaded. Defaults to False.
+            background_validation (bool, optional): In lazy mode, validate the styles on another thread after loading. Defaults to True.
+            shared (bool, optional): Share the model definition with the other instances loading the same version of the same file,
+                so that the model is parsed and validated only once. Defaults to True.
+
+        Raises:
+            NotFoundException: if a path output type is requested for a packed model without the assets folder
         """
-        
-        self.output_type = output_type
-        self.path = path
+        start_time = time.perf_counter()
+        self.amplitude_cache = amplitude_cache
         # Initialize observers list
         self.observers = []
         self.callbackfunctions = []
+        self.indexcallbackfunctions = []
         # Initialize locks for playback
         self.__speak_lock = Semaphore(1)
-        self.__request_interrupt = False
+        self.__request_interrupt = threading.Event()
+        self.__reload_lock = threading.Lock()
+        self.__timelines = []
+        self.frame_stats = FrameStats()
+        # Random number generator of the variants, set it to a seeded random.Random for reproducible choices
+        self.rng = None
         # Load the model
-        with open(path, "r") as f:
-            self.model_info = json.loads(f.read())
-        self.path = os.path.dirname(self.path)
-        ModelValidator.validate_json(self.model_info, os.path.dirname(path))
-        self.load_model()
+        if isinstance(path, ModelDefinition):
+            self.definition = path
+        elif shared:
+            self.definition = ModelDefinition.load(path, lazy, background_validation)
+        else:
+            self.definition = ModelDefinition(path, lazy, background_validation)
+        self.image_store = image_store if image_store is not None else self.definition.image_store
+        if output_type is None:
+            output_type = FilepathOutput.LOCAL_PATH if self.definition.has_assets else FilepathOutput.IMAGE_DATA
+        elif output_type != FilepathOutput.IMAGE_DATA and not self.definition.has_assets:
+            raise NotFoundException(NO_ASSETS_MESSAGE)
+        self.output_type = output_type
         self.load_defaults()
+        self.load_time = time.perf_counter() - start_time
+
+    # Model definition, shared between the instances
+
+    @property
+    def name(self) -> str:
+        """Name of the model"""
+        return self.definition.name
+
+    @property
+    def version(self) -> int:
+        """Version of the model format"""
+        return self.definition.version
+
+    @property
+    def styles(self) -> dict[str, Style]:
+        """Styles of the model"""
+        return self.definition.styles
+
+    @property
+    def model_info(self) -> dict:
+        """Content of the model.json file"""
+        return self.definition.model_info
+
+    @property
+    def path(self) -> str:
+        """Path to the folder of the model"""
+        return self.definition.path
+
+    @property
+    def model_file(self) -> str:
+        """Path to the json file of the model"""
+        return self.definition.model_file
+
+    @property
+    def atlas(self) -> ModelAtlas | None:
+        """Atlas of the images, if the model is packed"""
+        return self.definition.atlas
+
+    @property
+    def lazy(self) -> bool:
+        """If the model is loaded lazily"""
+        return self.definition.lazy
 
     def load_model(self):
-        """Load the model"""
-        self.version = self.model_info["version"]
-        self.name = self.model_info["name"]
-        self.styles = {}
-        for style in self.model_info["styles"]:
-            stl = Style(style, self.model_info["styles"][style]["expressions"])
-            self.styles[style] = stl
+        """Load the model again from its json file, with a new definition that is not shared"""
+        self.definition = ModelDefinition(self.model_file, self.lazy)
+        self.load_defaults()
                 
     def load_defaults(self):
         """Set the default style, expression and variant"""
+        self.validate_style(str(self.get_default_style()))
         self.current_style = self.get_default_style()
         self.current_expression = self.current_style.get_default_expression()
         self.current_variant = self.current_expression.get_default_variant()
     
+    def validate_style(self, style: str):
+        """Validate a style of the model, if it has not been validated yet
+
+        Args:
+            style (str): name of the style
+
+        Raises:
+            InvalidModelException: if the style is not valid
+        """
+        self.definition.validate_style(style)
+
+    def reload(self, styles: Iterable[str] | None = None) -> list[str]:
+        """Read model.json again and rebuild only the styles that changed. The new definition is swapped in at once,
+        and a running speech continues with the new images. If the new model is not valid, the current one is kept
+
+        Args:
+            styles (Iterable[str] | None, optional): styles whose assets changed, rebuilt even if their entry in model.json did not change. Defaults to None.
+
+        Raises:
+            InvalidModelException: if the new model or one of the changed styles is not valid
+
+        Returns:
+            list[str]: names of the rebuilt and removed styles
+        """
+        previous = self.definition
+        definition = previous.reload(styles)
+        if definition is previous:
+            return []
+        reloaded = definition.get_changed_styles(previous)
+        with self.__reload_lock:
+            self.definition = definition
+            current = str(self.current_style)
+            if current in reloaded:
+                # Keep the current expression and variant if they still exist
+                style = self.styles.get(current, self.get_default_style())
+                expression = style.get_expressions().get(str(self.current_expression), style.get_default_expression())
+                variant = expression.get_variants().get(str(self.current_variant), expression.get_default_variant())
+                self.current_style, self.current_expression, self.current_variant = style, expression, variant
+        for style in reloaded:
+            self.image_store.invalidate(os.path.join(self.path, constants.ASSETS_DIR_NAME, style))
+        self.__notify_reload(reloaded)
+        # Show the new image, unless a speech is updating the frames
+        if self.__speak_lock.acquire(blocking=False):
+            self.__update_frame()
+            self.__speak_lock.release()
+        return reloaded
+
+    def watch(self, interval: float = 1.0) -> ModelWatcher:
+        """Start watching the files of the model, reloading it when they change
+
+        Args:
+            interval (float, optional): seconds between two checks of the files. Defaults to 1.0.
+
+        Returns:
+            ModelWatcher: the started watcher, stop it with ModelWatcher.stop()
+        """
+        watcher = ModelWatcher(self, interval)
+        watcher.start()
+        return watcher
+
+    def validate(self) -> dict[str, InvalidModelException]:
+        """Validate every style of the model
+
+        Returns:
+            dict[str, InvalidModelException]: the errors of the invalid styles
+        """
+        return self.definition.validate()
+
+    def get_load_time(self) -> float:
+        """Get the time taken to load the model
+
+        Returns:
+            float: loading time in seconds
+        """
+        return self.load_time
+
     # Main getters and setters
     
     def get_name(self) -> str:
@@ -93,18 +256,15 @@ class LivePNG:
         Returns:
             Style: default style
         """
-        if "default" in self.styles:
-            return self.styles["default"]
-        else:
-            return self.styles[list(self.styles.keys())[0]]
+        return self.definition.get_default_style()
 
     def get_model_info(self) -> dict:
         """Extracted information from the model.json file
 
         Returns:
-            dict: extracted information
+            dict: a copy of the extracted information, the definition is shared by other instances
         """
-        return self.model_info
+        return copy.deepcopy(self.model_info)
 
     def get_current_style(self) -> Style:
         """Get the current style of the model
@@ -130,6 +290,7 @@ class LivePNG:
         """
         style = str(style)   
         if style in self.styles:
+            self.validate_style(style)
             self.current_style = self.styles[style]
             self.set_current_expression()
         else:
@@ -193,15 +354,16 @@ class LivePNG:
         self.__update_frame()
         self.__update_variant()
 
-    def randomize_variant(self, weights : dict[str | Variant, int] | None = None):
+    def randomize_variant(self, weights : dict[str | Variant, int] | None = None, rng: random.Random | None = None):
         """Set a random variant from the current expression
 
         Args:
             weights (dict[str  |  Variant, int] | None, optional): The dict that maps variants to their weights.
                 Wrights are supposed to be integers, the higher is the weight, the higher is the probability. If None,
                  every expression has the same probability. Defaults to None.. Defaults to None.
+            rng (random.Random | None, optional): random number generator, if None the one of the model is used. Defaults to None.
         """
-        variant = self.current_expression.get_random_variant(weights)
+        variant = self.current_expression.get_random_variant(weights, rng if rng is not None else self.rng)
         self.set_current_variant(variant)
 
     def get_current_variant(self) -> Variant:
@@ -212,19 +374,19 @@ class LivePNG:
         """
         return self.current_variant
 
-    def get_current_image(self, output_type: FilepathOutput | None = None) -> str:
+    def get_current_image(self, output_type: FilepathOutput | None = None) -> str | bytes | memoryview:
         """Get the default image of the current variant
 
         Args:
             output_type (FilepathOutput | None, optional): File output type. Defaults to None.
 
         Returns:
-            str: path of the image
+            str | bytes | memoryview: path of the image, or its content for FilepathOutput.IMAGE_DATA
         """
         return self.get_image_path(self.get_current_variant().get_images()[0], output_type)
     
     # Get file path
-    def get_file_path(self, style : str | Style, expression: str | Expression, variant: str | Variant, image: str, output_type: FilepathOutput | None = None) -> str:
+    def get_file_path(self, style : str | Style, expression: str | Expression, variant: str | Variant, image: str, output_type: FilepathOutput | None = None) -> str | bytes | memoryview:
         """Get the path of a file
 
         Args:
@@ -238,12 +400,33 @@ class LivePNG:
             NotFoundException: if one of the arguments does not exist
 
         Returns:
-            str: the specified path for the output type
+            str | bytes | memoryview: the specified path for the output type, or the content of the image for FilepathOutput.IMAGE_DATA
         """
         if output_type is None:
             output_type = self.output_type
 
         model_path = os.path.join(constants.ASSETS_DIR_NAME, str(style), str(expression), str(variant), image)
+        if output_type == FilepathOutput.IMAGE_DATA:
+            if self.atlas is not None:
+                return self.atlas.get_image(str(style), str(expression), str(variant), image)
+            return self.image_store.get(os.path.join(self.path, model_path))
+        return self.__resolve_path(model_path, output_type)
+
+    def __resolve_path(self, model_path: str, output_type: FilepathOutput) -> str:
+        """Get the path of a file for the output type
+
+        Args:
+            model_path (str): path of the file from the model folder
+            output_type (FilepathOutput): output type, it must be a path
+
+        Raises:
+            NotFoundException: if the output type is not valid, or the model is packed without the assets folder
+
+        Returns:
+            str: the path for the output type
+        """
+        if not self.definition.has_assets:
+            raise NotFoundException(NO_ASSETS_MESSAGE)
         match output_type:
             case FilepathOutput.MODEL_PATH:
                 return model_path
@@ -251,12 +434,10 @@ class LivePNG:
                 return os.path.join(self.path, model_path)
             case FilepathOutput.FULL_PATH:
                 return os.path.abspath(os.path.join(self.path, model_path))
-            case FilepathOutput.IMAGE_DATA:
-                return open(os.path.join(self.path, model_path), "r").read()
             case _:
                 raise NotFoundException("The provided output type is not valid")
 
-    def get_image_path(self, img: str, output_type: FilepathOutput | None = None) -> str:
+    def get_image_path(self, img: str, output_type: FilepathOutput | None = None) -> str | bytes | memoryview:
         """Quickly return an image from the current style, expression and variant
 
         Args:
@@ -264,13 +445,86 @@ class LivePNG:
             output_type (FilepathOutput | None, optional): output type. Defaults to None.
 
         Returns:
-            str: file path
+            str | bytes | memoryview: file path, or its content for FilepathOutput.IMAGE_DATA
         """
         return self.get_file_path(self.current_style, self.current_expression, self.current_variant, img, output_type)
 
+    # Image data
+
+    def get_image_data(self, style : str | Style, expression: str | Expression, variant: str | Variant, image: str) -> bytes | memoryview:
+        """Get the content of an image, read only once and then kept in the image store
+
+        Args:
+            style (str | Style): style of the model
+            expression (str | Expression): expression of the model
+            variant (str | Variant): variant of the model
+            image (str): image name
+
+        Returns:
+            bytes | memoryview: content of the image, a memoryview if the store uses mmap
+        """
+        data = self.get_file_path(style, expression, variant, image, FilepathOutput.IMAGE_DATA)
+        assert not isinstance(data, str)
+        return data
+
+    def get_image_region(self, style : str | Style, expression: str | Expression, variant: str | Variant, image: str) -> tuple[int, int]:
+        """Get the region of an image in the atlas file of a packed model
+
+        Args:
+            style (str | Style): style of the model
+            expression (str | Expression): expression of the model
+            variant (str | Variant): variant of the model
+            image (str): image name
+
+        Raises:
+            NotFoundException: if the model is not packed or the image is not in the atlas
+
+        Returns:
+            tuple[int, int]: offset and length of the image in the atlas file
+        """
+        if self.atlas is None:
+            raise NotFoundException("The model is not packed")
+        return self.atlas.get_region(str(style), str(expression), str(variant), image)
+
+    def get_current_image_data(self, image: str | None = None) -> bytes | memoryview:
+        """Get the content of an image of the current variant
+
+        Args:
+            image (str | None, optional): image name, if None the default image of the variant is used. Defaults to None.
+
+        Returns:
+            bytes | memoryview: content of the image
+        """
+        if image is None:
+            image = self.get_current_variant().get_images()[0]
+        return self.get_image_data(self.current_style, self.current_expression, self.current_variant, image)
+
+    def preload_images(self, current_style: bool = False, background: bool = True) -> threading.Thread | None:
+        """Load the images of the model in the image store
+
+        Args:
+            current_style (bool, optional): only load the images of the current style. Defaults to False.
+            background (bool, optional): load the images on another thread. Defaults to True.
+
+        Returns:
+            threading.Thread | None: the loading thread, if background is True
+        """
+        # Packed models only need to map the atlas file
+        if self.atlas is not None:
+            self.atlas.get_view()
+            return None
+        styles = [str(self.current_style)] if current_style else list(self.styles)
+        paths = []
+        for style in styles:
+            for expression in self.styles[style].get_expressions().values():
+                for variant in expression.get_variants().values():
+                    for image in variant.get_images():
+                        paths.append(self.get_file_path(style, expression, variant, image, FilepathOutput.LOCAL_PATH))
+        return self.image_store.preload(paths, background)
+
     # Speaking
 
-    def speak(self, wavfile: str, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, start_thread:bool=False):
+    def speak(self, wavfile: str, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, start_thread:bool=False, stream:bool=False, sync_audio:bool=False, audio_output:AudioOutput|None=None, scheduler:SharedScheduler|None=None, timeline_file:str|TimelineFile|None=None, analyzer:AmplitudeAnalyzer|None=None) -> Timeline | None:
         """Play an audio file with lipsync. Not started on another thread.
 
         Args:
@@ -280,14 +534,246 @@ class LivePNG:
             frame_rate (int, optional): FPS to play. Defaults to 10.
             interrupt_others (bool, optional): If interrupt the speak function or wait for it. Defaults to True.
             start_thread (bool, optional): If the lipsync must start on another thread. Defaults to False
+            stream (bool, optional): Read the .wav file while speaking instead of decoding it before starting. 
+                The first frame is shown immediately and memory usage does not depend on the length of the file. Defaults to False
+            sync_audio (bool, optional): If the audio is played, take the frames from the playback position of the audio device instead of the system clock,
+                so that they follow what the listener hears. Defaults to False
+            audio_output (AudioOutput | None, optional): Play the audio on the given output and sync the frames with it. Defaults to None
+            scheduler (SharedScheduler | None, optional): Register the frames in a scheduler shared by many models instead of starting threads.
+                The function returns after the audio is analyzed, the frames follow the system clock. Defaults to None
+            timeline_file (str | TimelineFile | None, optional): Frames precalculated by livepng.batch for this audio file, 
+                the audio is not analyzed and the frame rate of the timeline is used. Defaults to None
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, if None the mean of the absolute values of the samples. Defaults to None
+
+        Returns:
+            Timeline | None: the timeline registered in the scheduler, if any
         """
+        if isinstance(timeline_file, str):
+            timeline_file = TimelineFile.load(timeline_file)
+        if timeline_file is not None:
+            frame_rate = timeline_file.frame_rate
+        if scheduler is not None:
+            return self.__speak_shared(wavfile, random_variant, play_audio, frame_rate, interrupt_others, audio_output, scheduler, timeline_file, analyzer)
+        output = self.__get_audio_output(play_audio, sync_audio, audio_output)
+        if stream and timeline_file is None:
+            wav = WavStream(wavfile, frame_rate)
+            target = self.__speak_stream
+            args = (wavfile, wav, wav.get_windower(), random_variant, play_audio, frame_rate, interrupt_others, output, analyzer)
+        else:
+            target = self.__speak
+            args = (wavfile, random_variant, play_audio, frame_rate, interrupt_others, output, timeline_file, analyzer)
         if start_thread:
-            t = threading.Thread(target=self.__speak, args=(wavfile, random_variant, play_audio, frame_rate, interrupt_others))
+            t = threading.Thread(target=target, args=args)
             t.start()
         else:
-            self.__speak(wavfile, random_variant, play_audio, frame_rate, interrupt_others)
+            target(*args)
+        return None
     
-    def __speak(self, wavfile: str, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True):
+    def speak_stream(self, chunks: Iterable[bytes] | AsyncIterable[bytes], sample_rate: int, sample_width: int = 2, channels: int = 1, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, start_thread:bool=False, name:str="", sync_audio:bool=False, audio_output:AudioOutput|None=None, analyzer:AmplitudeAnalyzer|None=None):
+        """Play raw PCM audio with lipsync while it is produced, for example by a TTS engine.
+
+        Args:
+            chunks (Iterable[bytes] | AsyncIterable[bytes]): chunks of raw little endian PCM data, of any size.
+                Async iterables are consumed on the event loop running in the calling thread, if any, 
+                in that case the lipsync is always started on another thread.
+            sample_rate (int): sample rate of the audio
+            sample_width (int, optional): bytes per sample. Defaults to 2.
+            channels (int, optional): number of channels. Defaults to 1.
+            random_variant (bool, optional): Randomize variant when start speaking. Defaults to True.
+            play_audio (bool, optional): Play the audio. Defaults to False.
+            frame_rate (int, optional): FPS to play. Defaults to 10.
+            interrupt_others (bool, optional): If interrupt the speak function or wait for it. Defaults to True.
+            start_thread (bool, optional): If the lipsync must start on another thread. Defaults to False
+            name (str, optional): name of the audio given to the observers. Defaults to "".
+            sync_audio (bool, optional): If the audio is played, take the frames from the playback position of the audio device instead of the system clock. Defaults to False
+            audio_output (AudioOutput | None, optional): Play the audio on the given output and sync the frames with it. Defaults to None
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, if None the mean of the absolute values of the samples. Defaults to None
+        """
+        loop = None
+        if is_async_iterable(chunks):
+            try:
+                loop = asyncio.get_running_loop()
+                start_thread = True
+            except RuntimeError:
+                loop = None
+        windower = PCMWindower(sample_rate, sample_width, channels, frame_rate)
+        windows = windower.windows(iterate_chunks(chunks, loop))
+        args = (name, windows, windower, random_variant, play_audio, frame_rate, interrupt_others, self.__get_audio_output(play_audio, sync_audio, audio_output), analyzer)
+        if start_thread:
+            t = threading.Thread(target=self.__speak_stream, args=args)
+            t.start()
+        else:
+            self.__speak_stream(*args)
+
+    async def speak_async(self, wavfile: str, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, audio_output:AudioOutput|None=None, timeline_file:str|TimelineFile|None=None, analyzer:AmplitudeAnalyzer|None=None):
+        """Play an audio file with lipsync on the running event loop. The frames are timed with the event loop, 
+        the audio is decoded on the default executor. Cancel the task to stop speaking.
+
+        Args:
+            wavfile (str): path to the .wav file
+            random_variant (bool, optional): Randomize variant when start speaking. Defaults to True.
+            play_audio (bool, optional): Play the audio, the frames follow its playback position. Defaults to False.
+            frame_rate (int, optional): FPS to play. Defaults to 10.
+            interrupt_others (bool, optional): If interrupt the speak function or wait for it. Defaults to True.
+            audio_output (AudioOutput | None, optional): Play the audio on the given output and sync the frames with it. Defaults to None
+            timeline_file (str | TimelineFile | None, optional): Frames precalculated by livepng.batch for this audio file. Defaults to None
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, if None the mean of the absolute values of the samples. Defaults to None
+        """
+        loop = asyncio.get_running_loop()
+        if isinstance(timeline_file, str):
+            timeline_file = await loop.run_in_executor(None, TimelineFile.load, timeline_file)
+        if timeline_file is not None:
+            frame_rate = timeline_file.frame_rate
+        output = self.__get_audio_output(play_audio, True, audio_output)
+        # Interrupt others and take the lock, without blocking the loop
+        if interrupt_others:
+            self.__request_interrupt.set()
+        acquiring = loop.run_in_executor(None, self.__speak_lock.acquire)
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The executor takes the lock anyway, give it back as soon as it has it
+            acquiring.add_done_callback(lambda _: self.__speak_lock.release())
+            raise
+        self.__request_interrupt.clear()
+        started = False
+        closing = None
+        writing = None
+        try:
+            if random_variant:
+                self.randomize_variant()
+            audio = None
+            data = None
+            if output is not None:
+                audio = await loop.run_in_executor(None, load_audio, wavfile)
+                # The write outlives the mapped file, copy the data so that the file can be overwritten meanwhile
+                data = await loop.run_in_executor(None, bytes, audio.raw_data)
+            frames = await loop.run_in_executor(None, self.__get_frames, wavfile, frame_rate, audio, timeline_file, analyzer)
+            clock = None
+            if output is not None and audio is not None:
+                output.open(audio.frame_rate, audio.sample_width, audio.channels)
+                # write blocks until the audio fits in the output buffer
+                writing = loop.run_in_executor(None, output.write, data)
+                clock = output.get_position
+            scheduler = self.__get_scheduler(frame_rate, clock)
+            if writing is not None:
+                # The playback position stops if the output fails, the frames would wait for it forever
+                failed = lambda: writing.done() and not writing.cancelled() and writing.exception() is not None
+                scheduler.should_stop = lambda: self.__request_interrupt.is_set() or failed()
+            self.frame_stats = scheduler.stats
+            self.__notify_speak_start(wavfile)
+            started = True
+            scheduler.start()
+            for i, frame in enumerate(frames):
+                if scheduler.should_stop():
+                    break
+                if await scheduler.wait_async(i):
+                    self.__update_frame(frame)
+            else:
+                await scheduler.wait_end_async(len(frames))
+                if writing is not None:
+                    await writing
+                if output is not None:
+                    closing = loop.run_in_executor(None, output.close, True)
+                    await closing
+            self.frame_stats = scheduler.stats
+        finally:
+            # Stop the audio if the speech has been interrupted or cancelled
+            if output is not None and closing is None:
+                output.close(drain=False)
+            if writing is not None and not writing.done():
+                # Closing the output wakes up the write
+                await asyncio.wait([writing])
+            self.__request_interrupt.clear()
+            if started:
+                self.__update_frame()
+                self.__notify_speak_finish(wavfile)
+            self.__speak_lock.release()
+        if writing is not None:
+            # Raise the errors of the output if the speech was interrupted before the write ended
+            writing.result()
+
+    def __speak_shared(self, wavfile: str, random_variant: bool, play_audio: bool, frame_rate: int, interrupt_others: bool, audio_output: AudioOutput | None, scheduler: SharedScheduler, timeline_file: TimelineFile | None = None, analyzer: AmplitudeAnalyzer | None = None) -> Timeline:
+        """Register the frames of an audio file in a shared scheduler
+
+        Args:
+            wavfile (str): path to the .wav file
+            random_variant (bool): Randomize variant when start speaking.
+            play_audio (bool): Play the audio.
+            frame_rate (int): FPS to play.
+            interrupt_others (bool): Cancel the previous timeline of the model, or start after it.
+            audio_output (AudioOutput | None): Play the audio on the given output.
+            scheduler (SharedScheduler): the scheduler
+            timeline_file (TimelineFile | None, optional): precalculated frames of the audio. Defaults to None.
+            analyzer (AmplitudeAnalyzer | None, optional): analyzer of the amplitudes. Defaults to None.
+
+        Returns:
+            Timeline: the registered timeline
+        """
+        start_time = None
+        self.__timelines = [timeline for timeline in self.__timelines if not timeline.is_finished()]
+        if interrupt_others:
+            for timeline in self.__timelines:
+                timeline.cancel()
+        elif len(self.__timelines) > 0:
+            start_time = max(timeline.get_end_time() for timeline in self.__timelines)
+        # The earlier timelines may still be playing, the variant is set with the first frame of this one
+        variant = self.current_expression.get_random_variant(rng=self.rng) if random_variant else self.current_variant
+        # The whole audio is queued at once, so that the device pulls it without blocking any thread
+        output = audio_output if audio_output is not None else (PyAudioOutput(max_buffer=None) if play_audio else None)
+        audio = None
+        data = None
+        if output is not None:
+            audio = load_audio(wavfile)
+            # The first frame can come much later, copy the data so that the file can be overwritten meanwhile
+            data = bytes(audio.raw_data)
+        frames = self.__get_frames(wavfile, frame_rate, audio, timeline_file, analyzer, variant)
+        started = False
+
+        def on_frame(frame: int):
+            nonlocal started
+            if not started:
+                started = True
+                if variant is not self.current_variant and random_variant:
+                    self.current_variant = variant
+                    self.__update_variant()
+                if output is not None and audio is not None:
+                    output.open(audio.frame_rate, audio.sample_width, audio.channels)
+                    output.write(data)
+                self.__notify_speak_start(wavfile)
+            self.__update_frame(frame, variant)
+
+        def on_finish(completed: bool):
+            if not started:
+                return
+            if output is not None:
+                output.close(drain=completed)
+            self.__update_frame()
+            self.__notify_speak_finish(wavfile)
+
+        timeline = scheduler.add(frames, frame_rate, on_frame, on_finish, start_time, "{} {}".format(self.name, hex(id(self))))
+        self.__timelines.append(timeline)
+        self.frame_stats = timeline.stats
+        return timeline
+
+    def __get_frames(self, wavfile: str, frame_rate: int, audio: AudioSegment | WavAudio | None, timeline_file: TimelineFile | None, analyzer: AmplitudeAnalyzer | None = None, variant: Variant | None = None):
+        """Get the frames of an audio file for the given variant, or the current one, from the timeline file if given"""
+        if variant is None:
+            variant = self.current_variant
+        if timeline_file is not None:
+            return timeline_file.get_indexes(variant)
+        amplitudes = self.get_amplitudes_from_audio(wavfile, frame_rate=frame_rate, audio=audio, analyzer=analyzer)
+        return variant.get_image_indexes(amplitudes)
+
+    def __get_audio_output(self, play_audio: bool, sync_audio: bool, audio_output: AudioOutput | None) -> AudioOutput | None:
+        """Get the output to which the frames are synced, if any"""
+        if audio_output is not None:
+            return audio_output
+        if play_audio and sync_audio:
+            return PyAudioOutput()
+        return None
+
+    def __speak(self, wavfile: str, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, output: AudioOutput | None = None, timeline_file: TimelineFile | None = None, analyzer: AmplitudeAnalyzer | None = None):
         """Play an audio file with lipsync. Not started on another thread.
 
         Args:
@@ -296,162 +782,440 @@ class LivePNG:
             play_audio (bool, optional): Play the audio. Defaults to False.
             frame_rate (int, optional): FPS to play. Defaults to 10.
             interrupt_others (bool, optional): If interrupt the speak function or wait for it. Defaults to True.
+            output (AudioOutput | None, optional): Output that plays the audio and gives the clock to the frames. Defaults to None.
+            timeline_file (TimelineFile | None, optional): precalculated frames of the audio. Defaults to None.
+            analyzer (AmplitudeAnalyzer | None, optional): analyzer of the amplitudes. Defaults to None.
         """
         # Interrupt others and take the lock
         if interrupt_others:
-            self.__request_interrupt = True
+            self.__request_interrupt.set()
         self.__speak_lock.acquire()
-        self.__request_interrupt = False
+        self.__request_interrupt.clear()
         
         if random_variant:
             self.randomize_variant()
         
-        audio = AudioSegment.from_file(wavfile)
-        # Calculate frames
-        sample_rate = audio.frame_rate
-        audio_data = audio.get_array_of_samples()
-        frames = self.calculate_frames( sample_rate, audio_data, frame_rate=frame_rate)
-        # Start lipsync
-        frames_thread = threading.Thread(target=self.__update_images, args=(frames, ))
+        # Calculate frames, the audio is decoded only if it is not cached or it must be played
+        audio = None
+        if play_audio or output is not None:
+            audio = load_audio(wavfile)
+        frames = self.__get_frames(wavfile, frame_rate, audio, timeline_file, analyzer)
         # Start audio
         stream = None
         p = None
         audio_thread = None
-        if play_audio:
+        clock = None
+        if output is not None and audio is not None:
+            output.open(audio.frame_rate, audio.sample_width, audio.channels)
+            # The output may keep the data after the file is overwritten
+            output.write(bytes(audio.raw_data))
+            clock = output.get_position
+        elif play_audio and audio is not None:
             p = pyaudio.PyAudio()
             stream = p.open(format=p.get_format_from_width(audio.sample_width),
                         channels=audio.channels,
                         rate=audio.frame_rate,
                         output=True)
-            audio_thread = threading.Thread(target=stream.write, args=(audio.raw_data, ))
+            # pyaudio reads the data during the whole playback, copy it so that the file can be overwritten meanwhile
+            audio_thread = threading.Thread(target=stream.write, args=(bytes(audio.raw_data), ))
+        # Start lipsync
+        frames_thread = threading.Thread(target=self.__update_images, args=(frames, frame_rate, clock))
         # Start threads and notify the observers
         self.__notify_speak_start(wavfile)
         frames_thread.start()
         audio_thread.start() if audio_thread is not None else ""
         frames_thread.join()
 
+        if output is not None:
+            output.close(drain=not self.__request_interrupt.is_set())
         # handle interruption
-        if self.__request_interrupt:
-            self.__request_interrupt = False
+        if self.__request_interrupt.is_set():
+            self.__request_interrupt.clear()
             # Interrupt audio stream
             if play_audio and stream is not None and p is not None and audio_thread is not None:
                 stream.stop_stream()
                 stream.close()
                 p.terminate()
                 audio_thread.join()
-        self.__update_frame(self.get_current_image())
+        self.__update_frame()
         # Speaking finished
         # Notify the threads and release the lock
         self.__notify_speak_finish(wavfile)
         self.__speak_lock.release()
 
-    def __update_images(self, frames: list[str], frame_rate:int = 10):
+    def __update_images(self, frames: list[int], frame_rate:int = 10, clock: Callable[[], float] | None = None):
         """Update the frames while speaking
 
         Args:
-            frames (list): list of the frames
+            frames (list[int]): list of the frames, as indexes of the images of the current variant
             frame_rate (int, optional): frame rate. Defaults to 10.
+            clock (Callable[[], float] | None, optional): clock of the frames, if None the system clock is used. Defaults to None.
         """
-        for frame in frames:
-            if self.__request_interrupt:
+        scheduler = self.__get_scheduler(frame_rate, clock)
+        self.frame_stats = scheduler.stats
+        scheduler.start()
+        for i, frame in enumerate(frames):
+            if self.__request_interrupt.is_set():
                 break 
-            self.__update_frame(frame)
-            sleep(1/frame_rate)
+            # Skip the frame if the next one is already due
+            if scheduler.wait(i):
+                self.__update_frame(frame)
+        else:
+            scheduler.wait_end(len(frames))
+        self.frame_stats = scheduler.stats
    
+    def __speak_stream(self, audio: str, windows: Iterable[bytes], windower: PCMWindower, random_variant: bool = True, play_audio: bool = False, frame_rate:int = 10, interrupt_others:bool = True, output: AudioOutput | None = None, analyzer: AmplitudeAnalyzer | None = None):
+        """Play audio windows with lipsync while they are read
+
+        Args:
+            audio (str): name of the audio given to the observers
+            windows (Iterable[bytes]): iterable of raw PCM windows, one for each frame
+            windower (PCMWindower): windower with the format of the audio
+            random_variant (bool, optional): Randomize variant when start speaking. Defaults to True.
+            play_audio (bool, optional): Play the audio. Defaults to False.
+            frame_rate (int, optional): FPS to play. Defaults to 10.
+            interrupt_others (bool, optional): If interrupt the speak function or wait for it. Defaults to True.
+            output (AudioOutput | None, optional): Output that plays the audio and gives the clock to the frames. Defaults to None.
+            analyzer (AmplitudeAnalyzer | None, optional): analyzer of the amplitudes, it keeps its state between the windows. Defaults to None.
+        """
+        # Interrupt others and take the lock
+        if interrupt_others:
+            self.__request_interrupt.set()
+        self.__speak_lock.acquire()
+        self.__request_interrupt.clear()
+
+        if random_variant:
+            self.randomize_variant()
+        if analyzer is not None:
+            analyzer = analyzer.start(self.current_variant, streaming=True)
+        # Start audio, the windows are passed to the audio thread while they are read
+        stream = None
+        p = None
+        audio_thread = None
+        audio_queue = None
+        clock = None
+        lookahead = STREAM_LOOKAHEAD
+        if output is not None:
+            output.open(windower.sample_rate, windower.sample_width, windower.channels)
+            clock = output.get_position
+            # Keep more audio in the output buffer, the frames follow the playback position anyway
+            lookahead = max(STREAM_LOOKAHEAD, frame_rate // 2)
+        elif play_audio:
+            p = pyaudio.PyAudio()
+            stream = p.open(format=p.get_format_from_width(windower.sample_width),
+                        channels=windower.channels,
+                        rate=windower.sample_rate,
+                        output=True)
+            audio_queue = Queue(maxsize=STREAM_LOOKAHEAD)
+            audio_thread = threading.Thread(target=self.__play_windows, args=(stream, audio_queue), daemon=True)
+            audio_thread.start()
+        self.__notify_speak_start(audio)
+        scheduler = self.__get_scheduler(frame_rate, clock)
+        self.frame_stats = scheduler.stats
+        scheduler.start()
+        # Frames are shown some windows after the audio is read, to keep the audio buffer filled
+        pending = deque()
+        index = 0
+        for window in windows:
+            if self.__request_interrupt.is_set():
+                break
+            if output is not None:
+                output.write(window)
+            elif audio_queue is not None and audio_thread is not None:
+                self.__put_window(audio_thread, audio_queue, window)
+            pending.append(self.current_variant.get_image_index(windower.amplitude(window, analyzer=analyzer)))
+            if (audio_queue is None and output is None) or len(pending) > lookahead:
+                frame = pending.popleft()
+                if scheduler.wait(index):
+                    self.__update_frame(frame)
+                index += 1
+        while len(pending) > 0 and not self.__request_interrupt.is_set():
+            frame = pending.popleft()
+            if scheduler.wait(index):
+                self.__update_frame(frame)
+            index += 1
+        if not self.__request_interrupt.is_set():
+            scheduler.wait_end(index)
+        self.frame_stats = scheduler.stats
+
+        # Stop the audio
+        if output is not None:
+            output.close(drain=not self.__request_interrupt.is_set())
+        if audio_queue is not None and stream is not None and p is not None and audio_thread is not None:
+            if self.__request_interrupt.is_set():
+                stream.stop_stream()
+                # Drop the windows that will not be played, so that there is room for the stop marker
+                while True:
+                    try:
+                        audio_queue.get_nowait()
+                    except Empty:
+                        break
+            self.__put_window(audio_thread, audio_queue, None)
+            if audio_thread.is_alive():
+                audio_thread.join(STREAM_STOP_TIMEOUT if self.__request_interrupt.is_set() else None)
+            stream.close()
+            p.terminate()
+        self.__request_interrupt.clear()
+        self.__update_frame()
+        # Speaking finished
+        self.__notify_speak_finish(audio)
+        self.__speak_lock.release()
+
+    def __get_scheduler(self, frame_rate: int, clock: Callable[[], float] | None = None) -> FrameScheduler:
+        """Create the scheduler for the frames of a speech"""
+        if clock is None:
+            return FrameScheduler(frame_rate, should_stop=self.__request_interrupt.is_set)
+        # The playback position starts from 0 when the output is opened, so the audio played before start is not lost
+        return FrameScheduler(frame_rate, clock=clock, should_stop=self.__request_interrupt.is_set, origin=0.0)
+
+    def __put_window(self, audio_thread: threading.Thread, audio_queue: Queue, window: bytes | None) -> bool:
+        """Queue a window for the audio thread, without waiting forever if the thread stopped or the speech is interrupted
+
+        Args:
+            audio_thread (threading.Thread): thread running __play_windows
+            audio_queue (Queue): queue of raw PCM windows
+            window (bytes | None): window to play, None to stop the thread
+
+        Returns:
+            bool: False if the window was not queued
+        """
+        while audio_thread.is_alive():
+            try:
+                audio_queue.put(window, timeout=STREAM_QUEUE_TIMEOUT)
+                return True
+            except Full:
+                # The stop marker is still queued, the interrupted windows are dropped anyway
+                if window is not None and self.__request_interrupt.is_set():
+                    return False
+        return False
+
+    def __play_windows(self, stream, audio_queue: Queue):
+        """Write the audio windows in the queue to the stream, until None is received
+
+        Args:
+            stream (pyaudio.Stream): output stream
+            audio_queue (Queue): queue of raw PCM windows
+        """
+        while True:
+            window = audio_queue.get()
+            if window is None:
+                break
+            if not self.__request_interrupt.is_set():
+                stream.write(window)
+
+    def get_frame_stats(self) -> FrameStats:
+        """Get the timing statistics of the frames of the current or last speech
+
+        Returns:
+            FrameStats: number of frames shown, dropped and late
+        """
+        return self.frame_stats
+
     def stop(self):
         """Stop the speak function"""
-        self.__request_interrupt = True
+        self.__request_interrupt.set()
+        for timeline in self.__timelines:
+            timeline.cancel()
     
-    def calculate_frames_from_audio(self, wavfile: str, frame_rate:int=10):
+    def calculate_frames_from_audio(self, wavfile: str, frame_rate:int=10, analyzer:AmplitudeAnalyzer|None=None):
         """Precalculate every frame for the model
 
         Args:
             wavfile (str): path to the wav file
             frame_rate (int, optional): Frame rate. Defaults to 10.
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes. Defaults to None.
 
         Returns:
             list[str]: List of the frames
         """     
-        audio = AudioSegment.from_file(wavfile)
-        # Calculate frames
-        sample_rate = audio.frame_rate
-        audio_data = audio.get_array_of_samples()
-        return self.calculate_frames( sample_rate, audio_data, frame_rate=frame_rate)
+        amplitudes = self.get_amplitudes_from_audio(wavfile, frame_rate=frame_rate, analyzer=analyzer)
+        return self.__get_mouth_positions(amplitudes)
+
+    def calculate_frame_indexes_from_audio(self, wavfile: str, frame_rate:int=10, as_numpy:bool=False, analyzer:AmplitudeAnalyzer|None=None):
+        """Precalculate every frame for the model, as indexes of the images of the current variant
+
+        Args:
+            wavfile (str): path to the wav file
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+            as_numpy (bool, optional): Return a NumPy unsigned array instead of an array. Defaults to False.
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes. Defaults to None.
+
+        Returns:
+            array | numpy.ndarray: indexes of the frames
+        """
+        amplitudes = self.get_amplitudes_from_audio(wavfile, frame_rate=frame_rate, analyzer=analyzer)
+        return self.current_variant.get_image_indexes(amplitudes, compact=True, as_numpy=as_numpy)
+
+    def get_amplitudes_from_audio(self, wavfile: str, frame_rate:int=10, method:str="mean", audio: AudioSegment | WavAudio | None = None, analyzer: AmplitudeAnalyzer | None = None) -> list[float]:
+        """Calculate the amplitude for every frame of an audio file, using the amplitude cache if enabled
+
+        Args:
+            wavfile (str): path to the audio file
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+            method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+            audio (AudioSegment | WavAudio | None, optional): The already decoded audio file, if available. Defaults to None.
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, it replaces the method. Defaults to None.
+
+        Returns:
+            list[float]: List of the amplitudes
+        """
+        stage = analyzer.start(self.current_variant) if analyzer is not None else None
+        # Analyzers that must see every audio complete the cached amplitudes of their source
+        source = stage.get_cached_source() if stage is not None and self.amplitude_cache is not None else None
+        cached = source if source is not None else stage
+        def calculate() -> list[float]:
+            decoded = audio if audio is not None else load_audio(wavfile)
+            if cached is not None:
+                return cached.process(decoded.get_array_of_samples(), decoded.frame_rate, frame_rate, decoded.sample_width, decoded.channels)
+            return self.calculate_amplitudes(decoded.frame_rate, decoded.get_array_of_samples(), frame_rate=frame_rate, method=method, sample_width=decoded.sample_width, channels=decoded.channels)
+        if self.amplitude_cache is None:
+            return calculate()
+        amplitudes = self.amplitude_cache.get_amplitudes(wavfile, frame_rate, cached.get_key() if cached is not None else method, calculate)
+        if source is not None and stage is not None:
+            return stage.process_amplitudes(list(amplitudes))
+        return amplitudes
+
+    def enable_amplitude_cache(self, max_entries: int = 128, disk: bool = False) -> AmplitudeCache:
+        """Cache the amplitudes of the audio files, so that repeated lines are not analyzed again
+
+        Args:
+            max_entries (int, optional): maximum number of audio files kept in memory. Defaults to 128.
+            disk (bool, optional): also store the amplitudes on disk, next to the model. Defaults to False.
+
+        Returns:
+            AmplitudeCache: the new cache
+        """
+        directory = os.path.join(self.path, constants.CACHE_DIR_NAME) if disk else None
+        self.amplitude_cache = AmplitudeCache(max_entries, directory)
+        return self.amplitude_cache
     
-    def calculate_frames(self, sample_rate, audio_data, frame_rate:int=10) -> list[str]:
+    def calculate_frames(self, sample_rate, audio_data, frame_rate:int=10, method:str="mean", analyzer:AmplitudeAnalyzer|None=None, sample_width:int=2, channels:int=1) -> list[str]:
         """Precalculate every frame for the model
 
         Args:
             sample_rate (_type_): Sample rate for the audio file
             audio_data (_type_): Audio data
             frame_rate (int, optional): Frame rate. Defaults to 10.
+            method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, it replaces the method. Defaults to None.
+            sample_width (int, optional): bytes per sample. Defaults to 2.
+            channels (int, optional): number of interleaved channels. Defaults to 1.
 
         Returns:
             list[str]: List of the frames
         """
-        indexes = []
-        for i in range(0, len(audio_data), sample_rate // frame_rate):
-            segment = audio_data[i:i + sample_rate // frame_rate]
-            absolute_segment = [abs(sample) for sample in segment]
-            mean = (sum(absolute_segment)/len(absolute_segment))
-            # Normalize the amplitude
-            amplitude = mean / 32768
-            # Get the frame from the given amplitude
-            mouth_image = self.__get_mouth_position(amplitude)
-            indexes.append(mouth_image)
-        return indexes
+        amplitudes = self.__analyze(sample_rate, audio_data, frame_rate, method, analyzer, sample_width, channels)
+        # Get the frame from the given amplitude
+        return self.__get_mouth_positions(amplitudes)
     
     @staticmethod 
-    def calculate_amplitudes(sample_rate, audio_data, frame_rate:int=10) -> list[float]:
-        """Precalculate the amplitude for every frame of the model
+    def calculate_amplitudes(sample_rate, audio_data, frame_rate:int=10, method:str="mean", sample_width:int=2, channels:int=1) -> list[float]:
+        """Precalculate the amplitude for every frame of the model.
+        Uses NumPy if it is installed, otherwise the amplitudes are calculated in pure Python
 
         Args:
             sample_rate (_type_): Sample rate for the audio file
             audio_data (_type_): Audio data
             frame_rate (int, optional): Frame rate. Defaults to 10.
+            method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+            sample_width (int, optional): bytes per sample, the samples are normalized by their range. Defaults to 2.
+            channels (int, optional): number of interleaved channels, they are downmixed to their mean. Defaults to 1.
 
         Returns:
             list[int]: List of the amplitudes
         """
-        indexes = []
-        for i in range(0, len(audio_data), sample_rate // frame_rate):
-            segment = audio_data[i:i + sample_rate // frame_rate]
-            absolute_segment = [abs(sample) for sample in segment]
-            mean = (sum(absolute_segment)/len(absolute_segment))
-            # Normalize the amplitude
-            amplitude = mean / 32768
-            # Get the frame from the given amplitude
-            indexes.append(amplitude)
-        return indexes
+        return amplitude.calculate_amplitudes(sample_rate, audio_data, frame_rate=frame_rate, method=method,
+                                              normalization=get_normalization(sample_width), channels=channels)
+
+    def calculate_frame_indexes(self, sample_rate, audio_data, frame_rate:int=10, method:str="mean", as_numpy:bool=False, analyzer:AmplitudeAnalyzer|None=None, sample_width:int=2, channels:int=1):
+        """Precalculate every frame for the model, as indexes of the images of the current variant.
+        This uses one byte per frame instead of a path string, two for variants with more than 256 images
+
+        Args:
+            sample_rate (_type_): Sample rate for the audio file
+            audio_data (_type_): Audio data
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+            method (str, optional): How to calculate the amplitude of a frame ("mean", "rms" or "peak"). Defaults to "mean".
+            as_numpy (bool, optional): Return a NumPy unsigned array instead of an array. Defaults to False.
+            analyzer (AmplitudeAnalyzer | None, optional): Analyzer of the amplitudes, it replaces the method. Defaults to None.
+            sample_width (int, optional): bytes per sample. Defaults to 2.
+            channels (int, optional): number of interleaved channels. Defaults to 1.
+
+        Returns:
+            array | numpy.ndarray: indexes of the frames
+        """
+        amplitudes = self.__analyze(sample_rate, audio_data, frame_rate, method, analyzer, sample_width, channels)
+        return self.current_variant.get_image_indexes(amplitudes, compact=True, as_numpy=as_numpy)
+
+    def __analyze(self, sample_rate: int, audio_data, frame_rate: int, method: str, analyzer: AmplitudeAnalyzer | None, sample_width: int, channels: int) -> list[float]:
+        """Calculate the amplitudes with a new copy of the analyzer, or with the method if there is none"""
+        if analyzer is None:
+            return self.calculate_amplitudes(sample_rate, audio_data, frame_rate=frame_rate, method=method, sample_width=sample_width, channels=channels)
+        return analyzer.start(self.current_variant).process(audio_data, sample_rate, frame_rate, sample_width, channels)
+
+    def __get_mouth_positions(self, amplitudes: list[float]) -> list[str]:
+        """Get the speaking frames for many amplitudes at once
+
+        Args:
+            amplitudes (list[float]): amplitudes of the wave
+
+        Returns:
+            list[str]: Image paths
+        """
+        paths = self.__get_frame_paths()
+        return [paths[index] for index in self.current_variant.get_image_indexes(amplitudes)]
 
-    def __get_mouth_position(self, amplitude: float) -> str:
-        """Get the speaking frame for the given amplitude
+    def __get_frame_path(self, index: int, variant: Variant | None = None) -> str:
+        """Get the resolved path of an image of a variant
 
         Args:
-            amplitude (float): amplitude of the wave
+            index (int): index of the image
+            variant (Variant | None, optional): the variant, if None the current one. Defaults to None.
 
         Returns:
-            str: Image path
+            str: path of the image, in the output type of the model
         """
-        images = self.current_variant.get_images()
-        thresholds = self.current_variant.get_thresholds()
-        for image in images:
-            if self.__in_threshold(amplitude, thresholds[image]):
-                return self.get_image_path(image)
-        return self.get_image_path(images[0])    
+        if variant is None:
+            variant = self.current_variant
+        if self.output_type == FilepathOutput.IMAGE_DATA:
+            return self.get_file_path(self.current_style, self.current_expression, variant, variant.get_images()[index])
+        return self.__get_frame_paths(variant)[index]
 
-    def __in_threshold(self, value: float, threshold: tuple) -> bool:
-        """Check if a given float is in an interval
+    def __get_frame_paths(self, variant: Variant | None = None) -> list[str]:
+        """Get the resolved paths of the images of a variant, they are calculated only once
 
         Args:
-            value (float): the float value
-            threshold (tuple): the interval
+            variant (Variant | None, optional): the variant, if None the current one. Defaults to None.
 
         Returns:
-            bool: if the value is in the interval
+            list[str]: paths of the images, in the output type of the model
         """
-        return value >= threshold[0] and value  < threshold[1]
+        if variant is None:
+            variant = self.current_variant
+        # Image data is not cached here
+        if self.output_type == FilepathOutput.IMAGE_DATA:
+            return [self.get_file_path(self.current_style, self.current_expression, variant, image) for image in variant.get_images()]
+        key = (self.current_style, self.current_expression, variant, self.output_type)
+        return self.definition.get_frame_paths(key, lambda: [self.__resolve_path(path, self.output_type) for path in variant.get_image_paths()])
     
+    async def frames(self, maxsize: int = 8) -> AsyncIterator[str | bytes | memoryview]:
+        """Iterate asynchronously over the frames of the model, from every speech, on the running event loop.
+        If the consumer is slower than the frames, the oldest ones are dropped
+
+        Args:
+            maxsize (int, optional): maximum number of frames waiting to be consumed. Defaults to 8.
+
+        Returns:
+            AsyncIterator[str | bytes | memoryview]: the frames, in the output type of the model
+        """
+        queue = FrameQueue(asyncio.get_running_loop(), maxsize)
+        self.subscribe_callback(queue.put)
+        try:
+            async for frame in queue:
+                yield frame
+        finally:
+            self.unsubscribe_callback(queue.put)
+
     # observers
 
     def subscribe_observer(self, observer : LivePNGModelObserver):
@@ -486,20 +1250,60 @@ class LivePNG:
         """
         self.callbackfunctions.remove(callbackfunction)
 
-    def __update_frame(self, frame : str | None = None):
+    def subscribe_async_callback(self, callbackfunction : Callable[[str], Awaitable]):
+        """Subscribe a coroutine function to be called at every frame change. 
+        It is scheduled on the event loop running in the calling thread, without waiting for it
+
+        Args:
+            callbackfunction (Callable[[str], Awaitable]): coroutine function to subscribe
+        """
+        self.callbackfunctions.append(AsyncCallback(callbackfunction, asyncio.get_running_loop()))
+
+    def unsubscribe_async_callback(self, callbackfunction : Callable[[str], Awaitable]):
+        """Unsubscribe a coroutine function
+
+        Args:
+            callbackfunction (Callable[[str], Awaitable]): coroutine function to unsubscribe
+        """
+        self.callbackfunctions.remove(callbackfunction)
+
+    def subscribe_index_callback(self, callbackfunction : Callable):
+        """Subscribe a callback function to be called at every frame change with the index of the image in the current variant
+
+        Args:
+            callbackfunction (Callable): function to subscribe
+        """
+        self.indexcallbackfunctions.append(callbackfunction)
+
+    def unsubscribe_index_callback(self, callbackfunction : Callable):
+        """Unsubscribe an index callback function
+
+        Args:
+            callbackfunction (Callable): function to unsubscribe
+        """
+        self.indexcallbackfunctions.remove(callbackfunction)
+
+    def __update_frame(self, index : int = 0, variant: Variant | None = None):
         """Called when a new frame is generated
 
         Args:
-            frame (str | None, optional): generated frame. Defaults to None.
+            index (int, optional): index of the generated frame in the images of the variant. Defaults to 0.
+            variant (Variant | None, optional): variant of the frames, if None the current one. Defaults to None.
         """
-        if frame is None:
-            frame = self.get_image_path(self.get_current_variant().get_images()[0])
+        if variant is None:
+            variant = self.current_variant
+        # The variant can be reloaded with less images while speaking
+        index = min(index, len(variant.get_images()) - 1)
+        frame = self.__get_frame_path(index, variant)
         # Notify observers
         for observer in self.observers:
             observer.on_frame_update(frame)
+            observer.on_frame_index_update(index)
         # Notify callback functions
         for callbackfunction in self.callbackfunctions:
             callbackfunction(frame)
+        for callbackfunction in self.indexcallbackfunctions:
+            callbackfunction(index)
 
     def __update_expression(self):
         """Notify the observers that the expression changed"""
@@ -516,6 +1320,15 @@ class LivePNG:
         for observer in self.observers:
             observer.on_style_change(self.current_style)
     
+    def __notify_reload(self, styles: list[str]):
+        """Notify the observers that the model has been reloaded
+
+        Args:
+            styles (list[str]): names of the rebuilt and removed styles
+        """
+        for observer in self.observers:
+            observer.on_model_reload(styles)
+
     def __notify_speak_start(self, audio : str):
         """Notify the observers that the model started speaking
 
@@ -1,25 +1,121 @@
-from livepng.constants import MOUTH_OPEN_THRESHOLD, MOUTH_CLOSED_THRESHOLD
+from livepng.constants import ASSETS_DIR_NAME
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock
+import os
 import random
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from livepng.exceptions import NotFoundException
+from livepng.sampler import WeightedSampler
+from livepng.thresholds import calculate_intervals, get_expression_thresholds, get_raw_images, get_raw_variants, get_variant_thresholds
+
+def get_index_typecode(count: int) -> str:
+    """Get the array typecode of the compact image indexes of a variant
+
+    Args:
+        count (int): number of images of the variant
+
+    Returns:
+        str: "B" (one byte per index) for up to 256 images, "H" for up to 65536 images, otherwise "I"
+    """
+    if count <= 256:
+        return "B"
+    return "H" if count <= 65536 else "I"
+
+
+"""Maximum number of compiled lookup tables kept to be shared, the least recently used are forgotten"""
+MAX_COMPILED_TABLES = 1024
+"""Compiled lookup tables, shared by the variants with the same intervals. The variants keep a reference to their table,
+so forgetting a table only stops sharing it"""
+COMPILED_TABLES : "OrderedDict[tuple, tuple[tuple[float, ...], tuple[int, ...]]]" = OrderedDict()
+COMPILED_TABLES_LOCK = Lock()
+
+
+def compile_table(intervals: tuple[tuple[float, float], ...]) -> tuple[tuple[float, ...], tuple[int, ...]]:
+    """Compile the intervals of the images of a variant in a sorted lookup table, see Variant.compile_thresholds.
+    The tables are kept in COMPILED_TABLES, which is bounded to MAX_COMPILED_TABLES entries
+
+    Args:
+        intervals (tuple[tuple[float, float], ...]): amplitude interval of every image
+
+    Returns:
+        tuple[tuple[float, ...], tuple[int, ...]]: sorted boundaries, and the index of the image between every two boundaries
+    """
+    with COMPILED_TABLES_LOCK:
+        table = COMPILED_TABLES.get(intervals)
+        if table is not None:
+            COMPILED_TABLES.move_to_end(intervals)
+            return table
+    boundaries = sorted(set(bound for interval in intervals for bound in interval))
+    segments = []
+    # Every segment between two boundaries is fully contained in the intervals that contain its start
+    for start, end in zip(boundaries, boundaries[1:]):
+        segment = 0
+        for i, interval in enumerate(intervals):
+            if interval[0] <= start and end <= interval[1]:
+                segment = i
+                break
+        segments.append(segment)
+    with COMPILED_TABLES_LOCK:
+        table = COMPILED_TABLES.setdefault(intervals, (tuple(boundaries), tuple(segments)))
+        COMPILED_TABLES.move_to_end(intervals)
+        while len(COMPILED_TABLES) > MAX_COMPILED_TABLES:
+            COMPILED_TABLES.popitem(last=False)
+    return table
+
 
 class Variant:
     """Rapresents a variant of an expression"""
+    __slots__ = ("name", "images", "path", "__image_paths", "__thresholds", "__custom", "__boundaries", "__segments")
     name : str
-    images : list
-    def __init__(self, name: str, images: list) -> None:
-        self.name = name
-        self.images = []
-        for image in images:
-            self.images.append(image.replace(" ", " "))
+    images : tuple[str, ...]
+    path : str
+
+    def __init__(self, name: str, images: list, path: str = "", thresholds: dict | list | None = None) -> None:
+        """Initialize the variant
+
+        Args:
+            name (str): name of the variant
+            images (list): names of the images
+            path (str, optional): path of the variant directory from the model folder. Defaults to "".
+            thresholds (dict | list | None, optional): threshold override from model.json, compiled immediately.
+                If None the default thresholds are used. Defaults to None.
+        """
+        self.name = sys.intern(name)
+        self.images = tuple(sys.intern(image) for image in images)
+        self.path = sys.intern(path)
+        self.__image_paths = None
+        self.__thresholds = None
+        self.__custom = thresholds
+        self.__boundaries = None
+        self.__segments = None
+        if thresholds is not None:
+            self.compile_thresholds()
     
-    def get_images(self) -> list[str]:
+    def get_images(self) -> tuple[str, ...]:
         """Returns the list of images for the expression
 
         Returns:
-            list[str]: list of the images
+            tuple[str, ...]: list of the images
         """
         return self.images
+
+    def get_image_paths(self) -> tuple[str, ...]:
+        """Returns the paths of the images from the model folder, they are calculated only once
+
+        Returns:
+            tuple[str, ...]: paths of the images
+        """
+        if self.__image_paths is None:
+            self.__image_paths = tuple(sys.intern(os.path.join(self.path, image)) for image in self.images)
+        return self.__image_paths
     
     def __str__(self) -> str:
         return self.name
@@ -30,33 +126,129 @@ class Variant:
         Returns:
             dict[str, tuple[float]]: dict that associates to each image the amplitude range
         """
+        if self.__thresholds is None:
+            self.__thresholds = self.__calculate_thresholds()
+        return self.__thresholds
+
+    def __calculate_thresholds(self) -> dict[str, tuple[float, float]]:
+        """Calculate the thresholds for every image, from the override of model.json if any"""
         images = self.get_images()
-        # if there is only one image always return it
-        if len(images) == 1:
-            return {images[0] : (0.0, 1.0)}
-        # If there are multiple images calculate the thresholds
-        thresholds = {}
-        thresholds[images[0]] = (0, MOUTH_CLOSED_THRESHOLD) 
-        thresholds[images[-1]] = (MOUTH_OPEN_THRESHOLD, 1)
-        # If there are more than 2 images calculate intermediate values
-        if (len(images) > 2):
-            mouth_unit = (MOUTH_OPEN_THRESHOLD - MOUTH_CLOSED_THRESHOLD)/(len(images)-2)
-            for i in range(1, len(images)-1):
-                thresholds[images[i]] = (MOUTH_CLOSED_THRESHOLD + (mouth_unit * (i-1)), 
-                                          MOUTH_CLOSED_THRESHOLD + (mouth_unit * i))
-        return thresholds
+        return dict(zip(images, calculate_intervals(len(images), self.__custom)))
+
+    def compile_thresholds(self):
+        """Compile the thresholds in a sorted lookup table, so that an image can be found with a binary search.
+        The table gives the same result of checking the images in order and taking the first one whose interval contains
+        the amplitude, or the first image if there is none."""
+        images = self.get_images()
+        # The thresholds are not kept, unless they have already been requested
+        thresholds = self.__thresholds if self.__thresholds is not None else self.__calculate_thresholds()
+        intervals = tuple((thresholds[image][0], thresholds[image][1]) for image in images)
+        self.__boundaries, self.__segments = compile_table(intervals)
+
+    def get_boundaries(self) -> tuple[float, ...]:
+        """Returns the sorted amplitudes at which the image can change
+
+        Returns:
+            tuple[float, ...]: boundaries of the compiled lookup table
+        """
+        if self.__boundaries is None:
+            self.compile_thresholds()
+        assert self.__boundaries is not None
+        return self.__boundaries
+
+    def get_image_index(self, amplitude: float) -> int:
+        """Get the index of the image for the given amplitude
+
+        Args:
+            amplitude (float): amplitude of the wave
+
+        Returns:
+            int: index of the image in the images list
+        """
+        if self.__boundaries is None or self.__segments is None:
+            self.compile_thresholds()
+        assert self.__boundaries is not None and self.__segments is not None
+        position = bisect_right(self.__boundaries, amplitude) - 1
+        if position < 0 or position >= len(self.__segments):
+            return 0
+        return self.__segments[position]
+
+    def get_image_indexes(self, amplitudes: list[float], compact: bool = False, as_numpy: bool = False):
+        """Get the index of the image for every amplitude, using NumPy if available
+
+        Args:
+            amplitudes (list[float]): amplitudes of the wave
+            compact (bool, optional): Return an array with one byte per index instead of a list, two bytes
+                for variants with more than 256 images (see get_index_typecode). Defaults to False.
+            as_numpy (bool, optional): Return a NumPy unsigned array instead of a list, with the same item size of compact. Defaults to False.
+
+        Raises:
+            ImportError: if as_numpy is True and NumPy is not installed
+
+        Returns:
+            list[int] | array | numpy.ndarray: indexes of the images in the images list
+        """
+        if as_numpy and numpy is None:
+            raise ImportError("NumPy is not installed")
+        typecode = get_index_typecode(len(self.images))
+        if numpy is None:
+            indexes = [self.get_image_index(amplitude) for amplitude in amplitudes]
+            return array(typecode, indexes) if compact else indexes
+        if self.__boundaries is None or self.__segments is None:
+            self.compile_thresholds()
+        assert self.__boundaries is not None and self.__segments is not None
+        # Add the first image for the amplitudes out of the boundaries
+        table = numpy.array((0, ) + self.__segments + (0, ), dtype=numpy.dtype(typecode))
+        positions = numpy.searchsorted(numpy.array(self.__boundaries), numpy.asarray(amplitudes, dtype=numpy.float64), side="right")
+        indexes = table[positions]
+        if as_numpy:
+            return indexes
+        if compact:
+            return array(typecode, indexes.tobytes())
+        return indexes.tolist()
 
 
 class Expression:
     """Rapresents the expression of a model"""
+    __slots__ = ("name", "variants", "path", "__raw_variants", "__thresholds", "__default", "__sampler")
     name : str
     variants : dict[str, Variant]
+    path : str
                              
-    def __init__(self, name: str, variants: dict) -> None:
-        self.name = name
+    def __init__(self, name: str, variants: dict, lazy: bool = False, path: str = "", thresholds: dict | list | None = None) -> None:
+        """Initialize the expression
+
+        Args:
+            name (str): name of the expression
+            variants (dict): variant name -> list of images, or {"variants": {...}, "thresholds": ...} as in model.json
+            lazy (bool, optional): create the variants the first time they are accessed. Defaults to False.
+            path (str, optional): path of the expression directory from the model folder. Defaults to "".
+            thresholds (dict | list | None, optional): threshold override inherited from the style or the model. Defaults to None.
+        """
+        self.name = sys.intern(name)
         self.variants = {}
-        for variant in variants:
-            self.variants[variant] = Variant(variant, variants[variant])
+        self.path = sys.intern(path)
+        self.__thresholds = get_expression_thresholds(variants, thresholds)
+        self.__raw_variants = get_raw_variants(variants)
+        self.__default = None
+        self.__sampler = None
+        if not lazy:
+            self.__load()
+
+    def __load(self):
+        """Create the variants"""
+        raw_variants = self.__raw_variants
+        if raw_variants is None:
+            return
+        variants = {}
+        for variant, raw in raw_variants.items():
+            variants[variant] = Variant(variant, get_raw_images(raw), os.path.join(self.path, variant), get_variant_thresholds(raw, self.__thresholds))
+        self.variants = variants
+        self.__raw_variants = None
+
+    def is_loaded(self) -> bool:
+        """Check if the variants have been created"""
+        return self.__raw_variants is None
 
     def get_variants(self) -> dict[str, Variant]:
         """Get the list of variants for the given expression
@@ -64,6 +256,8 @@ class Expression:
         Returns:
             dict[str, Variant]: variant name -> variant
         """
+        if self.__raw_variants is not None:
+            self.__load()
         return self.variants
 
     def get_default_variant(self) -> Variant:
@@ -72,18 +266,21 @@ class Expression:
         Returns:
             Variant: default variant
         """
-        return self.variants[list(self.variants.keys())[0]]
+        if self.__default is None:
+            self.__default = next(iter(self.get_variants().values()))
+        return self.__default
     
     def __str__(self) -> str:
         return self.name
 
-    def get_random_variant(self, weights: dict[str | Variant, int] | None = None) -> Variant:
+    def get_random_variant(self, weights: dict[str | Variant, int] | None = None, rng: random.Random | None = None) -> Variant:
         """Get a random variant for the given weights
 
         Args:
             weights (dict[str  |  Variant, int] | None, optional): The dict that maps variants to their weights.
                 Wrights are supposed to be integers, the higher is the weight, the higher is the probability. If None,
                  every expression has the same probability. Defaults to None.
+            rng (random.Random | None, optional): random number generator, to get reproducible choices. If None the one of the random module is used. Defaults to None.
 
         Raises:
             NotFoundException: if there is an expression not found in the weights
@@ -91,33 +288,81 @@ class Expression:
         Returns:
             Variant: the chosen Variant
         """
-        if weights is None:
-            weights = {}
-            for variant in self.get_variants():
-                weights[variant] = 1
-        weights_sum = sum(weights.values())
-        elements = []
-        probabilities = []
-        for variant in weights:
-            if not str(variant) in self.get_variants():
-                raise NotFoundException("Variant not found: " + str(variant))
-            elements.append(str(variant))
-            probabilities.append(weights[str(variant)]/weights_sum)
-        
-        return self.variants[random.choices(elements, weights=probabilities, k=1)[0]]
+        return self.get_sampler(weights).sample(rng)
+
+    def get_sampler(self, weights: dict[str | Variant, int] | None = None) -> WeightedSampler:
+        """Get the sampler of the variants for the given weights. It is cached, and created again only when the weights change
+
+        Args:
+            weights (dict[str  |  Variant, int] | None, optional): The dict that maps variants to their weights. If None,
+                 every expression has the same probability. Defaults to None.
+
+        Raises:
+            NotFoundException: if there is an expression not found in the weights
+
+        Returns:
+            WeightedSampler: sampler of the variants
+        """
+        key = None if weights is None else tuple((str(variant), weight) for variant, weight in weights.items())
+        # The key and the sampler are replaced together, since expressions can be shared between threads
+        cached = self.__sampler
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        variants = self.get_variants()
+        if key is None:
+            key_items = tuple((variant, 1) for variant in variants)
+        else:
+            key_items = key
+        for variant, _ in key_items:
+            if not variant in variants:
+                raise NotFoundException("Variant not found: " + variant)
+        sampler = WeightedSampler([variants[variant] for variant, _ in key_items], [weight for _, weight in key_items])
+        self.__sampler = (key, sampler)
+        return sampler
 
 
 
 class Style:
     """Rapresents the style of a model"""
+    __slots__ = ("name", "expressions", "lazy", "path", "__raw_expressions", "__thresholds", "__default")
     name : str
     expressions : dict[str, Expression]
+    lazy : bool
+    path : str
+
+    def __init__(self, name: str, expressions: dict, lazy: bool = False, thresholds: dict | list | None = None) -> None:
+        """Initialize the style
 
-    def __init__(self, name: str, expressions: dict) -> None:
-       self.name = name
-       self.expressions = {}
-       for expression in expressions:
-            self.expressions[expression] = Expression(expression, expressions[expression])
+        Args:
+            name (str): name of the style
+            expressions (dict): expression name -> variants
+            lazy (bool, optional): create the expressions and their variants the first time they are accessed. Defaults to False.
+            thresholds (dict | list | None, optional): threshold override of the style, or inherited from the model. Defaults to None.
+        """
+        self.name = sys.intern(name)
+        self.lazy = lazy
+        self.path = sys.intern(os.path.join(ASSETS_DIR_NAME, name))
+        self.expressions = {}
+        self.__raw_expressions = expressions
+        self.__thresholds = thresholds
+        self.__default = None
+        if not lazy:
+            self.__load()
+
+    def __load(self):
+        """Create the expressions"""
+        raw_expressions = self.__raw_expressions
+        if raw_expressions is None:
+            return
+        expressions = {}
+        for expression in raw_expressions:
+            expressions[expression] = Expression(expression, raw_expressions[expression], self.lazy, os.path.join(self.path, expression), self.__thresholds)
+        self.expressions = expressions
+        self.__raw_expressions = None
+
+    def is_loaded(self) -> bool:
+        """Check if the expressions have been created"""
+        return self.__raw_expressions is None
 
     def get_expressions(self) -> dict[str, Expression]:
         """Get the list of expressions for the given style
@@ -125,6 +370,8 @@ class Style:
         Returns:
             dict: expression name -> Expression
         """
+        if self.__raw_expressions is not None:
+            self.__load()
         return self.expressions
 
     def get_default_expression(self) -> Expression:
@@ -133,10 +380,13 @@ class Style:
         Returns:
             Expression: The default expression
         """
-        if "idle" in self.expressions:
-            return self.expressions["idle"]
-        else:
-            return self.expressions[list(self.expressions.keys())[0]]
+        if self.__default is None:
+            expressions = self.get_expressions()
+            if "idle" in expressions:
+                self.__default = expressions["idle"]
+            else:
+                self.__default = expressions[list(expressions.keys())[0]]
+        return self.__default
     
     def __str__(self) -> str:
         return self.name
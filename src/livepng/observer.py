@@ -13,6 +13,15 @@ class LivePNGModelObserver(ABC):
         """
         pass
 
+    def on_frame_index_update(self, index: int):
+        """Called when the model must show a new frame, with the index of the image in the current variant.
+        Override it to avoid looking up the frames by path
+
+        Args:
+            index (int): index of the frame in the images of the current variant
+        """
+        pass
+
     @abstractmethod 
     def on_style_change(self, style: Style):
         """Called when the model has changed its style
@@ -40,6 +49,14 @@ class LivePNGModelObserver(ABC):
         """
         pass
 
+    def on_model_reload(self, styles: list[str]):
+        """Called when the model has been reloaded after its files changed
+
+        Args:
+            styles (list[str]): names of the rebuilt and removed styles
+        """
+        pass
+
     @abstractmethod
     def on_start_speaking(self, audio_file: str):
         """Called when the model starts speaking
@@ -0,0 +1,474 @@
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+
+from livepng.exceptions import NotFoundException, WrongFormatException
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from livepng.model import LivePNG
+
+"""Signature at the start of every PNG file"""
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+"""Channels of every PNG color type"""
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def decode_png(data: bytes | memoryview) -> tuple[int, int, bytes]:
+    """Decode a non interlaced PNG image to RGBA, using only zlib
+
+    Args:
+        data (bytes | memoryview): content of the PNG file
+
+    Raises:
+        WrongFormatException: if the data is not a supported PNG image
+
+    Returns:
+        tuple[int, int, bytes]: width, height and the RGBA pixels, 4 bytes per pixel, row by row
+    """
+    data = memoryview(data)
+    if bytes(data[:8]) != PNG_SIGNATURE:
+        raise WrongFormatException("Not a PNG image")
+    pos = 8
+    header = None
+    palette = None
+    transparency = None
+    chunks = []
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, pos)
+        content = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", content)
+        elif kind == b"PLTE":
+            palette = bytes(content)
+        elif kind == b"tRNS":
+            transparency = bytes(content)
+        elif kind == b"IDAT":
+            chunks.append(content)
+        elif kind == b"IEND":
+            break
+    if header is None or len(chunks) == 0:
+        raise WrongFormatException("Missing PNG header or image data")
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace != 0:
+        raise WrongFormatException("Interlaced PNG images are not supported")
+    if color_type not in PNG_CHANNELS or depth not in (1, 2, 4, 8, 16) or (depth < 8 and color_type not in (0, 3)):
+        raise WrongFormatException("Unsupported PNG format: color type {}, bit depth {}".format(color_type, depth))
+    if color_type == 3 and palette is None:
+        raise WrongFormatException("Missing PNG palette")
+    channels = PNG_CHANNELS[color_type]
+    stride = (width * channels * depth + 7) // 8
+    try:
+        raw = zlib.decompress(b"".join(chunks))
+    except zlib.error as e:
+        raise WrongFormatException("Corrupted PNG image data: " + str(e))
+    if len(raw) < height * (stride + 1):
+        raise WrongFormatException("Truncated PNG image data")
+    pixels = _unfilter(raw, height, stride, max(1, channels * depth // 8))
+    return width, height, _to_rgba(pixels, width, height, stride, depth, color_type, palette, transparency)
+
+
+def _unfilter(raw: bytes, height: int, stride: int, bpp: int) -> bytearray:
+    """Reverse the filter of every row of the decompressed image data"""
+    out = bytearray(height * stride)
+    prev = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        filter_type = raw[start]
+        line = bytearray(raw[start + 1:start + 1 + stride])
+        if filter_type == 0:
+            pass
+        elif filter_type == 1:
+            if np is not None and stride % bpp == 0:
+                # The running sum of every channel wraps around like the filter
+                line = bytearray(np.cumsum(np.frombuffer(line, dtype=np.uint8).reshape(-1, bpp), axis=0, dtype=np.uint8).tobytes())
+            else:
+                for i in range(bpp, stride):
+                    line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            if np is not None:
+                line = bytearray((np.frombuffer(line, dtype=np.uint8) + np.frombuffer(prev, dtype=np.uint8)).tobytes())
+            else:
+                line = bytearray([(a + b) & 0xFF for a, b in zip(line, prev)])
+        elif filter_type == 3:
+            for i in range(bpp):
+                line[i] = (line[i] + (prev[i] >> 1)) & 0xFF
+            for i in range(bpp, stride):
+                line[i] = (line[i] + ((line[i - bpp] + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(bpp):
+                line[i] = (line[i] + prev[i]) & 0xFF
+            for i in range(bpp, stride):
+                a = line[i - bpp]
+                b = prev[i]
+                c = prev[i - bpp]
+                pa = b - c
+                pb = a - c
+                pc = pa + pb
+                pa = -pa if pa < 0 else pa
+                pb = -pb if pb < 0 else pb
+                pc = -pc if pc < 0 else pc
+                if pa <= pb and pa <= pc:
+                    line[i] = (line[i] + a) & 0xFF
+                elif pb <= pc:
+                    line[i] = (line[i] + b) & 0xFF
+                else:
+                    line[i] = (line[i] + c) & 0xFF
+        else:
+            raise WrongFormatException("Invalid PNG filter type: " + str(filter_type))
+        out[y * stride:(y + 1) * stride] = line
+        prev = line
+    return out
+
+
+def _to_rgba(pixels: bytearray, width: int, height: int, stride: int, depth: int, color_type: int, palette: bytes | None, transparency: bytes | None) -> bytes:
+    """Convert unfiltered pixels to 8 bit RGBA"""
+    if depth == 16:
+        # Keep the most significant byte of every sample
+        pixels = pixels[::2]
+        stride //= 2
+    elif depth < 8:
+        pixels = _unpack_bits(pixels, width, height, stride, depth, color_type == 0)
+    count = width * height
+    if color_type == 6:
+        return bytes(pixels)
+    rgba = bytearray(count * 4)
+    if color_type == 3:
+        assert palette is not None
+        alpha = transparency if transparency is not None else b""
+        table = [palette[i * 3:i * 3 + 3] + bytes([alpha[i] if i < len(alpha) else 255]) for i in range(len(palette) // 3)]
+        table += [b"\x00\x00\x00\xff"] * (256 - len(table))
+        return b"".join(table[index] for index in pixels)
+    if color_type == 0:
+        for i in range(3):
+            rgba[i::4] = pixels
+        rgba[3::4] = b"\xff" * count
+        if transparency is not None:
+            # The key is stored in 2 bytes, for 16 bit images only the most significant one is kept
+            key = transparency[0] if depth == 16 else transparency[1] * (255 // ((1 << depth) - 1))
+            for i, value in enumerate(pixels):
+                if value == key:
+                    rgba[i * 4 + 3] = 0
+    elif color_type == 4:
+        for i in range(3):
+            rgba[i::4] = pixels[0::2]
+        rgba[3::4] = pixels[1::2]
+    elif color_type == 2:
+        for i in range(3):
+            rgba[i::4] = pixels[i::3]
+        rgba[3::4] = b"\xff" * count
+        if transparency is not None:
+            key = bytes(transparency[0::2]) if depth == 16 else bytes(transparency[1::2])
+            for i in range(count):
+                if pixels[i * 3:i * 3 + 3] == key:
+                    rgba[i * 4 + 3] = 0
+    return bytes(rgba)
+
+
+def _unpack_bits(pixels: bytearray, width: int, height: int, stride: int, depth: int, scale: bool) -> bytearray:
+    """Expand samples smaller than a byte to one byte each, grayscale samples are scaled to 0-255"""
+    per_byte = 8 // depth
+    mask = (1 << depth) - 1
+    factor = 255 // mask if scale else 1
+    out = bytearray(width * height)
+    for y in range(height):
+        row = pixels[y * stride:(y + 1) * stride]
+        for x in range(width):
+            shift = 8 - depth * (x % per_byte + 1)
+            out[y * width + x] = ((row[x // per_byte] >> shift) & mask) * factor
+    return out
+
+
+def encode_png(width: int, height: int, rgba: bytes, level: int = 6) -> bytes:
+    """Encode RGBA pixels as a PNG image, without filters
+
+    Args:
+        width (int): width of the image
+        height (int): height of the image
+        rgba (bytes): pixels, 4 bytes per pixel
+        level (int, optional): zlib compression level. Defaults to 6.
+
+    Returns:
+        bytes: content of the PNG file
+    """
+    stride = width * 4
+    raw = b"".join(b"\x00" + rgba[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(kind: bytes, content: bytes) -> bytes:
+        return struct.pack(">I", len(content)) + kind + content + struct.pack(">I", zlib.crc32(kind + content))
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return PNG_SIGNATURE + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, level)) + chunk(b"IEND", b"")
+
+
+def composite(width: int, height: int, rgba: bytes, size: tuple[int, int], background: tuple[int, int, int, int] = (0, 0, 0, 0)) -> bytes:
+    """Draw an image in the middle of a canvas filled with the background color, using alpha blending
+
+    Args:
+        width (int): width of the image
+        height (int): height of the image
+        rgba (bytes): pixels of the image
+        size (tuple[int, int]): width and height of the canvas
+        background (tuple[int, int, int, int], optional): RGBA color of the canvas. Defaults to (0, 0, 0, 0).
+
+    Returns:
+        bytes: RGBA pixels of the canvas
+    """
+    canvas_width, canvas_height = size
+    if (width, height) == size and background[3] == 0:
+        return rgba
+    # Blend the image with the background
+    if background[3] != 0:
+        rgba = _blend(rgba, width * height, background)
+    if (width, height) == size:
+        return rgba
+    # Center the image, cropping it if it is larger than the canvas
+    canvas = bytearray(bytes(background) * (canvas_width * canvas_height))
+    left = (canvas_width - width) // 2
+    top = (canvas_height - height) // 2
+    src_x = max(0, -left)
+    dst_x = max(0, left)
+    row_width = min(width - src_x, canvas_width - dst_x)
+    if row_width <= 0:
+        return bytes(canvas)
+    for y in range(max(0, -top), min(height, canvas_height - top)):
+        src = (y * width + src_x) * 4
+        dst = ((y + top) * canvas_width + dst_x) * 4
+        canvas[dst:dst + row_width * 4] = rgba[src:src + row_width * 4]
+    return bytes(canvas)
+
+
+def _blend(rgba: bytes, count: int, background: tuple[int, int, int, int]) -> bytes:
+    """Blend the pixels over a background color"""
+    bg_alpha = background[3]
+    if np is not None:
+        pixels = np.frombuffer(rgba, dtype=np.uint8).reshape(-1, 4).astype(np.uint32)
+        alpha = pixels[:, 3:4]
+        back = (255 - alpha) * bg_alpha // 255
+        out_alpha = alpha + back
+        color = (pixels[:, :3] * alpha + np.array(background[:3], dtype=np.uint32) * back) // np.maximum(out_alpha, 1)
+        return np.concatenate((color, out_alpha), axis=1).astype(np.uint8).tobytes()
+    out = bytearray(rgba)
+    for i in range(0, count * 4, 4):
+        alpha = out[i + 3]
+        if alpha == 255:
+            continue
+        back = (255 - alpha) * bg_alpha // 255
+        out_alpha = alpha + back
+        for c in range(3):
+            out[i + c] = (out[i + c] * alpha + background[c] * back) // out_alpha
+        out[i + 3] = out_alpha
+    return bytes(out)
+
+
+def _render_image(task: tuple) -> tuple[int, int, bytes, bytes | None]:
+    """Decode and composite an image in a worker, returns its size, the RGBA canvas and optionally the PNG encoded canvas"""
+    data, size, background, encode = task
+    width, height, rgba = decode_png(data)
+    if size is None:
+        size = (width, height)
+    frame = composite(width, height, rgba, size, background)
+    return size[0], size[1], frame, encode_png(size[0], size[1], frame) if encode else None
+
+
+class RenderReport:
+    """Statistics of a render"""
+    frames : int
+    elapsed : float
+    duration : float
+    decoded : int
+
+    def __init__(self, frames: int, elapsed: float, duration: float, decoded: int) -> None:
+        self.frames = frames
+        self.elapsed = elapsed
+        self.duration = duration
+        self.decoded = decoded
+
+    def get_fps(self) -> float:
+        """Rendered frames per second"""
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def get_realtime_factor(self) -> float:
+        """How many times faster than real time the render was"""
+        return self.duration / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return "{} frames in {:.2f}s ({:.1f} FPS, {:.1f}x real time), {} images decoded".format(
+            self.frames, self.elapsed, self.get_fps(), self.get_realtime_factor(), self.decoded)
+
+
+class FrameRenderer:
+    """Render the lipsync of a model to raw RGBA frames, image sequences or videos, without a GUI.
+    Every image is decoded and composited only once, the frames reuse the cached canvases"""
+    model : "LivePNG"
+    size : tuple[int, int] | None
+    background : tuple[int, int, int, int]
+    workers : int | None
+
+    def __init__(self, model: "LivePNG", size: tuple[int, int] | None = None, background: tuple[int, int, int, int] = (0, 0, 0, 0), workers: int | None = None) -> None:
+        """Initialize the renderer
+
+        Args:
+            model (LivePNG): the model, the frames are taken from its current variant
+            size (tuple[int, int] | None, optional): width and height of the frames, if None the size of the first decoded image. Defaults to None.
+            background (tuple[int, int, int, int], optional): RGBA color behind the images. Defaults to (0, 0, 0, 0).
+            workers (int | None, optional): number of processes decoding the images, if None the number of CPUs. Defaults to None.
+        """
+        self.model = model
+        self.size = size
+        self.background = background
+        self.workers = workers
+        self.__frames = {}
+        self.__encoded = {}
+
+    def get_frame(self, image: str) -> bytes:
+        """Get the RGBA canvas of an image of the current variant
+
+        Args:
+            image (str): name of the image
+
+        Returns:
+            bytes: RGBA pixels of the frame
+        """
+        key = self.__get_key(image)
+        if key not in self.__frames:
+            self.__decode([image], False, False)
+        return self.__frames[key]
+
+    def clear(self):
+        """Remove the decoded images from the cache"""
+        self.__frames.clear()
+        self.__encoded.clear()
+
+    def __get_key(self, image: str) -> tuple:
+        model = self.model
+        return (str(model.current_style), str(model.current_expression), str(model.current_variant), image)
+
+    def __decode(self, images: Iterable[str], encode: bool, parallel: bool) -> int:
+        """Decode the images of the current variant that are not cached, on a process pool if parallel is True.
+        Returns the number of decoded images"""
+        cache = self.__encoded if encode else self.__frames
+        missing = [image for image in dict.fromkeys(images) if self.__get_key(image) not in cache]
+        if len(missing) == 0:
+            return 0
+        tasks = [(bytes(self.model.get_current_image_data(image)), self.size, self.background, encode) for image in missing]
+        results = []
+        # The first image decides the size of the canvas
+        if self.size is None:
+            results.append(_render_image(tasks.pop(0)))
+            self.size = results[0][:2]
+            tasks = [(data, self.size, background, encode) for data, _, background, encode in tasks]
+        if parallel and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(len(tasks), self.workers or os.cpu_count() or 1)) as executor:
+                results.extend(executor.map(_render_image, tasks))
+        else:
+            results.extend(map(_render_image, tasks))
+        for image, (_, _, frame, encoded) in zip(missing, results):
+            key = self.__get_key(image)
+            self.__frames[key] = frame
+            if encoded is not None:
+                self.__encoded[key] = encoded
+        return len(missing)
+
+    def __prepare(self, wavfile: str, frame_rate: int, encode: bool) -> tuple[list[str], int, float]:
+        """Calculate the frames of an audio file and decode their images, returns the images of the frames, the number of decoded images and the duration"""
+        images = self.model.get_current_variant().get_images()
+        frames = [images[index] for index in self.model.calculate_frame_indexes_from_audio(wavfile, frame_rate)]
+        decoded = self.__decode(frames, encode, True)
+        return frames, decoded, len(frames) / frame_rate
+
+    def render_frames(self, wavfile: str, frame_rate: int = 30) -> Iterator[bytes]:
+        """Calculate the lipsync of an audio file and iterate over its frames
+
+        Args:
+            wavfile (str): path to the audio file
+            frame_rate (int, optional): frame rate. Defaults to 30.
+
+        Returns:
+            Iterator[bytes]: RGBA pixels of every frame
+        """
+        frames, _, _ = self.__prepare(wavfile, frame_rate, False)
+        for image in frames:
+            yield self.__frames[self.__get_key(image)]
+
+    def render_image_sequence(self, wavfile: str, directory: str, frame_rate: int = 30, name_format: str = "frame_{:06d}.png") -> RenderReport:
+        """Render the lipsync of an audio file to a sequence of PNG images. Every distinct frame is encoded once
+
+        Args:
+            wavfile (str): path to the audio file
+            directory (str): directory of the images, created if missing
+            frame_rate (int, optional): frame rate. Defaults to 30.
+            name_format (str, optional): file name of the images, formatted with the index of the frame. Defaults to "frame_{:06d}.png".
+
+        Returns:
+            RenderReport: statistics of the render
+        """
+        start = time.perf_counter()
+        os.makedirs(directory, exist_ok=True)
+        frames, decoded, duration = self.__prepare(wavfile, frame_rate, True)
+
+        def write(item: tuple[int, str]):
+            index, image = item
+            with open(os.path.join(directory, name_format.format(index)), "wb") as f:
+                f.write(self.__encoded[self.__get_key(image)])
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for _ in executor.map(write, enumerate(frames)):
+                pass
+        return RenderReport(len(frames), time.perf_counter() - start, duration, decoded)
+
+    def render_video(self, wavfile: str, output: str, frame_rate: int = 30, include_audio: bool = True, ffmpeg: str | None = None, codec_args: list[str] | None = None) -> RenderReport:
+        """Render the lipsync of an audio file to a video, piping raw frames to ffmpeg
+
+        Args:
+            wavfile (str): path to the audio file
+            output (str): path of the video, its extension decides the container
+            frame_rate (int, optional): frame rate. Defaults to 30.
+            include_audio (bool, optional): mux the audio in the video. Defaults to True.
+            ffmpeg (str | None, optional): path of the ffmpeg executable, if None it is searched in the PATH. Defaults to None.
+            codec_args (list[str] | None, optional): encoding arguments for ffmpeg, if None H.264 with yuv420p. Defaults to None.
+
+        Raises:
+            NotFoundException: if ffmpeg is not installed
+            RuntimeError: if ffmpeg fails
+
+        Returns:
+            RenderReport: statistics of the render
+        """
+        executable = ffmpeg if ffmpeg is not None else shutil.which("ffmpeg")
+        if executable is None:
+            raise NotFoundException("ffmpeg not found")
+        start = time.perf_counter()
+        frames, decoded, duration = self.__prepare(wavfile, frame_rate, False)
+        assert self.size is not None
+        command = [executable, "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "{}x{}".format(*self.size), "-r", str(frame_rate), "-i", "-"]
+        if include_audio:
+            command += ["-i", wavfile, "-c:a", "aac", "-shortest"]
+        command += codec_args if codec_args is not None else ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        command.append(output)
+        # The errors go to a file, a full stderr pipe would block ffmpeg while the frames are written to its stdin
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=log)
+            assert process.stdin is not None
+            try:
+                for image in frames:
+                    process.stdin.write(self.__frames[self.__get_key(image)])
+            except BrokenPipeError:
+                pass
+            finally:
+                process.stdin.close()
+            if process.wait() != 0:
+                log.seek(0)
+                raise RuntimeError("ffmpeg failed: " + log.read().decode(errors="replace").strip())
+        return RenderReport(len(frames), time.perf_counter() - start, duration, decoded)
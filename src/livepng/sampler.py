@@ -0,0 +1,50 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+import random
+
+
+class WeightedSampler:
+    """Draw elements with a probability proportional to their weight.
+    The cumulative weights are calculated once, every draw is a binary search"""
+    __slots__ = ("elements", "cumulative", "total")
+    elements : tuple
+    cumulative : tuple[float, ...]
+    total : float
+
+    def __init__(self, elements: Sequence, weights: Sequence[float]) -> None:
+        """Initialize the sampler
+
+        Args:
+            elements (Sequence): elements to draw
+            weights (Sequence[float]): weight of every element, the higher is the weight, the higher is the probability
+
+        Raises:
+            ValueError: if the number of weights is different from the number of elements, or if the total weight is not positive
+        """
+        if len(elements) != len(weights):
+            raise ValueError("The number of weights does not match the number of elements")
+        cumulative = []
+        total = 0.0
+        for weight in weights:
+            if weight < 0:
+                raise ValueError("Weights must not be negative")
+            total += weight
+            cumulative.append(total)
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+        self.elements = tuple(elements)
+        self.cumulative = tuple(cumulative)
+        self.total = total
+
+    def sample(self, rng: random.Random | None = None):
+        """Draw an element
+
+        Args:
+            rng (random.Random | None, optional): random number generator, if None the one of the random module is used. Defaults to None.
+
+        Returns:
+            the drawn element
+        """
+        value = (rng if rng is not None else random).random() * self.total
+        # Elements with zero weight are never drawn, since their cumulative weight equals the previous one
+        return self.elements[bisect_right(self.cumulative, value, 0, len(self.cumulative) - 1)]
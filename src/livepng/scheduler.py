@@ -0,0 +1,434 @@
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import Condition, Event, Thread
+import asyncio
+import copy
+import heapq
+import time
+
+
+class FrameStats:
+    """Timing statistics of the frames shown while speaking"""
+    shown : int
+    dropped : int
+    late : int
+    max_delay : float
+    total_delay : float
+
+    def __init__(self) -> None:
+        self.shown = 0
+        self.dropped = 0
+        self.late = 0
+        self.max_delay = 0.0
+        self.total_delay = 0.0
+
+    def get_mean_delay(self) -> float:
+        """Mean delay of the frames shown after their deadline, in seconds"""
+        if self.shown == 0:
+            return 0.0
+        return self.total_delay / self.shown
+
+    def record(self, delay: float, late_tolerance: float):
+        """Record the delay of a frame shown after its deadline
+
+        Args:
+            delay (float): delay in seconds
+            late_tolerance (float): delay after which the frame is considered late
+        """
+        self.max_delay = max(self.max_delay, delay)
+        self.total_delay += delay
+        if delay > late_tolerance:
+            self.late += 1
+
+    def __str__(self) -> str:
+        return "shown: {}, dropped: {}, late: {}, max delay: {:.1f}ms".format(self.shown, self.dropped, self.late, self.max_delay * 1000)
+
+
+class FrameScheduler:
+    """Schedule the frames from the start time of the speech, so that the time spent
+    showing a frame does not delay the next ones"""
+    frame_rate : int
+    stats : FrameStats
+
+    def __init__(self, frame_rate: int = 10, late_tolerance: float | None = None, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep, should_stop: Callable[[], bool] | None = None, origin: float | None = None) -> None:
+        """Initialize the scheduler
+
+        Args:
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+            late_tolerance (float | None, optional): Delay in seconds after which a frame is considered late.
+                If None a quarter of the frame duration is used. Defaults to None.
+            clock (Callable[[], float], optional): monotonic clock in seconds, for example the playback position 
+                of an AudioOutput. Defaults to time.monotonic.
+            sleep (Callable[[float], None], optional): sleep function. Defaults to time.sleep.
+            should_stop (Callable[[], bool] | None, optional): function that returns True when waiting must be interrupted. Defaults to None.
+            origin (float | None, optional): time of the clock at which the first frame is due, for example 0 for the playback position
+                of an AudioOutput, that starts when it is opened. If None the time at which start is called. Defaults to None.
+        """
+        self.frame_rate = frame_rate
+        self.late_tolerance = late_tolerance if late_tolerance is not None else 1 / (4 * frame_rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.should_stop = should_stop
+        self.origin = origin
+        self.stats = FrameStats()
+        self.start_time = None
+
+    def start(self):
+        """Start the timeline from now, or from the origin of the clock if given"""
+        self.start_time = self.origin if self.origin is not None else self.clock()
+        self.stats = FrameStats()
+
+    def elapsed(self) -> float:
+        """Seconds since the start of the timeline"""
+        if self.start_time is None:
+            self.start()
+        return self.clock() - self.start_time
+
+    def deadline(self, index: int) -> float:
+        """Time in seconds from the start at which the given frame must be shown"""
+        return index / self.frame_rate
+
+    def wait(self, index: int) -> bool:
+        """Wait until the given frame must be shown
+
+        Args:
+            index (int): index of the frame
+
+        Returns:
+            bool: False if the frame must be dropped, because the next frame is already due
+        """
+        delay = self.__get_delay(index)
+        if delay is None:
+            return False
+        # The clock might not advance at the same speed of sleep (e.g. audio clocks), so check it again
+        while delay < 0:
+            if self.should_stop is not None and self.should_stop():
+                return False
+            self.sleep(min(-delay, 1 / (4 * self.frame_rate)))
+            delay = self.elapsed() - self.deadline(index)
+        self.stats.shown += 1
+        return True
+
+    async def wait_async(self, index: int) -> bool:
+        """Wait until the given frame must be shown, sleeping on the event loop
+
+        Args:
+            index (int): index of the frame
+
+        Returns:
+            bool: False if the frame must be dropped, because the next frame is already due
+        """
+        delay = self.__get_delay(index)
+        if delay is None:
+            return False
+        while delay < 0:
+            if self.should_stop is not None and self.should_stop():
+                return False
+            await asyncio.sleep(min(-delay, 1 / (4 * self.frame_rate)))
+            delay = self.elapsed() - self.deadline(index)
+        self.stats.shown += 1
+        return True
+
+    def __get_delay(self, index: int) -> float | None:
+        """Get the delay of the frame from its deadline, negative if it is early. 
+        Returns None if the frame must be dropped, and records the frames shown late"""
+        now = self.elapsed()
+        if now >= self.deadline(index + 1):
+            self.stats.dropped += 1
+            return None
+        delay = now - self.deadline(index)
+        if delay >= 0:
+            self.stats.record(delay, self.late_tolerance)
+        return delay
+
+    def wait_end(self, frames: int):
+        """Wait until the end of the last frame
+
+        Args:
+            frames (int): number of frames in the timeline
+        """
+        remaining = self.deadline(frames) - self.elapsed()
+        if remaining > 0:
+            self.sleep(remaining)
+
+    async def wait_end_async(self, frames: int):
+        """Wait until the end of the last frame, sleeping on the event loop
+
+        Args:
+            frames (int): number of frames in the timeline
+        """
+        remaining = self.deadline(frames) - self.elapsed()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+
+class Timeline:
+    """Frames of a speech registered in a SharedScheduler"""
+    frames : Sequence[int]
+    frame_rate : int
+    name : str
+    start_time : float
+    stats : FrameStats
+    owner_stats : FrameStats
+    error : Exception | None
+
+    def __init__(self, frames: Sequence[int], frame_rate: int, on_frame: Callable[[int], None], on_finish: Callable[[bool], None] | None, start_time: float, name: str = "", owner_stats: FrameStats | None = None) -> None:
+        """Initialize the timeline
+
+        Args:
+            frames (Sequence[int]): frames to show, as indexes of the images of the variant
+            frame_rate (int): frame rate
+            on_frame (Callable[[int], None]): called with every frame to show, if it raises the timeline is cancelled
+            on_finish (Callable[[bool], None] | None): called at the end, with False if the timeline has been cancelled
+            start_time (float): time.monotonic() time of the first frame
+            name (str, optional): name of the owner of the timeline in the statistics. Defaults to "".
+            owner_stats (FrameStats | None, optional): statistics of every timeline of the owner, updated with the ones of this timeline.
+                If None only this timeline is counted. Defaults to None.
+        """
+        self.frames = frames
+        self.frame_rate = frame_rate
+        self.on_frame = on_frame
+        self.on_finish = on_finish
+        self.start_time = start_time
+        self.name = name
+        self.stats = FrameStats()
+        self.owner_stats = owner_stats if owner_stats is not None else self.stats
+        self.error = None
+        self.index = 0
+        self.busy = False
+        self.cancelled = False
+        self.__finished = Event()
+
+    def deadline(self, index: int) -> float:
+        """time.monotonic() time at which the given frame must be shown"""
+        return self.start_time + index / self.frame_rate
+
+    def get_end_time(self) -> float:
+        """time.monotonic() time of the end of the last frame"""
+        return self.deadline(len(self.frames))
+
+    def cancel(self):
+        """Stop showing the frames, on_finish is called with False"""
+        self.cancelled = True
+
+    def is_finished(self) -> bool:
+        """Check if the timeline is finished or cancelled, and on_finish has been called"""
+        return self.__finished.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until the timeline is finished
+
+        Args:
+            timeout (float | None, optional): maximum time to wait in seconds. Defaults to None.
+
+        Raises:
+            Exception: the first exception raised by on_frame or on_finish
+
+        Returns:
+            bool: True if the timeline is finished
+        """
+        finished = self.__finished.wait(timeout)
+        if finished and self.error is not None:
+            raise self.error
+        return finished
+
+    def _set_finished(self):
+        """Mark the timeline as finished"""
+        self.__finished.set()
+
+    def _set_error(self, error: Exception):
+        """Keep the first exception raised by the callbacks, they run on the dispatch threads"""
+        if self.error is None:
+            self.error = error
+
+
+class SharedScheduler:
+    """Show the frames of many models from a single timing thread. The timelines are kept in a heap ordered by the
+    time of their next frame, and the notifications are dispatched by a small fixed pool of threads.
+    If the notification of the previous frame of a timeline is still running, the frame is dropped"""
+    late_tolerance : float | None
+
+    def __init__(self, workers: int = 4, late_tolerance: float | None = None) -> None:
+        """Initialize the scheduler, the timing thread is started with the first timeline
+
+        Args:
+            workers (int, optional): number of threads that dispatch the frames. Defaults to 4.
+            late_tolerance (float | None, optional): Delay in seconds after which a frame is considered late.
+                If None a quarter of the frame duration of every timeline is used. Defaults to None.
+        """
+        self.late_tolerance = late_tolerance
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="livepng-frames")
+        self.__heap = []
+        self.__counter = count()
+        self.__condition = Condition()
+        self.__thread = None
+        self.__timelines = set()
+        self.__stats = {}
+        self.__closed = False
+
+    def add(self, frames: Sequence[int], frame_rate: int, on_frame: Callable[[int], None], on_finish: Callable[[bool], None] | None = None, start_time: float | None = None, name: str = "") -> Timeline:
+        """Register the frames of a speech
+
+        Args:
+            frames (Sequence[int]): frames to show, as indexes of the images of the variant
+            frame_rate (int): frame rate
+            on_frame (Callable[[int], None]): called with every frame to show, from one of the dispatch threads.
+                If it raises, the timeline is cancelled and Timeline.wait raises the exception
+            on_finish (Callable[[bool], None] | None, optional): called at the end, with False if the timeline has been cancelled. Defaults to None.
+            start_time (float | None, optional): time.monotonic() time of the first frame, if None it starts now. Defaults to None.
+            name (str, optional): name of the owner of the timeline, for example the model. The statistics of the timelines
+                with the same name are added together and kept after they finish. Defaults to "".
+
+        Raises:
+            RuntimeError: if the scheduler has been shut down
+
+        Returns:
+            Timeline: the registered timeline
+        """
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("The scheduler has been shut down")
+            owner_stats = self.__stats.setdefault(name, FrameStats())
+            timeline = Timeline(frames, frame_rate, on_frame, on_finish, time.monotonic() if start_time is None else start_time, name, owner_stats)
+            self.__timelines.add(timeline)
+            self.__push(timeline)
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, daemon=True, name="livepng-scheduler")
+                self.__thread.start()
+            self.__condition.notify()
+        return timeline
+
+    def cancel(self, timeline: Timeline):
+        """Cancel a timeline, on_finish is called with False
+
+        Args:
+            timeline (Timeline): timeline to cancel
+        """
+        timeline.cancel()
+        with self.__condition:
+            # Handle it now instead of at its next frame
+            self.__push(timeline, time.monotonic())
+            self.__condition.notify()
+
+    def get_stats(self) -> dict[str, FrameStats]:
+        """Get the timing statistics of every owner, they include the timelines that already finished
+
+        Returns:
+            dict[str, FrameStats]: name of the owner -> copy of the statistics of all its timelines
+        """
+        with self.__condition:
+            return {name: copy.copy(stats) for name, stats in self.__stats.items()}
+
+    def reset_stats(self, name: str | None = None):
+        """Forget the statistics of an owner, for example when the model is closed
+
+        Args:
+            name (str | None, optional): name of the owner, if None every owner is forgotten. Defaults to None.
+        """
+        with self.__condition:
+            if name is None:
+                self.__stats.clear()
+            else:
+                self.__stats.pop(name, None)
+            # The running timelines keep counting for their owner
+            for timeline in self.__timelines:
+                if timeline.name not in self.__stats:
+                    timeline.owner_stats = self.__stats.setdefault(timeline.name, FrameStats())
+
+    def __len__(self) -> int:
+        return len(self.__timelines)
+
+    def shutdown(self, wait: bool = True):
+        """Cancel every timeline and stop the threads
+
+        Args:
+            wait (bool, optional): wait for the threads to finish. Defaults to True.
+        """
+        with self.__condition:
+            self.__closed = True
+            for timeline in self.__timelines:
+                timeline.cancel()
+                self.__push(timeline, time.monotonic())
+            self.__condition.notify()
+        if wait and self.__thread is not None:
+            self.__thread.join()
+        self.__executor.shutdown(wait=wait)
+
+    def __push(self, timeline: Timeline, due: float | None = None):
+        """Add the next event of a timeline to the heap, the lock must be held"""
+        if due is None:
+            due = timeline.deadline(timeline.index)
+        heapq.heappush(self.__heap, (due, next(self.__counter), timeline))
+
+    def __run(self):
+        """Timing thread: wait for the next due timeline and dispatch its frame"""
+        while True:
+            with self.__condition:
+                while True:
+                    if len(self.__heap) == 0:
+                        if self.__closed:
+                            return
+                        self.__condition.wait()
+                        continue
+                    due = self.__heap[0][0]
+                    now = time.monotonic()
+                    if due <= now:
+                        break
+                    self.__condition.wait(due - now)
+                _, _, timeline = heapq.heappop(self.__heap)
+                if timeline not in self.__timelines:
+                    # Already finished, the entry was pushed by cancel
+                    continue
+                if timeline.cancelled or timeline.index >= len(timeline.frames):
+                    if timeline.busy:
+                        # Notify the end after the last frame
+                        self.__push(timeline, now + 0.001)
+                        continue
+                    self.__timelines.discard(timeline)
+                    self.__executor.submit(self.__finish, timeline, not timeline.cancelled)
+                    continue
+                self.__advance(timeline, now)
+
+    def __advance(self, timeline: Timeline, now: float):
+        """Dispatch the current frame of a timeline, dropping the ones already missed, and schedule the next one"""
+        tolerance = self.late_tolerance if self.late_tolerance is not None else 1 / (4 * timeline.frame_rate)
+        stats = (timeline.stats, ) if timeline.owner_stats is timeline.stats else (timeline.stats, timeline.owner_stats)
+        # Drop the frames whose next frame is already due
+        while timeline.index < len(timeline.frames) - 1 and now >= timeline.deadline(timeline.index + 1):
+            for frame_stats in stats:
+                frame_stats.dropped += 1
+            timeline.index += 1
+        if timeline.busy:
+            for frame_stats in stats:
+                frame_stats.dropped += 1
+        else:
+            for frame_stats in stats:
+                frame_stats.shown += 1
+                frame_stats.record(now - timeline.deadline(timeline.index), tolerance)
+            timeline.busy = True
+            self.__executor.submit(self.__dispatch, timeline, timeline.frames[timeline.index])
+        timeline.index += 1
+        self.__push(timeline)
+
+    def __dispatch(self, timeline: Timeline, frame: int):
+        """Notify a frame, on a dispatch thread"""
+        try:
+            if not timeline.cancelled:
+                timeline.on_frame(frame)
+        except Exception as e:
+            # The next frames would most likely fail too
+            timeline._set_error(e)
+            self.cancel(timeline)
+        finally:
+            timeline.busy = False
+
+    def __finish(self, timeline: Timeline, completed: bool):
+        """Notify the end of a timeline, on a dispatch thread"""
+        try:
+            if timeline.on_finish is not None:
+                timeline.on_finish(completed)
+        except Exception as e:
+            timeline._set_error(e)
+        finally:
+            timeline._set_finished()
@@ -0,0 +1,205 @@
+from collections.abc import AsyncIterable, Iterable, Iterator
+from array import array
+import asyncio
+import sys
+import wave
+
+from livepng import amplitude
+from livepng.analyzers import AmplitudeAnalyzer, get_normalization
+
+"""Number of windows the audio is read ahead of the frames while streaming"""
+STREAM_LOOKAHEAD = 2
+"""Seconds to wait for the audio thread to accept a window before checking that it is still running"""
+STREAM_QUEUE_TIMEOUT = 0.1
+"""Seconds to wait for an interrupted audio thread to stop"""
+STREAM_STOP_TIMEOUT = 1.0
+"""Array typecodes for the supported sample widths, 24 bit samples are expanded to 32 bit"""
+SAMPLE_TYPECODES = {1: "b", 2: "h", 3: "i", 4: "i"}
+
+
+def samples_from_bytes(data: bytes, sample_width: int) -> array:
+    """Convert raw little endian PCM data to an array of signed samples, like pydub get_array_of_samples
+
+    Args:
+        data (bytes): raw PCM data
+        sample_width (int): bytes per sample
+
+    Raises:
+        ValueError: if the sample width is not supported
+
+    Returns:
+        array: signed samples
+    """
+    if sample_width not in SAMPLE_TYPECODES:
+        raise ValueError("Sample width not supported: " + str(sample_width))
+    if sample_width == 1:
+        # 8 bit PCM is unsigned
+        return array("b", bytes((byte - 128) & 0xFF for byte in data))
+    if sample_width == 3:
+        # Pad every sample to 32 bit
+        padded = bytearray(len(data) // 3 * 4)
+        for i in range(3):
+            padded[i + 1::4] = data[i::3]
+        data = bytes(padded)
+    samples = array(SAMPLE_TYPECODES[sample_width], data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def is_async_iterable(chunks) -> bool:
+    """Check if the chunks must be consumed with async for"""
+    return isinstance(chunks, AsyncIterable)
+
+
+def iterate_chunks(chunks: Iterable[bytes] | AsyncIterable[bytes], loop: asyncio.AbstractEventLoop | None = None) -> Iterator[bytes]:
+    """Iterate synchronously over an iterable or an async iterable of chunks
+
+    Args:
+        chunks (Iterable[bytes] | AsyncIterable[bytes]): chunks of audio
+        loop (asyncio.AbstractEventLoop | None, optional): running event loop on which async iterables are consumed.
+            It must be running on another thread. If None a new event loop is used. Defaults to None.
+
+    Yields:
+        bytes: the chunks
+    """
+    if not is_async_iterable(chunks):
+        yield from chunks
+        return
+    iterator = chunks.__aiter__()
+    own_loop = None
+    if loop is None:
+        own_loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                if own_loop is not None:
+                    chunk = own_loop.run_until_complete(iterator.__anext__())
+                else:
+                    chunk = asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+            yield chunk
+    finally:
+        if own_loop is not None:
+            own_loop.close()
+
+
+class PCMWindower:
+    """Split a stream of raw PCM chunks in one window of audio per frame"""
+    sample_rate : int
+    sample_width : int
+    channels : int
+    frame_rate : int
+    window_bytes : int
+
+    def __init__(self, sample_rate: int, sample_width: int, channels: int, frame_rate: int = 10) -> None:
+        """Initialize the windower
+
+        Args:
+            sample_rate (int): sample rate of the audio
+            sample_width (int): bytes per sample
+            channels (int): number of channels
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+        """
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.frame_rate = frame_rate
+        self.window_bytes = amplitude.window_size(sample_rate, frame_rate) * sample_width * channels
+        self.__buffer = bytearray()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Add a chunk of PCM data
+
+        Args:
+            data (bytes): raw PCM data
+
+        Yields:
+            bytes: every window completed by the chunk
+        """
+        self.__buffer.extend(data)
+        while len(self.__buffer) >= self.window_bytes:
+            window = bytes(self.__buffer[:self.window_bytes])
+            del self.__buffer[:self.window_bytes]
+            yield window
+
+    def flush(self) -> Iterator[bytes]:
+        """Return the last, incomplete, window
+
+        Yields:
+            bytes: the remaining data, if any
+        """
+        # Drop incomplete samples
+        frame_size = self.sample_width * self.channels
+        remaining = len(self.__buffer) - len(self.__buffer) % frame_size
+        if remaining > 0:
+            yield bytes(self.__buffer[:remaining])
+        self.__buffer.clear()
+
+    def windows(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Split an iterable of PCM chunks in windows
+
+        Args:
+            chunks (Iterable[bytes]): PCM chunks
+
+        Yields:
+            bytes: windows of audio
+        """
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.flush()
+
+    def amplitude(self, window: bytes, method: str = "mean", analyzer: AmplitudeAnalyzer | None = None) -> float:
+        """Calculate the amplitude of a window
+
+        Args:
+            window (bytes): raw PCM window
+            method (str, optional): amplitude method. Defaults to "mean".
+            analyzer (AmplitudeAnalyzer | None, optional): streaming analyzer, it replaces the method. Defaults to None.
+
+        Returns:
+            float: normalized amplitude
+        """
+        samples = samples_from_bytes(window, self.sample_width)
+        if analyzer is not None:
+            return analyzer.process(samples, self.sample_rate, self.frame_rate, self.sample_width, self.channels)[0]
+        # The channels and the sample width are handled like the whole files of LivePNG.get_amplitudes_from_audio
+        return amplitude.calculate_amplitudes(self.sample_rate, samples, self.frame_rate, method,
+                                              normalization=get_normalization(self.sample_width), channels=self.channels)[0]
+
+
+class WavStream:
+    """Read a WAV file one frame window at a time"""
+    path : str
+    sample_rate : int
+    sample_width : int
+    channels : int
+
+    def __init__(self, path: str, frame_rate: int = 10) -> None:
+        """Open the WAV file and read its header
+
+        Args:
+            path (str): path to the .wav file
+            frame_rate (int, optional): Frame rate. Defaults to 10.
+        """
+        self.path = path
+        self.frame_rate = frame_rate
+        with wave.open(path, "rb") as f:
+            self.sample_rate = f.getframerate()
+            self.sample_width = f.getsampwidth()
+            self.channels = f.getnchannels()
+
+    def get_windower(self) -> PCMWindower:
+        """Get a windower for the parameters of the file"""
+        return PCMWindower(self.sample_rate, self.sample_width, self.channels, self.frame_rate)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Read the file in windows, only one window is kept in memory"""
+        window_frames = amplitude.window_size(self.sample_rate, self.frame_rate)
+        with wave.open(self.path, "rb") as f:
+            while True:
+                window = f.readframes(window_frames)
+                if len(window) == 0:
+                    break
+                yield window
@@ -0,0 +1,162 @@
+from livepng.constants import MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD
+
+"""Key of the threshold overrides in model.json, at model, style, expression or variant level"""
+THRESHOLDS_KEY = "thresholds"
+"""Keys of the closed and open amplitudes in a threshold override"""
+THRESHOLD_NAMES = ("closed", "open")
+
+
+def get_raw_variants(expression: dict) -> dict:
+    """Get the variants of an expression of model.json, written as variant name -> images
+    or as {"variants": {...}, "thresholds": ...}
+
+    Args:
+        expression (dict): the expression in model.json
+
+    Returns:
+        dict: variant name -> variant in model.json
+    """
+    variants = expression.get("variants")
+    return variants if isinstance(variants, dict) else expression
+
+
+def get_raw_images(variant: list | dict) -> list:
+    """Get the images of a variant of model.json, written as a list of images or as {"images": [...], "thresholds": ...}
+
+    Args:
+        variant (list | dict): the variant in model.json
+
+    Returns:
+        list: names of the images
+    """
+    if isinstance(variant, dict):
+        return variant.get("images", [])
+    return variant
+
+
+def get_expression_thresholds(expression: dict, inherited=None):
+    """Get the thresholds of an expression of model.json, or the inherited ones if it does not override them"""
+    if isinstance(expression.get("variants"), dict):
+        return expression.get(THRESHOLDS_KEY, inherited)
+    return inherited
+
+
+def get_variant_thresholds(variant: list | dict, inherited=None):
+    """Get the thresholds of a variant of model.json, or the inherited ones if it does not override them"""
+    if isinstance(variant, dict):
+        return variant.get(THRESHOLDS_KEY, inherited)
+    return inherited
+
+
+def calculate_intervals(count: int, thresholds: dict | list | None = None) -> tuple[tuple[float, float], ...]:
+    """Calculate the amplitude interval of every image of a variant
+
+    Args:
+        count (int): number of images
+        thresholds (dict | list | None, optional): override from model.json: {"closed": amplitude, "open": amplitude},
+            or the amplitudes at which every image after the first one starts. If None the default thresholds are used. Defaults to None.
+
+    Returns:
+        tuple[tuple[float, float], ...]: interval of every image
+    """
+    # if there is only one image always return it
+    if count == 1:
+        return ((0.0, 1.0), )
+    if isinstance(thresholds, list):
+        bounds = [0] + thresholds + [1]
+        return tuple((bounds[i], bounds[i + 1]) for i in range(count))
+    closed = MOUTH_CLOSED_THRESHOLD
+    opened = MOUTH_OPEN_THRESHOLD
+    if thresholds is not None:
+        closed = thresholds.get("closed", closed)
+        opened = thresholds.get("open", opened)
+    intervals = [(0, closed)]
+    # If there are more than 2 images calculate intermediate values
+    if count > 2:
+        mouth_unit = (opened - closed) / (count - 2)
+        for i in range(1, count - 1):
+            intervals.append((closed + (mouth_unit * (i - 1)), closed + (mouth_unit * i)))
+    intervals.append((opened, 1))
+    return tuple(intervals)
+
+
+def get_threshold_errors(thresholds, name: str, count: int | None = None) -> list[str]:
+    """Get the problems of a threshold override
+
+    Args:
+        thresholds (Any): the override in model.json
+        name (str): name of the node, used in the messages
+        count (int | None, optional): number of images of the variant it applies to, if known. Defaults to None.
+
+    Returns:
+        list[str]: description of every problem found
+    """
+    def is_amplitude(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 1
+    if isinstance(thresholds, dict):
+        errors = ["Unknown threshold " + str(key) + " in " + name for key in thresholds if key not in THRESHOLD_NAMES]
+        if not all(is_amplitude(thresholds[key]) for key in THRESHOLD_NAMES if key in thresholds):
+            return errors + ["The thresholds of " + name + " must be numbers between 0 and 1"]
+        if thresholds.get("closed", MOUTH_CLOSED_THRESHOLD) > thresholds.get("open", MOUTH_OPEN_THRESHOLD):
+            errors.append("The closed threshold of " + name + " is higher than the open one")
+        return errors
+    if isinstance(thresholds, list):
+        if not all(is_amplitude(value) for value in thresholds):
+            return ["The thresholds of " + name + " must be numbers between 0 and 1"]
+        if any(a >= b for a, b in zip(thresholds, thresholds[1:])):
+            return ["The thresholds of " + name + " must be increasing"]
+        if count is not None and count > 1 and len(thresholds) != count - 1:
+            return ["The thresholds of " + name + " must have " + str(count - 1) + " values, one for every image after the first"]
+        return []
+    return ["The thresholds of " + name + " must be an object or a list"]
+
+
+def get_model_threshold_errors(model_info: dict) -> list[str]:
+    """Get the problems of all the threshold overrides of a model, they do not require to access the assets
+
+    Args:
+        model_info (dict): decoded content of model.json
+
+    Returns:
+        list[str]: description of every problem found
+    """
+    errors = []
+    valid = {}
+    checked_counts = set()
+
+    def check(thresholds, name: str, count: int | None = None):
+        # Overrides inherited by many variants are reported once
+        if thresholds is None:
+            return
+        if id(thresholds) not in valid:
+            format_errors = get_threshold_errors(thresholds, name)
+            valid[id(thresholds)] = len(format_errors) == 0
+            errors.extend(format_errors)
+        if not valid[id(thresholds)] or not isinstance(thresholds, list) or count is None or (id(thresholds), count) in checked_counts:
+            return
+        checked_counts.add((id(thresholds), count))
+        errors.extend(get_threshold_errors(thresholds, name, count))
+    model_thresholds = model_info.get(THRESHOLDS_KEY)
+    check(model_thresholds, "the model")
+    styles = model_info.get("styles")
+    if not isinstance(styles, dict):
+        return errors
+    for style_name, style in styles.items():
+        if not isinstance(style, dict) or not isinstance(style.get("expressions"), dict):
+            continue
+        style_thresholds = style.get(THRESHOLDS_KEY, model_thresholds)
+        check(style_thresholds, "style " + style_name)
+        for expression_name, expression in style["expressions"].items():
+            if not isinstance(expression, dict):
+                errors.append("Expression " + expression_name + " of style " + style_name + " is not an object")
+                continue
+            expression_thresholds = get_expression_thresholds(expression, style_thresholds)
+            check(expression_thresholds, "expression " + expression_name + " of style " + style_name)
+            for variant_name, variant in get_raw_variants(expression).items():
+                name = "variant " + "/".join((style_name, expression_name, variant_name))
+                if not isinstance(variant, (list, dict)):
+                    errors.append("The images of " + name + " must be a list")
+                    continue
+                images = get_raw_images(variant)
+                check(get_variant_thresholds(variant, expression_thresholds), name, len(images) if isinstance(images, list) else None)
+    return errors
@@ -1,6 +1,9 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from livepng.exceptions import InvalidModelException
 from .constants import ASSETS_DIR_NAME
+from .atlas import get_atlas_key
+from .thresholds import get_model_threshold_errors, get_raw_images, get_raw_variants
 import json
 
 class ModelValidator:
@@ -64,17 +67,239 @@ class ModelValidator:
         Throws:
             InvalidModelException if the model is not valid
         """    
+        ModelValidator.__raise_first(ModelValidator.get_errors(json, path))
+
+    @staticmethod
+    def get_file_errors(path: str, workers: int | None = None) -> list[str]:
+        """Get every problem of a model from the location of the model.json file
+
+        Args:
+            path (str): Path to the model.json file
+            workers (int | None, optional): number of threads used to check the styles, if None they are checked sequentially. Defaults to None.
+
+        Returns:
+            list[str]: description of every problem found, empty if the model is valid
+        """
+        try:
+            with open(path, "r") as f:
+                js = json.loads(f.read())
+        except (OSError, ValueError) as e:
+            return ["Unable to read " + path + ": " + str(e)]
+        return ModelValidator.get_errors(js, os.path.dirname(path), workers)
+
+    @staticmethod
+    def get_errors(json: dict, path: str, workers: int | None = None) -> list[str]:
+        """Get every problem of a model from the decoded content of the model.json file.
+        Every directory is listed only once, and the styles can be checked in parallel on slow filesystems
+
+        Args:
+            json (dict): decoded content of the json file
+            path (str): Path to the folder of the model
+            workers (int | None, optional): number of threads used to check the styles, if None they are checked sequentially. Defaults to None.
+
+        Returns:
+            list[str]: description of every problem found, empty if the model is valid
+        """
+        errors = ModelValidator.get_root_errors(json, path)
+        if not isinstance(json, dict) or not isinstance(json.get("styles"), dict) or "atlas" in json or not os.path.isdir(os.path.join(path, ASSETS_DIR_NAME)):
+            return errors
+        # Styles that are not objects are already reported by get_root_errors
+        styles = [style for style, content in json["styles"].items() if isinstance(content, dict) and isinstance(content.get("expressions"), dict)]
+        def check(style: str) -> list[str]:
+            return ModelValidator.get_style_errors(json["styles"][style], style, os.path.join(path, ASSETS_DIR_NAME, style))
+        if workers is None or workers <= 1:
+            results = map(check, styles)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(check, styles))
+        for style_errors in results:
+            errors.extend(style_errors)
+        return errors
+
+    @staticmethod
+    def validate_files(paths: list[str], workers: int | None = None) -> dict[str, list[str]]:
+        """Check many models in parallel
+
+        Args:
+            paths (list[str]): paths to the model.json files
+            workers (int | None, optional): number of threads. Defaults to None, the ThreadPoolExecutor default.
+
+        Returns:
+            dict[str, list[str]]: path -> problems found in the model, empty if the model is valid
+        """
+        def check(path: str) -> list[str]:
+            # A single broken model must not stop the others
+            try:
+                return ModelValidator.get_file_errors(path)
+            except Exception as e:
+                return ["Unable to validate " + path + ": " + type(e).__name__ + ": " + str(e)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(paths, executor.map(check, paths)))
+
+    @staticmethod
+    def validate_root(json: dict, path: str):
+        """Check the root information of the model, without checking the styles.
+        Packed models are checked completely, since it does not require to access the assets
+
+        Args:
+            json (dict): decoded content of the json file
+            path (str): Path to the folder of the model
+        
+        Throws:
+            InvalidModelException if the model is not valid
+        """
+        ModelValidator.__raise_first(ModelValidator.get_root_errors(json, path))
+
+    @staticmethod
+    def get_root_errors(json: dict, path: str) -> list[str]:
+        """Get the problems in the root information of the model, packed models are checked completely
+
+        Args:
+            json (dict): decoded content of the json file
+            path (str): Path to the folder of the model
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        if not isinstance(json, dict):
+            return ["The model is not an object"]
+        errors = []
         if "name" not in json:
-            raise InvalidModelException("The model does not have a name")
+            errors.append("The model does not have a name")
         # Version check is omitted
-        if "styles" not in json or len(json["styles"]) == 0:
-            raise InvalidModelException("No styles in model file")
+        if "styles" not in json:
+            errors.append("No styles in model file")
+            return errors
+        if not isinstance(json["styles"], dict):
+            errors.append("The styles of the model are not an object")
+            return errors
+        if len(json["styles"]) == 0:
+            errors.append("No styles in model file")
+            return errors
+        errors.extend(ModelValidator.__get_structure_errors(json["styles"]))
+        # Threshold overrides are compiled when the model is loaded, so they are checked even in lazy mode
+        errors.extend(get_model_threshold_errors(json))
+
+        if "atlas" in json:
+            errors.extend(ModelValidator.get_atlas_errors(json, path))
+        elif not os.path.isdir(os.path.join(path, ASSETS_DIR_NAME)):
+            errors.append("No assets folder found")
+        return errors
+
+    @staticmethod
+    def __get_structure_errors(styles: dict) -> list[str]:
+        """Get the styles and the images that do not have the right type.
+        Expressions that are not objects and variants that are not lists are reported with the threshold overrides
 
-        if not os.path.isdir(os.path.join(path, ASSETS_DIR_NAME)):
-            raise InvalidModelException("No assets folder found")
+        Args:
+            styles (dict): styles of the model
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        errors = []
+        for style_name, style in styles.items():
+            if not isinstance(style, dict):
+                errors.append("Style " + style_name + " is not an object")
+                continue
+            if "expressions" not in style:
+                continue
+            if not isinstance(style["expressions"], dict):
+                errors.append("The expressions of style " + style_name + " are not an object")
+                continue
+            for expression_name, expression in style["expressions"].items():
+                if not isinstance(expression, dict):
+                    continue
+                for variant_name, variant in get_raw_variants(expression).items():
+                    images = get_raw_images(variant) if isinstance(variant, (list, dict)) else []
+                    if not isinstance(images, list):
+                        errors.append("The images of variant " + "/".join((style_name, expression_name, variant_name)) + " must be a list")
+                        continue
+                    for image in images:
+                        if not isinstance(image, str):
+                            errors.append("Image " + str(image) + " of variant " + "/".join((style_name, expression_name, variant_name)) + " is not a string")
+        return errors
+
+    @staticmethod
+    def validate_style(json: dict, style: str, path: str):
+        """Check a single style of the model
+
+        Args:
+            json (dict): decoded content of the json file
+            style (str): name of the style
+            path (str): Path to the folder of the model
         
-        for style in json["styles"]:
-            ModelValidator.check_styles(json["styles"][style], style, os.path.join(path, ASSETS_DIR_NAME, style))
+        Throws:
+            InvalidModelException if the model is not valid
+        """
+        if style not in json["styles"]:
+            raise InvalidModelException("There is no style " + style)
+        # Packed models are already checked by validate_root
+        if "atlas" in json:
+            return
+        ModelValidator.check_styles(json["styles"][style], style, os.path.join(path, ASSETS_DIR_NAME, style))
+
+    @staticmethod
+    def check_atlas(json: dict, path: str):
+        """Check if a packed model is valid, every image must be in the atlas file
+
+        Args:
+            json (dict): decoded content of the json file
+            path (str): Path to the folder of the model
+        
+        Throws:
+            InvalidModelException if the model is not valid
+        """
+        ModelValidator.__raise_first(ModelValidator.get_atlas_errors(json, path))
+
+    @staticmethod
+    def get_atlas_errors(json: dict, path: str) -> list[str]:
+        """Get the problems of a packed model
+
+        Args:
+            json (dict): decoded content of the json file
+            path (str): Path to the folder of the model
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        atlas = json["atlas"]
+        if "file" not in atlas or "images" not in atlas:
+            return ["The atlas has no file or no images"]
+        atlas_path = os.path.join(path, atlas["file"])
+        if not os.path.isfile(atlas_path):
+            return ["Atlas file " + atlas_path + " not found"]
+        errors = []
+        size = os.path.getsize(atlas_path)
+        for style_name, style in json["styles"].items():
+            # The wrong types are reported by get_root_errors
+            if not isinstance(style, dict):
+                continue
+            if "expressions" not in style or len(style["expressions"]) == 0:
+                errors.append("There is no expression in the style " + style_name)
+                continue
+            if not isinstance(style["expressions"], dict):
+                continue
+            for expression_name, expression in style["expressions"].items():
+                if not isinstance(expression, dict):
+                    continue
+                for variant_name, variant in get_raw_variants(expression).items():
+                    images = get_raw_images(variant) if isinstance(variant, (list, dict)) else None
+                    if not isinstance(images, list):
+                        continue
+                    if len(images) == 0:
+                        errors.append("Variant " + variant_name + " has no images")
+                    for image in images:
+                        if not isinstance(image, str):
+                            continue
+                        key = get_atlas_key(style_name, expression_name, variant_name, image)
+                        if key not in atlas["images"]:
+                            errors.append("Image " + key + " not found in the atlas")
+                            continue
+                        offset, length = atlas["images"][key]
+                        if offset < 0 or length <= 0 or offset + length > size:
+                            errors.append("Image " + key + " is out of the atlas file")
+        return errors
 
     @staticmethod
     def check_styles(style:dict, style_name: str, path: str):
@@ -88,12 +313,40 @@ class ModelValidator:
         Throws:
             InvalidModelException if the model is not valid
         """    
-        if not os.path.isdir(path):
-            raise InvalidModelException("There is no dir for style " + style_name)
+        ModelValidator.__raise_first(ModelValidator.get_style_errors(style, style_name, path))
+
+    @staticmethod
+    def get_style_errors(style: dict, style_name: str, path: str) -> list[str]:
+        """Get the problems of the given style
+
+        Args:
+            style (dict): Decoded content of the json file for the given style
+            style_name (str): Name of the style
+            path (str): Path to the folder of the style
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        # The wrong types are reported by get_root_errors
+        if not isinstance(style, dict) or not isinstance(style.get("expressions", {}), dict):
+            return []
+        directories, _, error = ModelValidator.__list_directory(path)
+        if error is not None:
+            return [error]
+        if directories is None:
+            return ["There is no dir for style " + style_name]
         if "expressions" not in style or len(style["expressions"]) == 0:
-            raise InvalidModelException("There is no expression in the style " + style_name)
+            return ["There is no expression in the style " + style_name]
+        errors = []
         for expression in style["expressions"]:
-            ModelValidator.check_expression(style["expressions"][expression], expression, os.path.join(path, expression))
+            # The wrong types are reported by get_root_errors
+            if not isinstance(style["expressions"][expression], dict):
+                continue
+            if not ModelValidator.__has_entry(directories, path, expression, True):
+                errors.append("There is no expression for expression " + expression)
+                continue
+            errors.extend(ModelValidator.get_expression_errors(style["expressions"][expression], expression, os.path.join(path, expression)))
+        return errors
     
     @staticmethod
     def check_expression(expression: dict, expression_name: str, path: str):
@@ -107,12 +360,36 @@ class ModelValidator:
         Throws:
             InvalidModelException if the model is not valid
         """    
-        if not os.path.isdir(path):
-            raise InvalidModelException("There is no expression for expression " + expression_name)
-        for variant in expression:
-            if not os.path.isdir(os.path.join(path, variant)):
-                raise InvalidModelException("Directory not found for expression " + expression_name)
-            ModelValidator.check_variant(expression[variant], variant, os.path.join(path, variant))
+        ModelValidator.__raise_first(ModelValidator.get_expression_errors(expression, expression_name, path))
+
+    @staticmethod
+    def get_expression_errors(expression: dict, expression_name: str, path: str) -> list[str]:
+        """Get the problems of the given expression
+
+        Args:
+            expression (dict): Decoded content of the json file for the given expression
+            expression_name (str): Name of the expression
+            path (str): Path to the folder of the expression
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        directories, _, error = ModelValidator.__list_directory(path)
+        if error is not None:
+            return [error]
+        if directories is None:
+            return ["There is no expression for expression " + expression_name]
+        errors = []
+        variants = get_raw_variants(expression)
+        for variant in variants:
+            # The wrong types are reported by get_root_errors
+            if not isinstance(variants[variant], (list, dict)) or not isinstance(get_raw_images(variants[variant]), list):
+                continue
+            if not ModelValidator.__has_entry(directories, path, variant, True):
+                errors.append("Directory not found for expression " + expression_name)
+                continue
+            errors.extend(ModelValidator.get_variant_errors(variants[variant], variant, os.path.join(path, variant)))
+        return errors
 
     @staticmethod
     def check_variant(variant, variant_name, path):
@@ -126,11 +403,84 @@ class ModelValidator:
         Throws:
             InvalidModelException if the model is not valid
         """    
+        ModelValidator.__raise_first(ModelValidator.get_variant_errors(variant, variant_name, path))
+
+    @staticmethod
+    def get_variant_errors(variant, variant_name, path) -> list[str]:
+        """Get the problems of the given variant
+
+        Args:
+            variant (dict): Decoded content of the json file for the given variant
+            variant_name (str): Name of the variant
+            path (str): Path to the folder of the variant
+
+        Returns:
+            list[str]: description of every problem found
+        """
+        variant = get_raw_images(variant)
         if len(variant) == 0:
-            raise InvalidModelException("Variant " + variant_name + " has no images")
+            return ["Variant " + variant_name + " has no images"]
+        _, files, error = ModelValidator.__list_directory(path)
+        if error is not None:
+            return [error]
+        if files is None:
+            files = set()
+        errors = []
         for image in variant:
-            if not os.path.isfile(os.path.join(path, image)):
-                raise InvalidModelException("Image " + os.path.join(path, image) + " not found")
+            # The wrong types are reported by get_root_errors
+            if not isinstance(image, str):
+                continue
+            if not ModelValidator.__has_entry(files, path, image, False):
+                errors.append("Image " + os.path.join(path, image) + " not found")
+        return errors
+
+    @staticmethod
+    def __list_directory(path: str) -> tuple[set[str] | None, set[str] | None, str | None]:
+        """List a directory once with scandir
 
+        Args:
+            path (str): path of the directory
 
+        Returns:
+            tuple[set[str] | None, set[str] | None, str | None]: names of the subdirectories and of the files, None if the directory does not exist,
+                and the description of the error if the directory exists but can not be read
+        """
+        directories = set()
+        files = set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        directories.add(entry.name)
+                    elif entry.is_file():
+                        files.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return None, None, None
+        except OSError as e:
+            return None, None, "Unable to read " + path + ": " + str(e)
+        return directories, files, None
 
+    @staticmethod
+    def __has_entry(names: set[str] | None, path: str, name: str, directory: bool) -> bool:
+        """Check if a directory contains a file or a subdirectory. Names that are not in the listing,
+        like paths with subdirectories, are checked on the filesystem
+
+        Args:
+            names (set[str] | None): listing of the directory
+            path (str): path of the directory
+            name (str): name of the entry
+            directory (bool): if the entry must be a directory
+
+        Returns:
+            bool: if the entry exists
+        """
+        if names is not None and name in names:
+            return True
+        entry = os.path.join(path, name)
+        return os.path.isdir(entry) if directory else os.path.isfile(entry)
+
+    @staticmethod
+    def __raise_first(errors: list[str]):
+        """Raise an InvalidModelException for the first error, if any"""
+        if len(errors) > 0:
+            raise InvalidModelException(errors[0])
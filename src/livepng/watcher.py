@@ -0,0 +1,132 @@
+from threading import Event, Thread
+from typing import TYPE_CHECKING
+import json
+import os
+
+from livepng import constants
+from livepng.exceptions import InvalidModelException
+
+if TYPE_CHECKING:
+    from livepng.model import LivePNG
+
+
+class ModelWatcher:
+    """Watch the files of a model and reload it when they change.
+    The files are polled with os.scandir, comparing their modification time and size, only the changed styles are rebuilt"""
+    interval : float
+    last_error : Exception | None
+
+    def __init__(self, model: "LivePNG", interval: float = 1.0) -> None:
+        """Initialize the watcher, the current state of the files is taken as the loaded one
+
+        Args:
+            model (LivePNG): model to reload
+            interval (float, optional): seconds between two checks of the files. Defaults to 1.0.
+        """
+        self.model = model
+        self.interval = interval
+        self.last_error = None
+        self.__snapshot = self.__take_snapshot()
+        self.__pending = set()
+        self.__stop = Event()
+        self.__thread = None
+
+    def start(self):
+        """Start checking the files on a daemon thread"""
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Stop checking the files"""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def check(self) -> list[str]:
+        """Check the files once, reloading the model if they changed.
+        If the new model is not valid, the error is kept in last_error and the reload is tried again at the next change
+
+        Returns:
+            list[str]: names of the rebuilt and removed styles
+        """
+        snapshot = self.__take_snapshot()
+        previous = self.__snapshot
+        if snapshot == previous and len(self.__pending) == 0:
+            return []
+        self.__snapshot = snapshot
+        styles = set(snapshot["styles"]) | set(previous["styles"])
+        self.__pending.update(style for style in styles if snapshot["styles"].get(style) != previous["styles"].get(style))
+        if snapshot["atlas"] != previous["atlas"]:
+            self.__pending.update(self.__get_style_names())
+        if snapshot["model"] == previous["model"] and len(self.__pending) == 0:
+            return []
+        try:
+            reloaded = self.model.reload(self.__pending)
+        except (InvalidModelException, OSError, ValueError, KeyError) as e:
+            # The files may be still being written
+            self.last_error = e
+            return []
+        self.last_error = None
+        self.__pending = set()
+        return reloaded
+
+    def __run(self):
+        """Check the files until the watcher is stopped"""
+        while not self.__stop.wait(self.interval):
+            self.check()
+
+    def __get_style_names(self) -> list[str]:
+        """Get the names of the styles in model.json"""
+        try:
+            with open(self.model.model_file, "r") as f:
+                return list(json.loads(f.read())["styles"])
+        except (OSError, ValueError, KeyError):
+            return list(self.model.styles)
+
+    def __take_snapshot(self) -> dict:
+        """Get the modification time and size of model.json, of the atlas file and of every file of every style"""
+        atlas = self.model.model_info.get("atlas")
+        assets_dir = os.path.join(self.model.path, constants.ASSETS_DIR_NAME)
+        styles = {}
+        for entry in self.__scan(assets_dir):
+            if entry.is_dir():
+                files = {}
+                self.__scan_tree(entry.path, files)
+                styles[entry.name] = files
+        return {
+            "model": self.__stat(self.model.model_file),
+            "atlas": self.__stat(os.path.join(self.model.path, atlas["file"])) if atlas is not None and "file" in atlas else None,
+            "styles": styles
+        }
+
+    def __scan_tree(self, path: str, files: dict[str, tuple[int, int]]):
+        """Add the modification time and size of every file in a directory and its subdirectories"""
+        for entry in self.__scan(path):
+            if entry.is_dir():
+                self.__scan_tree(entry.path, files)
+            elif entry.is_file():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+    def __scan(self, path: str) -> list[os.DirEntry]:
+        """List a directory, empty if it does not exist"""
+        try:
+            with os.scandir(path) as entries:
+                return list(entries)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+    def __stat(self, path: str) -> tuple[int, int] | None:
+        """Get the modification time and size of a file, None if it does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
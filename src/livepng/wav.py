@@ -0,0 +1,145 @@
+import mmap
+import os
+import struct
+import sys
+
+from pydub import AudioSegment
+
+from livepng.stream import samples_from_bytes
+
+"""WAVE format tags of integer PCM data"""
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+"""Array typecodes of the sample widths that can be read without converting the samples"""
+NATIVE_TYPECODES = {2: "h", 4: "i"}
+
+
+def parse_wav_header(data) -> tuple[int, int, int, int, int] | None:
+    """Find the format and the data chunk of a RIFF WAVE file
+
+    Args:
+        data (bytes | mmap.mmap): content of the file
+
+    Returns:
+        tuple[int, int, int, int, int] | None: sample rate, sample width, channels, offset and length of the PCM data.
+            None if the file is not an integer PCM WAV file
+    """
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        size = struct.unpack_from("<I", data, offset + 4)[0]
+        start = offset + 8
+        if chunk_id == b"fmt " and size >= 16:
+            fmt = struct.unpack_from("<HHIIHH", data, start)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE:
+                # The real format is the first field of the sub format GUID
+                if size < 40:
+                    return None
+                fmt = (struct.unpack_from("<H", data, start + 24)[0], ) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            audio_format, channels, sample_rate, _, block_align, bits = fmt
+            sample_width = (bits + 7) // 8
+            if audio_format != WAVE_FORMAT_PCM or channels == 0 or not 1 <= sample_width <= 4 or block_align != sample_width * channels:
+                return None
+            # Streamed files can have an unknown or wrong size, the data goes to the end of the file
+            length = min(size, len(data) - start)
+            return sample_rate, sample_width, channels, start, length - length % block_align
+        # Chunks are aligned to 2 bytes
+        offset = start + size + (size & 1)
+    return None
+
+
+class WavAudio:
+    """PCM WAV file mapped in memory. It has the attributes of pydub AudioSegment used by LivePNG,
+    and the samples are read from the mapped file without copying them.
+    raw_data and the samples are valid only while the file is unchanged: reading them after the file
+    was truncated or overwritten raises SIGBUS, so copy them with bytes() if they outlive the file"""
+    path : str
+    frame_rate : int
+    sample_width : int
+    channels : int
+    raw_data : memoryview
+
+    def __init__(self, path: str, mapped: mmap.mmap, header: tuple[int, int, int, int, int]) -> None:
+        """Initialize the audio, use load_wav to open a file
+
+        Args:
+            path (str): path of the file
+            mapped (mmap.mmap): the file mapped in memory
+            header (tuple[int, int, int, int, int]): result of parse_wav_header
+        """
+        self.path = path
+        self.frame_rate, self.sample_width, self.channels, offset, length = header
+        self.__mapped = mapped
+        self.raw_data = memoryview(mapped)[offset:offset + length]
+
+    @property
+    def frame_count(self) -> int:
+        """Number of samples of every channel"""
+        return len(self.raw_data) // (self.sample_width * self.channels)
+
+    @property
+    def duration_seconds(self) -> float:
+        """Duration of the audio"""
+        return self.frame_count / self.frame_rate if self.frame_rate else 0.0
+
+    def get_array_of_samples(self):
+        """Get the interleaved signed samples, like pydub get_array_of_samples.
+        16 and 32 bit samples are a view of the mapped file, 8 and 24 bit samples are converted
+
+        Returns:
+            memoryview | array: the samples
+        """
+        typecode = NATIVE_TYPECODES.get(self.sample_width)
+        if typecode is None or sys.byteorder == "big":
+            return samples_from_bytes(bytes(self.raw_data), self.sample_width)
+        return self.raw_data.cast(typecode)
+
+    def close(self):
+        """Unmap the file, the samples returned by get_array_of_samples must not be used anymore
+
+        Raises:
+            BufferError: if the samples are still referenced
+        """
+        self.raw_data.release()
+        self.__mapped.close()
+
+
+def load_wav(path: str) -> WavAudio | None:
+    """Map a PCM WAV file in memory
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        WavAudio | None: the audio, None if the file is not an integer PCM WAV file
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = parse_wav_header(mapped)
+    if header is None:
+        mapped.close()
+        return None
+    return WavAudio(path, mapped, header)
+
+
+def load_audio(path: str) -> WavAudio | AudioSegment:
+    """Open an audio file. PCM WAV files are mapped in memory, the other formats are decoded by pydub
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        WavAudio | AudioSegment: the audio
+    """
+    audio = load_wav(path)
+    if audio is not None:
+        return audio
+    return AudioSegment.from_file(path)
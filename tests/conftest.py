@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The package is in src, which is the build root
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+
+@pytest.fixture
+def examples_dir() -> str:
+    """Directory of the example models and audio files"""
+    return os.path.join(ROOT_DIR, "examples")
@@ -0,0 +1,71 @@
+from array import array
+import random
+
+import pytest
+
+from livepng import amplitude
+
+
+def random_samples(count: int, seed: int = 0) -> array:
+    rng = random.Random(seed)
+    samples = array("h", (rng.randint(-32768, 32767) for _ in range(count)))
+    # Include the extremes, abs(-32768) does not fit in 16 bit
+    samples[0] = -32768
+    samples[1] = 32767
+    return samples
+
+
+@pytest.mark.skipif(not amplitude.has_numpy(), reason="NumPy is not installed")
+@pytest.mark.parametrize("method", amplitude.METHODS)
+def test_numpy_engine_matches_python(method):
+    # 10 full windows of 4800 samples and a shorter last window
+    samples = random_samples(4800 * 10 + 123)
+    python = amplitude.calculate_amplitudes(48000, samples, frame_rate=10, method=method, use_numpy=False)
+    numpy = amplitude.calculate_amplitudes(48000, samples, frame_rate=10, method=method, use_numpy=True)
+    assert len(python) == 11
+    assert numpy == python
+
+
+@pytest.mark.skipif(not amplitude.has_numpy(), reason="NumPy is not installed")
+def test_numpy_engine_blocks(monkeypatch):
+    samples = random_samples(4800 * 7 + 5)
+    expected = amplitude.calculate_amplitudes(48000, samples, use_numpy=True)
+    # Convert the samples a few windows at a time
+    monkeypatch.setattr(amplitude, "AMPLITUDE_BLOCK_SAMPLES", 10000)
+    assert amplitude.calculate_amplitudes(48000, samples, use_numpy=True) == expected
+
+
+def test_window_amplitude():
+    assert amplitude.window_amplitude([-16384, 16384], "mean") == 0.5
+    assert amplitude.window_amplitude([0, -32768], "peak") == 1.0
+    assert amplitude.window_amplitude([16384, -16384], "rms") == 0.5
+
+
+def test_short_audio():
+    assert amplitude.calculate_amplitudes(48000, array("h"), use_numpy=False) == []
+    assert amplitude.calculate_amplitudes(48000, array("h", [16384]), use_numpy=False) == [0.5]
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        amplitude.calculate_amplitudes(48000, array("h", [0]), method="median")
+
+
+@pytest.mark.skipif(not amplitude.has_numpy(), reason="NumPy is not installed")
+@pytest.mark.parametrize("method", amplitude.METHODS)
+def test_channels_and_normalization(method, monkeypatch):
+    # Stereo with an incomplete last frame
+    samples = random_samples(2 * (4800 * 3 + 17) + 1, seed=2)
+    python = amplitude.calculate_amplitudes(48000, samples, method=method, use_numpy=False, channels=2)
+    numpy = amplitude.calculate_amplitudes(48000, samples, method=method, use_numpy=True, channels=2)
+    assert len(python) == 4
+    assert numpy == python
+    monkeypatch.setattr(amplitude, "AMPLITUDE_BLOCK_SAMPLES", 10000)
+    assert amplitude.calculate_amplitudes(48000, samples, method=method, use_numpy=True, channels=2) == python
+    # Identical channels give the amplitude of one of them
+    mono = array("h", [16384, -8192, 0, 32767])
+    stereo = array("h", [sample for sample in mono for _ in range(2)])
+    expected = amplitude.calculate_amplitudes(4, mono, frame_rate=1, method=method, use_numpy=False)
+    assert amplitude.calculate_amplitudes(4, stereo, frame_rate=1, method=method, use_numpy=False, channels=2) == expected
+    wide = array("i", [sample << 16 for sample in mono])
+    assert amplitude.calculate_amplitudes(4, wide, frame_rate=1, method=method, use_numpy=True, normalization=1 << 31) == expected
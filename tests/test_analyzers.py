@@ -0,0 +1,30 @@
+from array import array
+import random
+
+import pytest
+
+from livepng import amplitude
+from livepng.analyzers import MeanAbsAnalyzer, PeakAnalyzer, RMSAnalyzer
+
+
+def random_samples(count: int, typecode: str = "h", seed: int = 0) -> array:
+    rng = random.Random(seed)
+    bits = array(typecode).itemsize * 8
+    return array(typecode, (rng.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1) for _ in range(count)))
+
+
+@pytest.mark.parametrize("analyzer_class", [MeanAbsAnalyzer, RMSAnalyzer, PeakAnalyzer])
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_window_analyzers_use_the_amplitude_engine(analyzer_class, use_numpy):
+    if use_numpy and not amplitude.has_numpy():
+        pytest.skip("NumPy is not installed")
+    analyzer = analyzer_class(use_numpy=use_numpy)
+    samples = random_samples(4410 * 5 + 7)
+    assert analyzer.process(samples, 44100) == amplitude.calculate_amplitudes(44100, samples, method=analyzer.method, use_numpy=use_numpy)
+    # 32 bit stereo samples are normalized by their width and downmixed
+    wide = random_samples(2 * 4410 * 3, "i", seed=1)
+    values = analyzer.process(wide, 44100, sample_width=4, channels=2)
+    assert len(values) == 3
+    assert all(0 <= value <= 1 for value in values)
+    python = analyzer_class(use_numpy=False).process(wide, 44100, sample_width=4, channels=2)
+    assert values == pytest.approx(python)
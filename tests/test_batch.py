@@ -0,0 +1,75 @@
+import os
+import random
+import shutil
+
+import pytest
+
+from livepng.batch import TimelineFile, analyze_audio, get_timeline_paths, render_timelines
+from livepng.objects import Variant
+
+
+def test_timeline_file_keeps_full_precision(tmp_path):
+    rng = random.Random(1)
+    amplitudes = [rng.random() / 10 for _ in range(200)]
+    variant = Variant("0", ["0.png", "1.png", "2.png"])
+    timeline = TimelineFile(10, amplitudes, variant.get_image_indexes(amplitudes, compact=True), {"images": ["0.png", "1.png", "2.png"]})
+    path = str(tmp_path / "speech.lptl")
+    timeline.save(path)
+    loaded = TimelineFile.load(path)
+    assert list(loaded.amplitudes) == amplitudes
+    assert list(loaded.indexes) == list(timeline.indexes)
+    # Another variant gets the indexes calculated from the exact amplitudes
+    other = Variant("1", ["a.png", "b.png"], thresholds={"closed": 0.02, "open": 0.07})
+    assert list(loaded.get_indexes(other)) == other.get_image_indexes(amplitudes)
+
+
+def test_timeline_file_with_many_images(tmp_path):
+    variant = Variant("0", ["{}.png".format(i) for i in range(300)])
+    amplitudes = [i / 300 for i in range(300)]
+    indexes = variant.get_image_indexes(amplitudes, compact=True)
+    assert max(indexes) > 255
+    path = str(tmp_path / "speech.lptl")
+    TimelineFile(10, amplitudes, indexes).save(path)
+    loaded = TimelineFile.load(path)
+    assert loaded.indexes.typecode == indexes.typecode
+    assert list(loaded.indexes) == list(indexes)
+    assert list(TimelineFile(10, [0.0, 0.0], [0, 300]).indexes) == [0, 300]
+
+
+def test_render_timelines(tmp_path, examples_dir):
+    model_file = os.path.join(examples_dir, "models", "basic", "model.json")
+    audio_files = [os.path.join(examples_dir, "audio", name) for name in ("kuri.wav", "kuri2.wav")]
+    report = render_timelines(model_file, audio_files, str(tmp_path), workers=2)
+    assert report.errors == {}
+    for audio_file in audio_files:
+        loaded = TimelineFile.load(report.outputs[audio_file])
+        expected = analyze_audio(audio_file, Variant("0", ["0.png", "1.png", "2.png"], "assets/default/idle/0"))
+        assert list(loaded.amplitudes) == list(expected.amplitudes)
+        assert list(loaded.indexes) == list(expected.indexes)
+
+
+def test_render_timelines_keeps_the_subdirectories(tmp_path, examples_dir):
+    model_file = os.path.join(examples_dir, "models", "basic", "model.json")
+    lines = tmp_path / "lines"
+    for directory in ("a", "b"):
+        (lines / directory).mkdir(parents=True)
+        shutil.copy(os.path.join(examples_dir, "audio", "kuri2.wav" if directory == "a" else "kuri.wav"), lines / directory / "line.wav")
+    audio_files = [str(lines / "a" / "line.wav"), str(lines / "b" / "line.wav")]
+    output_dir = tmp_path / "timelines"
+    report = render_timelines(model_file, audio_files, str(output_dir), workers=2)
+    assert report.errors == {}
+    assert report.outputs == {audio_files[0]: str(output_dir / "a" / "line.timeline"), audio_files[1]: str(output_dir / "b" / "line.timeline")}
+    assert len(TimelineFile.load(report.outputs[audio_files[0]]).amplitudes) != len(TimelineFile.load(report.outputs[audio_files[1]]).amplitudes)
+    # Files in a single directory are written directly in the output directory
+    assert get_timeline_paths(audio_files[:1], str(output_dir)) == {audio_files[0]: str(output_dir / "line.timeline")}
+
+
+def test_render_timelines_rejects_duplicate_outputs(tmp_path, examples_dir):
+    model_file = os.path.join(examples_dir, "models", "basic", "model.json")
+    shutil.copy(os.path.join(examples_dir, "audio", "kuri2.wav"), tmp_path / "line.wav")
+    shutil.copy(os.path.join(examples_dir, "audio", "kuri2.wav"), tmp_path / "line.mp3")
+    with pytest.raises(ValueError, match="same timeline file"):
+        render_timelines(model_file, [str(tmp_path / "line.wav"), str(tmp_path / "line.mp3")], workers=1)
+    assert not (tmp_path / "line.timeline").exists()
+    # The same file given twice is analyzed once
+    assert list(get_timeline_paths([str(tmp_path / "line.wav")] * 2).values()) == [str(tmp_path / "line.timeline")]
@@ -0,0 +1,66 @@
+import os
+import struct
+
+from livepng.cache import CACHE_FILE_VERSION, AmplitudeCache
+
+
+def counting_hash(monkeypatch) -> list[str]:
+    hashed = []
+    hash_file = AmplitudeCache.hash_file
+    def count(path: str) -> str:
+        hashed.append(path)
+        return hash_file(path)
+    monkeypatch.setattr(AmplitudeCache, "hash_file", staticmethod(count))
+    return hashed
+
+
+def test_unchanged_files_are_hashed_once(tmp_path, monkeypatch):
+    hashed = counting_hash(monkeypatch)
+    audio = tmp_path / "line.wav"
+    audio.write_bytes(b"first")
+    cache = AmplitudeCache()
+    calculated = []
+    def calculate() -> list[float]:
+        calculated.append(audio.read_bytes())
+        return [len(calculated) / 10]
+    assert cache.get_amplitudes(str(audio), 10, "mean", calculate) == [0.1]
+    assert cache.get_amplitudes(str(audio), 10, "mean", calculate) == [0.1]
+    assert cache.get_amplitudes(str(audio), 20, "mean", calculate) == [0.2]
+    assert len(hashed) == 1
+    # A new version of the file is hashed again, even with the same size
+    audio.write_bytes(b"other")
+    os.utime(audio, ns=(1, 1))
+    assert cache.get_amplitudes(str(audio), 10, "mean", calculate) == [0.3]
+    assert len(hashed) == 2
+    assert calculated == [b"first", b"first", b"other"]
+    cache.clear()
+    cache.get_amplitudes(str(audio), 10, "mean", calculate)
+    assert len(hashed) == 3
+
+
+def test_disk_entries_are_little_endian(tmp_path):
+    audio = tmp_path / "line.wav"
+    audio.write_bytes(b"audio")
+    directory = tmp_path / "cache"
+    amplitudes = [0.0, 0.125, 1 / 3]
+    AmplitudeCache(directory=str(directory)).get_amplitudes(str(audio), 10, "mean", lambda: amplitudes)
+    files = os.listdir(directory)
+    assert len(files) == 1 and files[0].endswith(".v{}.amp".format(CACHE_FILE_VERSION))
+    assert (directory / files[0]).read_bytes() == struct.pack("<3d", *amplitudes)
+    # Another cache reads the file
+    assert AmplitudeCache(directory=str(directory)).get_amplitudes(str(audio), 10, "mean", lambda: [1.0]) == amplitudes
+
+
+def test_broken_and_old_disk_entries_are_ignored(tmp_path):
+    audio = tmp_path / "line.wav"
+    audio.write_bytes(b"audio")
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    cache = AmplitudeCache(directory=str(directory))
+    content_hash = cache.get_content_hash(str(audio))
+    # Files of the first version could have been written with another byte order
+    (directory / "{}_10_mean.amp".format(content_hash)).write_bytes(struct.pack(">d", 0.5))
+    (directory / "{}_20_mean.v{}.amp".format(content_hash, CACHE_FILE_VERSION)).write_bytes(b"\0" * 12)
+    assert cache.get_amplitudes(str(audio), 10, "mean", lambda: [0.25]) == [0.25]
+    assert cache.get_amplitudes(str(audio), 20, "mean", lambda: [0.75]) == [0.75]
+    assert AmplitudeCache(directory=str(directory)).get_amplitudes(str(audio), 20, "mean", lambda: [1.0]) == [0.75]
@@ -0,0 +1,54 @@
+from array import array
+import math
+import os
+
+import pytest
+
+from livepng import LivePNG
+from livepng.analyzers import EnvelopeAnalyzer
+from livepng.calibration import Calibration, CalibratedAnalyzer, CalibrationCache
+
+
+def tone(amplitude: int, count: int) -> array:
+    return array("h", (int(amplitude * math.sin(i / 3)) for i in range(count)))
+
+
+def test_streamed_audio_is_calibrated():
+    cache = CalibrationCache()
+    analyzer = CalibratedAnalyzer(voice="quiet", min_frames=5, cache=cache)
+    streamed = analyzer.start(streaming=True)
+    values = []
+    for i in range(20):
+        # One window of 100 samples at a time, with a growing volume
+        values.extend(streamed.process(tone(500 + 100 * i, 100), 1000, frame_rate=10))
+    assert streamed.calibration is not None
+    assert cache.get("quiet") is streamed.calibration
+    # The first frames are not calibrated, the next ones are
+    assert values[0] == pytest.approx(streamed.source.start().process(tone(500, 100), 1000, frame_rate=10)[0])
+    assert values[-1] > 0.03
+
+
+def test_calibration_without_window_uses_every_call():
+    analyzer = CalibratedAnalyzer(min_frames=5, cache=CalibrationCache()).start()
+    analyzer.process(tone(1000, 100), 1000, frame_rate=10)
+    assert analyzer.calibration is None
+    analyzer.process(tone(1000, 1000), 1000, frame_rate=10)
+    assert analyzer.calibration is not None
+
+
+@pytest.mark.parametrize("wrapped", [False, True])
+def test_cache_hits_update_the_voice(examples_dir, wrapped):
+    model = LivePNG(os.path.join(examples_dir, "models", "basic", "model.json"), shared=False)
+    model.enable_amplitude_cache()
+    cache = CalibrationCache()
+    analyzer = CalibratedAnalyzer(voice="kurisu", cache=cache)
+    if wrapped:
+        analyzer = EnvelopeAnalyzer(analyzer)
+    wavfile = os.path.join(examples_dir, "audio", "kuri.wav")
+    first = model.get_amplitudes_from_audio(wavfile, analyzer=analyzer)
+    calibration = cache.get("kurisu")
+    assert calibration is not None
+    cache.put("kurisu", Calibration(0.5, 0.9))
+    # The second call reads the cached amplitudes and calibrates the voice again
+    assert model.get_amplitudes_from_audio(wavfile, analyzer=analyzer) == first
+    assert repr(cache.get("kurisu")) == repr(calibration)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from livepng import LivePNG
+from livepng.definition import ModelDefinition
+from livepng.validator import ModelValidator
+
+
+@pytest.fixture
+def model_files(tmp_path, examples_dir) -> list[str]:
+    paths = []
+    for name in ("first", "second"):
+        shutil.copytree(os.path.join(examples_dir, "models", "basic"), tmp_path / name)
+        paths.append(str(tmp_path / name / "model.json"))
+    ModelDefinition.clear_registry()
+    return paths
+
+
+def test_definitions_are_shared(model_files):
+    first = ModelDefinition.load(model_files[0])
+    assert ModelDefinition.load(model_files[0]) is first
+    assert ModelDefinition.load(model_files[1]) is not first
+
+
+def test_loading_a_model_does_not_block_other_models(model_files, monkeypatch):
+    validate_json = ModelValidator.validate_json
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_validate(json, path):
+        if path == os.path.dirname(model_files[0]):
+            started.set()
+            assert release.wait(10)
+        validate_json(json, path)
+
+    monkeypatch.setattr(ModelValidator, "validate_json", staticmethod(blocking_validate))
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(ModelDefinition.load(model_files[0]))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(10)
+    # The registry lock is free while the first model is parsed
+    assert ModelDefinition.load(model_files[1]).path == os.path.dirname(model_files[1])
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    assert len(loaded) == 2 and loaded[0] is loaded[1]
+
+
+def test_model_info_is_a_copy(model_files):
+    model = LivePNG(model_files[0])
+    info = model.get_model_info()
+    info["styles"]["default"]["expressions"].clear()
+    assert "idle" in model.get_model_info()["styles"]["default"]["expressions"]
+    assert "idle" in LivePNG(model_files[0]).get_model_info()["styles"]["default"]["expressions"]
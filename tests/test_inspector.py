@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from livepng.atlas import pack_model
+from livepng.constants import ASSETS_DIR_NAME, MODEL_FILE_NAME
+from livepng.inspector import ModelInspector
+from livepng.thresholds import THRESHOLDS_KEY
+
+
+@pytest.fixture
+def model_dir(tmp_path, examples_dir) -> str:
+    path = tmp_path / "basic"
+    shutil.copytree(os.path.join(examples_dir, "models", "basic"), path)
+    return str(path)
+
+
+def read_model(model_dir: str) -> dict:
+    with open(os.path.join(model_dir, MODEL_FILE_NAME)) as f:
+        return json.load(f)
+
+
+def write_model(model_dir: str, model: dict):
+    with open(os.path.join(model_dir, MODEL_FILE_NAME), "w") as f:
+        f.write(json.dumps(model, indent=2))
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_unchanged_model_is_not_reported(model_dir, incremental):
+    assert not ModelInspector("basic").analyze_directory(model_dir, incremental)
+
+
+def test_new_image_is_reported(model_dir):
+    variant = os.path.join(model_dir, ASSETS_DIR_NAME, "default", "idle", "0")
+    shutil.copy(os.path.join(variant, "0.png"), os.path.join(variant, "3.png"))
+    inspector = ModelInspector("basic")
+    assert inspector.analyze_directory(model_dir)
+    assert sorted(inspector.get_model_data()["styles"]["default"]["expressions"]["idle"]["0"]) == ["0.png", "1.png", "2.png", "3.png"]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_packed_model_with_assets_keeps_atlas_and_thresholds(model_dir, incremental):
+    model = read_model(model_dir)
+    model[THRESHOLDS_KEY] = {"closed": 0.2, "open": 0.6}
+    write_model(model_dir, model)
+    packed = pack_model(os.path.join(model_dir, MODEL_FILE_NAME))
+    inspector = ModelInspector("basic")
+    assert not inspector.analyze_directory(model_dir, incremental)
+    assert inspector.get_model_data() == packed
+    variant = os.path.join(model_dir, ASSETS_DIR_NAME, "default", "idle", "0")
+    os.remove(os.path.join(variant, "2.png"))
+    assert inspector.analyze_directory(model_dir, incremental)
+    data = inspector.get_model_data()
+    assert data["atlas"] == packed["atlas"]
+    assert data[THRESHOLDS_KEY] == packed[THRESHOLDS_KEY]
+
+
+def test_packed_model_without_assets_is_not_reported(model_dir):
+    packed = pack_model(os.path.join(model_dir, MODEL_FILE_NAME))
+    shutil.rmtree(os.path.join(model_dir, ASSETS_DIR_NAME))
+    inspector = ModelInspector("basic")
+    assert not inspector.analyze_directory(model_dir)
+    assert inspector.get_model_data() == packed
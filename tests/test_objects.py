@@ -0,0 +1,59 @@
+import pytest
+
+from livepng import objects
+from livepng.objects import Variant
+
+
+def expected_indexes(variant: Variant, amplitudes: list[float]) -> list[int]:
+    return [variant.get_image_index(amplitude) for amplitude in amplitudes]
+
+
+AMPLITUDES = [0.0, 0.001, 0.004, 0.01, 0.02, 0.03, 0.5, 0.9]
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_compact_indexes(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(objects, "numpy", None)
+    elif objects.numpy is None:
+        pytest.skip("NumPy is not installed")
+    variant = Variant("0", ["0.png", "1.png", "2.png"])
+    indexes = variant.get_image_indexes(AMPLITUDES, compact=True)
+    assert indexes.typecode == "B"
+    assert list(indexes) == expected_indexes(variant, AMPLITUDES)
+    assert variant.get_image_indexes(AMPLITUDES) == expected_indexes(variant, AMPLITUDES)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_compact_indexes_of_large_variants(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(objects, "numpy", None)
+    elif objects.numpy is None:
+        pytest.skip("NumPy is not installed")
+    variant = Variant("0", ["{}.png".format(i) for i in range(300)])
+    indexes = variant.get_image_indexes(AMPLITUDES, compact=True)
+    assert indexes.typecode == "H"
+    assert list(indexes) == expected_indexes(variant, AMPLITUDES)
+    # The last image is not truncated to one byte
+    assert indexes[-1] == 299
+    if use_numpy:
+        assert variant.get_image_indexes(AMPLITUDES, as_numpy=True).tolist() == expected_indexes(variant, AMPLITUDES)
+
+
+def test_index_typecode():
+    assert objects.get_index_typecode(1) == "B"
+    assert objects.get_index_typecode(256) == "B"
+    assert objects.get_index_typecode(257) == "H"
+    assert objects.get_index_typecode(70000) == "I"
+
+
+def test_compiled_tables_are_bounded(monkeypatch):
+    monkeypatch.setattr(objects, "MAX_COMPILED_TABLES", 4)
+    monkeypatch.setattr(objects, "COMPILED_TABLES", objects.COMPILED_TABLES.__class__())
+    variants = [Variant("0", ["0.png", "1.png"], thresholds={"closed": i / 100, "open": 0.5}) for i in range(10)]
+    assert len(objects.COMPILED_TABLES) == 4
+    # Evicted tables are still used by their variants
+    assert variants[0].get_image_index(0.9) == 1
+    assert variants[9].get_image_index(0.0) == 0
+    shared = Variant("1", ["a.png", "b.png"], thresholds={"closed": 0.09, "open": 0.5})
+    assert shared.get_boundaries() is variants[9].get_boundaries()
@@ -0,0 +1,37 @@
+import os
+import shutil
+
+import pytest
+
+from livepng import LivePNG
+from livepng.atlas import pack_model
+from livepng.constants import ASSETS_DIR_NAME, FilepathOutput
+from livepng.exceptions import NotFoundException
+
+
+@pytest.fixture
+def packed_model(tmp_path, examples_dir) -> str:
+    model_dir = tmp_path / "basic"
+    shutil.copytree(os.path.join(examples_dir, "models", "basic"), model_dir)
+    pack_model(str(model_dir / "model.json"))
+    return str(model_dir / "model.json")
+
+
+def test_packed_model_with_assets_has_paths(packed_model):
+    model = LivePNG(packed_model, shared=False)
+    assert model.output_type == FilepathOutput.LOCAL_PATH
+    assert os.path.isfile(model.get_current_image())
+
+
+def test_packed_model_without_assets_outputs_image_data(packed_model):
+    model_dir = os.path.dirname(packed_model)
+    with open(LivePNG(packed_model, shared=False).get_current_image(), "rb") as f:
+        expected = f.read()
+    shutil.rmtree(os.path.join(model_dir, ASSETS_DIR_NAME))
+    model = LivePNG(packed_model, shared=False)
+    assert model.output_type == FilepathOutput.IMAGE_DATA
+    assert bytes(model.get_current_image()) == expected
+    with pytest.raises(NotFoundException):
+        model.get_current_image(FilepathOutput.LOCAL_PATH)
+    with pytest.raises(NotFoundException):
+        LivePNG(packed_model, output_type=FilepathOutput.FULL_PATH, shared=False)
@@ -0,0 +1,165 @@
+import os
+import random
+import stat
+import struct
+import sys
+import zlib
+
+import pytest
+
+from livepng import LivePNG, render
+from livepng.exceptions import WrongFormatException
+from livepng.render import FrameRenderer, decode_png, encode_png
+
+
+def paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def filter_row(filter_type: int, row: bytes, prev: bytes, bpp: int) -> bytes:
+    """Apply a PNG filter to a row, the reference for the decoder"""
+    out = bytearray()
+    for i, value in enumerate(row):
+        a = row[i - bpp] if i >= bpp else 0
+        b = prev[i]
+        c = prev[i - bpp] if i >= bpp else 0
+        predictor = [0, a, b, (a + b) // 2, paeth(a, b, c)][filter_type]
+        out.append((value - predictor) & 0xFF)
+    return bytes([filter_type]) + bytes(out)
+
+
+def make_png(width: int, height: int, color_type: int, depth: int, rows: list[bytes], filters: list[int] | None = None,
+             palette: bytes | None = None, transparency: bytes | None = None, interlace: int = 0, raw: bytes | None = None) -> bytes:
+    """Build a PNG file from unfiltered rows, or from the given image data"""
+    channels = render.PNG_CHANNELS[color_type]
+    bpp = max(1, channels * depth // 8)
+    prev = bytes(len(rows[0]))
+    if raw is None:
+        raw = b""
+        for y, row in enumerate(rows):
+            raw += filter_row(filters[y % len(filters)] if filters else 0, row, prev, bpp)
+            prev = row
+
+    def chunk(kind: bytes, content: bytes) -> bytes:
+        return struct.pack(">I", len(content)) + kind + content + struct.pack(">I", zlib.crc32(kind + content))
+    data = render.PNG_SIGNATURE + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, depth, color_type, 0, 0, interlace))
+    if palette is not None:
+        data += chunk(b"PLTE", palette)
+    if transparency is not None:
+        data += chunk(b"tRNS", transparency)
+    # Split the image data in two chunks
+    compressed = zlib.compress(raw)
+    half = len(compressed) // 2
+    return data + chunk(b"IDAT", compressed[:half]) + chunk(b"IDAT", compressed[half:]) + chunk(b"IEND", b"")
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def engine(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(render, "np", None)
+    elif render.np is None:
+        pytest.skip("NumPy is not installed")
+
+
+def random_bytes(rng: random.Random, size: int) -> bytes:
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+def test_rgba_with_every_filter(engine):
+    rng = random.Random(3)
+    width, height = 7, 10
+    rows = [random_bytes(rng, width * 4) for _ in range(height)]
+    data = make_png(width, height, 6, 8, rows, filters=[0, 1, 2, 3, 4])
+    assert decode_png(data) == (width, height, b"".join(rows))
+
+
+def test_encode_decode_round_trip(engine):
+    rgba = random_bytes(random.Random(4), 5 * 3 * 4)
+    assert decode_png(encode_png(5, 3, rgba)) == (5, 3, rgba)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 4, 8])
+def test_grayscale_is_scaled(engine, depth):
+    width = 9
+    values = [i % (1 << depth) for i in range(width)]
+    bits = "".join(format(value, "0{}b".format(depth)) for value in values)
+    bits += "0" * (-len(bits) % 8)
+    row = bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+    _, _, rgba = decode_png(make_png(width, 2, 0, depth, [row, row], filters=[1, 4]))
+    scale = 255 // ((1 << depth) - 1)
+    assert rgba == bytes(channel for value in values for channel in (value * scale, ) * 3 + (255, )) * 2
+
+
+def test_palette_with_transparency(engine):
+    palette = bytes([255, 0, 0, 0, 255, 0, 0, 0, 255, 9, 9, 9])
+    # 2 bit indexes 0, 1, 2, 3, 3
+    row = bytes([0b00011011, 0b11000000])
+    _, _, rgba = decode_png(make_png(5, 1, 3, 2, [row], palette=palette, transparency=bytes([0, 128])))
+    assert rgba == bytes([255, 0, 0, 0, 0, 255, 0, 128, 0, 0, 255, 255, 9, 9, 9, 255, 9, 9, 9, 255])
+
+
+def test_gray_alpha_and_rgb_key(engine):
+    _, _, rgba = decode_png(make_png(2, 1, 4, 8, [bytes([10, 20, 30, 40])], filters=[1]))
+    assert rgba == bytes([10, 10, 10, 20, 30, 30, 30, 40])
+    key = struct.pack(">HHH", 1, 2, 3)
+    _, _, rgba = decode_png(make_png(2, 1, 2, 8, [bytes([1, 2, 3, 4, 5, 6])], transparency=key))
+    assert rgba == bytes([1, 2, 3, 0, 4, 5, 6, 255])
+
+
+def test_sixteen_bit_keeps_the_high_byte(engine):
+    row = struct.pack(">8H", 0x1234, 0xABCD, 0x00FF, 0xFF00, 1, 2, 3, 4)
+    _, _, rgba = decode_png(make_png(2, 2, 6, 16, [row, row], filters=[3, 2]))
+    assert rgba == bytes([0x12, 0xAB, 0x00, 0xFF, 0, 0, 0, 0]) * 2
+
+
+def test_invalid_images():
+    rows = [bytes(4)]
+    with pytest.raises(WrongFormatException):
+        decode_png(b"GIF89a" + bytes(20))
+    with pytest.raises(WrongFormatException):
+        decode_png(make_png(1, 1, 6, 8, rows, interlace=1))
+    with pytest.raises(WrongFormatException):
+        decode_png(make_png(1, 1, 3, 8, [bytes(1)]))
+    with pytest.raises(WrongFormatException):
+        decode_png(make_png(1, 2, 6, 8, rows))
+    with pytest.raises(WrongFormatException):
+        decode_png(make_png(1, 1, 6, 8, rows, raw=b"\x05" + bytes(4)))
+
+
+def test_example_image(examples_dir):
+    with open(os.path.join(examples_dir, "models", "basic", "assets", "default", "idle", "0", "0.png"), "rb") as f:
+        width, height, rgba = decode_png(f.read())
+    assert (width, height) == (500, 500)
+    assert len(rgba) == width * height * 4
+
+
+def write_fake_ffmpeg(path, exit_code: int) -> str:
+    """Script that writes a lot to stderr before reading the frames, like a verbose ffmpeg"""
+    with open(path, "w") as f:
+        f.write("#!{}\n".format(sys.executable))
+        f.write("import sys\n")
+        f.write("sys.stderr.write('x' * (1 << 20) + 'done')\n")
+        f.write("sys.stderr.flush()\n")
+        f.write("sys.stdin.buffer.read()\n")
+        f.write("sys.exit({})\n".format(exit_code))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.mark.parametrize("exit_code", [0, 1])
+def test_render_video_reads_stderr(tmp_path, examples_dir, exit_code):
+    model = LivePNG(os.path.join(examples_dir, "models", "basic", "model.json"), shared=False)
+    # Every frame is larger than the pipe buffer
+    renderer = FrameRenderer(model, size=(200, 200), workers=1)
+    ffmpeg = write_fake_ffmpeg(tmp_path / "ffmpeg", exit_code)
+    wavfile = os.path.join(examples_dir, "audio", "kuri2.wav")
+    if exit_code == 0:
+        report = renderer.render_video(wavfile, str(tmp_path / "out.mp4"), frame_rate=10, ffmpeg=ffmpeg)
+        assert report.frames > 0
+    else:
+        with pytest.raises(RuntimeError, match="done$"):
+            renderer.render_video(wavfile, str(tmp_path / "out.mp4"), frame_rate=10, ffmpeg=ffmpeg)
@@ -0,0 +1,96 @@
+import pytest
+
+from livepng.scheduler import FrameScheduler, SharedScheduler
+
+
+class FakeClock:
+    """Clock that only advances when sleep is called"""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        # Always advance, tiny sleeps could be lost in the rounding of the time
+        self.now += max(seconds, 0.001)
+
+
+def test_frames_follow_the_start_time():
+    clock = FakeClock(100.0)
+    scheduler = FrameScheduler(10, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    assert scheduler.wait(0)
+    assert scheduler.wait(3)
+    assert abs(clock.now - 100.3) < 0.002
+    assert scheduler.stats.shown == 2
+
+
+def test_audio_clock_origin():
+    # The audio has already played for 0.25s when the scheduler starts
+    clock = FakeClock(0.25)
+    scheduler = FrameScheduler(10, clock=clock, sleep=clock.sleep, origin=0.0)
+    scheduler.start()
+    assert scheduler.elapsed() == 0.25
+    # The frames of the audio already played are dropped, instead of delaying the whole speech
+    assert not scheduler.wait(0)
+    assert not scheduler.wait(1)
+    assert scheduler.wait(2)
+    assert scheduler.wait(3)
+    assert abs(clock.now - 0.3) < 0.002
+    assert scheduler.stats.dropped == 2
+
+
+def test_shared_scheduler_keeps_frame_errors():
+    scheduler = SharedScheduler(workers=2)
+    shown = []
+
+    def on_frame(frame: int):
+        shown.append(frame)
+        raise ValueError("bad frame")
+
+    finished = []
+    timeline = scheduler.add([0, 1, 2, 3], 100, on_frame, finished.append)
+    with pytest.raises(ValueError, match="bad frame"):
+        timeline.wait(5)
+    # The timeline is cancelled after the first error
+    assert shown == [0]
+    assert finished == [False]
+    scheduler.shutdown()
+
+
+def test_shared_scheduler_keeps_finish_errors():
+    scheduler = SharedScheduler(workers=1)
+
+    def on_finish(completed: bool):
+        raise RuntimeError("bad finish")
+
+    timeline = scheduler.add([0, 1], 100, lambda frame: None, on_finish)
+    with pytest.raises(RuntimeError, match="bad finish"):
+        timeline.wait(5)
+    assert timeline.is_finished()
+    scheduler.shutdown()
+
+
+def test_shared_scheduler_keeps_the_stats_of_every_owner():
+    scheduler = SharedScheduler(workers=2)
+    first = scheduler.add([0] * 5, 100, lambda frame: None, name="a")
+    first.wait(5)
+    # The stats of a finished speech are kept, and the next speeches of the same owner are added
+    assert scheduler.get_stats()["a"].shown + scheduler.get_stats()["a"].dropped == 5
+    timelines = [scheduler.add([0] * 3, 100, lambda frame: None, name=name) for name in ("a", "b")]
+    for timeline in timelines:
+        timeline.wait(5)
+    stats = scheduler.get_stats()
+    assert stats["a"].shown + stats["a"].dropped == 8
+    assert stats["b"].shown + stats["b"].dropped == 3
+    assert timelines[0].stats.shown + timelines[0].stats.dropped == 3
+    # The returned stats are copies
+    stats["a"].shown = 100
+    assert scheduler.get_stats()["a"].shown < 100
+    scheduler.reset_stats("a")
+    assert list(scheduler.get_stats()) == ["b"]
+    scheduler.reset_stats()
+    assert scheduler.get_stats() == {}
+    scheduler.shutdown()
@@ -0,0 +1,79 @@
+import math
+import os
+import random
+import struct
+import wave
+
+import pytest
+
+from livepng import LivePNG
+from livepng.audio import FakeAudioOutput
+from livepng.scheduler import SharedScheduler
+
+
+@pytest.fixture
+def tone_wav(tmp_path) -> str:
+    path = str(tmp_path / "tone.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"".join(struct.pack("<h", int(20000 * math.sin(i / 5))) for i in range(1600)))
+    return path
+
+
+def get_variant_choices(model: LivePNG) -> tuple[int, str, str]:
+    """Find a seed for which two speeches pick different variants"""
+    for seed in range(100):
+        rng = random.Random(seed)
+        first = str(model.current_expression.get_random_variant(rng=rng))
+        second = str(model.current_expression.get_random_variant(rng=rng))
+        if first != second and first != str(model.current_variant):
+            return seed, first, second
+    pytest.fail("No seed picks different variants")
+
+
+def test_queued_timelines_keep_their_variant(examples_dir, tone_wav):
+    model = LivePNG(os.path.join(examples_dir, "models", "kurisu", "model.json"), shared=False)
+    model.set_current_variant("0")
+    seed, first, second = get_variant_choices(model)
+    model.rng = random.Random(seed)
+    frames = []
+    model.subscribe_callback(frames.append)
+    scheduler = SharedScheduler(workers=1)
+    timelines = [model.speak(tone_wav, frame_rate=50, interrupt_others=False, scheduler=scheduler) for _ in range(2)]
+    # The variant changes with the first frame of every timeline, not when it is registered
+    assert str(model.current_variant) in ("0", first)
+    for timeline in timelines:
+        timeline.wait(5)
+    scheduler.shutdown()
+    variants = [os.path.basename(os.path.dirname(frame)) for frame in frames if frame is not None]
+    blocks = [variant for i, variant in enumerate(variants) if i == 0 or variants[i - 1] != variant]
+    assert blocks == [first, second]
+
+
+class RecordingOutput(FakeAudioOutput):
+    def __init__(self) -> None:
+        super().__init__(max_buffer=None)
+        self.data = []
+
+    def write(self, data: bytes):
+        self.data.append(bytes(data))
+        super().write(data)
+
+
+def test_queued_timelines_copy_the_audio(examples_dir, tone_wav):
+    model = LivePNG(os.path.join(examples_dir, "models", "basic", "model.json"), shared=False)
+    scheduler = SharedScheduler(workers=1)
+    with open(tone_wav, "rb") as f:
+        original = f.read()
+    outputs = [RecordingOutput(), RecordingOutput()]
+    timelines = [model.speak(tone_wav, frame_rate=50, interrupt_others=False, scheduler=scheduler, audio_output=output) for output in outputs]
+    # Overwrite the samples in place while the second timeline waits for the first one
+    with open(tone_wav, "r+b") as f:
+        f.seek(44)
+        f.write(bytes(len(original) - 44))
+    for timeline in timelines:
+        timeline.wait(5)
+    scheduler.shutdown()
+    assert outputs[1].data == [original[44:]]
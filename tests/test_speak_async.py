@@ -0,0 +1,67 @@
+import asyncio
+import os
+import wave
+
+import pytest
+
+from livepng import LivePNG
+from livepng.audio import FakeAudioOutput
+
+
+@pytest.fixture
+def model(examples_dir) -> LivePNG:
+    return LivePNG(os.path.join(examples_dir, "models", "basic", "model.json"), shared=False)
+
+
+@pytest.fixture
+def short_wav(tmp_path) -> str:
+    path = str(tmp_path / "short.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(bytes(range(256)) * 10)
+    return path
+
+
+class FailingOutput(FakeAudioOutput):
+    def write(self, data: bytes):
+        raise OSError("device lost")
+
+
+def test_output_errors_are_raised(model, short_wav):
+    async def speak():
+        await asyncio.wait_for(model.speak_async(short_wav, audio_output=FailingOutput()), 5)
+
+    with pytest.raises(OSError, match="device lost"):
+        asyncio.run(speak())
+
+
+def test_waiting_speeches_take_turns(model, short_wav):
+    finished = []
+
+    async def speak(name: str):
+        await model.speak_async(short_wav, frame_rate=50, interrupt_others=False)
+        finished.append(name)
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(speak("first"), speak("second"), speak("third")), 5)
+
+    asyncio.run(main())
+    assert sorted(finished) == ["first", "second", "third"]
+
+
+def test_cancelled_waiting_speech_releases_the_lock(model, short_wav):
+    async def main():
+        first = asyncio.create_task(model.speak_async(short_wav, frame_rate=50))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(model.speak_async(short_wav, frame_rate=50, interrupt_others=False))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await first
+        # The lock taken by the executor for the cancelled speech is given back
+        await asyncio.wait_for(model.speak_async(short_wav, frame_rate=50), 5)
+
+    asyncio.run(main())
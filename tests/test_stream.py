@@ -0,0 +1,114 @@
+import math
+import os
+import threading
+import wave
+
+import pytest
+
+import livepng.model
+from livepng import LivePNG
+from livepng.analyzers import WindowAnalyzer
+from livepng.stream import WavStream
+
+
+class FakeStream:
+    def __init__(self, fail: bool) -> None:
+        self.fail = fail
+        self.stopped = threading.Event()
+        self.closed = False
+
+    def write(self, data: bytes):
+        if self.fail:
+            raise OSError("Device unplugged")
+        # Stuck until the stream is stopped, and even after that
+        threading.Event().wait()
+
+    def stop_stream(self):
+        self.stopped.set()
+
+    def close(self):
+        self.closed = True
+
+
+class FakePyAudio:
+    def __init__(self, fail: bool) -> None:
+        self.stream = FakeStream(fail)
+
+    def __call__(self):
+        return self
+
+    def get_format_from_width(self, width: int) -> int:
+        return width
+
+    def open(self, **kwargs) -> FakeStream:
+        return self.stream
+
+    def terminate(self):
+        pass
+
+
+class FakePyAudioModule:
+    def __init__(self, fail: bool) -> None:
+        self.PyAudio = FakePyAudio(fail)
+
+
+@pytest.fixture
+def model(examples_dir) -> LivePNG:
+    return LivePNG(os.path.join(examples_dir, "models", "basic", "model.json"), shared=False)
+
+
+def speak(model: LivePNG, chunks: list[bytes]) -> threading.Thread:
+    thread = threading.Thread(target=model.speak_stream, args=(chunks, 8000), kwargs={"play_audio": True, "frame_rate": 50}, daemon=True)
+    thread.start()
+    return thread
+
+
+# The error of the device is raised in the audio thread
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_audio_thread_does_not_block_the_speech(model, monkeypatch):
+    module = FakePyAudioModule(fail=True)
+    monkeypatch.setattr(livepng.model, "pyaudio", module)
+    thread = speak(model, [bytes(320)] * 10)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert module.PyAudio.stream.closed
+
+
+def test_interrupt_with_a_stuck_audio_thread(model, monkeypatch):
+    module = FakePyAudioModule(fail=False)
+    monkeypatch.setattr(livepng.model, "pyaudio", module)
+    thread = speak(model, [bytes(320)] * 1000)
+    # Wait until the queue is full and the audio thread is stuck
+    threading.Event().wait(0.3)
+    model.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert module.PyAudio.stream.stopped.is_set()
+    # The speak lock was released
+    thread = speak(model, [])
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize("sample_width", [2, 3, 4])
+@pytest.mark.parametrize("method", ["mean", "rms", "peak"])
+def test_streamed_amplitudes_match_the_file(model, tmp_path, sample_width, method):
+    path = str(tmp_path / "stereo.wav")
+    scale = 1 << (8 * sample_width - 2)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(sample_width)
+        f.setframerate(8000)
+        # Different channels, the last window is incomplete
+        for i in range(8500):
+            left = int(scale * math.sin(i / 5) * (i % 800) / 800)
+            right = int(scale * math.sin(i / 7) / 3)
+            f.writeframes(left.to_bytes(sample_width, "little", signed=True) + right.to_bytes(sample_width, "little", signed=True))
+    expected = model.get_amplitudes_from_audio(path, frame_rate=10, method=method)
+    assert len(expected) == 11
+    assert model.get_amplitudes_from_audio(path, frame_rate=10, analyzer=WindowAnalyzer(method)) == pytest.approx(expected)
+    stream = WavStream(path, frame_rate=10)
+    windower = stream.get_windower()
+    assert [windower.amplitude(window, method) for window in stream] == pytest.approx(expected)
+    # Full scale on both channels is close to 1, whatever the sample width
+    assert max(expected) < 1
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from livepng import LivePNG
+from livepng.atlas import pack_model
+from livepng.calibration import Calibration, CalibratedAnalyzer, CalibrationCache
+from livepng.constants import MODEL_FILE_NAME, MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD
+from livepng.inspector import ModelInspector
+from livepng.objects import Style, Variant
+from livepng.thresholds import THRESHOLDS_KEY, calculate_intervals, get_model_threshold_errors, get_threshold_errors
+
+IMAGES = ["0.png", "1.png", "2.png"]
+
+
+def test_default_intervals():
+    assert calculate_intervals(1) == ((0.0, 1.0), )
+    assert calculate_intervals(2) == ((0, MOUTH_CLOSED_THRESHOLD), (MOUTH_OPEN_THRESHOLD, 1))
+    assert calculate_intervals(3) == ((0, MOUTH_CLOSED_THRESHOLD), (MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD), (MOUTH_OPEN_THRESHOLD, 1))
+
+
+def test_override_intervals():
+    assert calculate_intervals(4, {"closed": 0.1, "open": 0.4}) == pytest.approx([(0, 0.1), (0.1, 0.25), (0.25, 0.4), (0.4, 1)])
+    assert calculate_intervals(3, {"open": 0.5}) == ((0, MOUTH_CLOSED_THRESHOLD), (MOUTH_CLOSED_THRESHOLD, 0.5), (0.5, 1))
+    assert calculate_intervals(3, [0.1, 0.3]) == ((0, 0.1), (0.1, 0.3), (0.3, 1))
+    assert calculate_intervals(1, [0.1, 0.3]) == ((0.0, 1.0), )
+
+
+@pytest.mark.parametrize("thresholds", [{"closed": 0.1, "open": 0.2}, {"open": 0.5}, {}, [0.1, 0.2], [0, 1]])
+def test_valid_overrides(thresholds):
+    assert get_threshold_errors(thresholds, "the model") == []
+
+
+@pytest.mark.parametrize("thresholds, message", [
+    ({"closed": 0.01, "opened": 0.2}, "Unknown threshold opened"),
+    ({"closed": 2}, "between 0 and 1"),
+    ({"closed": True}, "between 0 and 1"),
+    ({"closed": "0.1"}, "between 0 and 1"),
+    ({"closed": 0.5, "open": 0.2}, "higher than the open one"),
+    ({"closed": 0.01}, None),
+    ({"closed": 0.1}, "higher than the open one"),
+    ([0.3, 0.2], "must be increasing"),
+    ([0.2, 0.2], "must be increasing"),
+    ([-0.1], "between 0 and 1"),
+    (0.1, "an object or a list"),
+    (None, "an object or a list"),
+])
+def test_invalid_overrides(thresholds, message):
+    errors = get_threshold_errors(thresholds, "the model")
+    if message is None:
+        assert errors == []
+    else:
+        assert len(errors) == 1 and message in errors[0]
+
+
+def test_list_length_must_match_the_images():
+    assert get_threshold_errors([0.1, 0.2], "v", 3) == []
+    assert "must have 1 values" in get_threshold_errors([0.1, 0.2], "v", 2)[0]
+    assert get_threshold_errors([0.1, 0.2], "v", 1) == []
+
+
+def make_model(model_thresholds=None, style_thresholds=None) -> dict:
+    style = {"expressions": {
+        "idle": {"0": list(IMAGES), "1": {"images": IMAGES[:2], THRESHOLDS_KEY: [0.3]}},
+        "talk": {"variants": {"0": list(IMAGES), "1": IMAGES[:2]}, THRESHOLDS_KEY: {"closed": 0.1, "open": 0.2}},
+    }}
+    if style_thresholds is not None:
+        style[THRESHOLDS_KEY] = style_thresholds
+    model = {"name": "test", "version": 1, "styles": {"default": style}}
+    if model_thresholds is not None:
+        model[THRESHOLDS_KEY] = model_thresholds
+    return model
+
+
+def test_model_threshold_errors():
+    assert get_model_threshold_errors(make_model({"closed": 0.05})) == []
+    # A list inherited by variants with a different number of images is checked against every variant
+    errors = get_model_threshold_errors(make_model([0.1]))
+    assert errors == ["The thresholds of variant default/idle/0 must have 2 values, one for every image after the first"]
+    broken = make_model(style_thresholds={"closed": 0.9, "open": 0.1})
+    broken["styles"]["default"]["expressions"]["bad"] = ["0.png"]
+    broken["styles"]["default"]["expressions"]["idle"]["2"] = "0.png"
+    errors = get_model_threshold_errors(broken)
+    assert len(errors) == 3
+    assert "style default" in errors[0] and "higher than the open one" in errors[0]
+    assert "Expression bad of style default is not an object" in errors
+    assert "The images of variant default/idle/2 must be a list" in errors
+
+
+def test_thresholds_are_inherited():
+    model = make_model({"closed": 0.05, "open": 0.5})
+    style = Style("default", model["styles"]["default"]["expressions"], thresholds=model[THRESHOLDS_KEY])
+    idle = style.get_expressions()["idle"].get_variants()
+    talk = style.get_expressions()["talk"].get_variants()
+    # Inherited from the model
+    assert idle["0"].get_thresholds()["0.png"] == (0, 0.05)
+    assert idle["0"].get_thresholds()["2.png"] == (0.5, 1)
+    # Variant override
+    assert idle["1"].get_thresholds() == {"0.png": (0, 0.3), "1.png": (0.3, 1)}
+    # Expression override, for every variant of the expression
+    assert talk["0"].get_thresholds()["1.png"] == (0.1, 0.2)
+    assert talk["1"].get_thresholds() == {"0.png": (0, 0.1), "1.png": (0.2, 1)}
+    assert talk["1"].get_image_index(0.15) == 0
+    assert talk["1"].get_image_index(0.25) == 1
+
+
+@pytest.fixture
+def object_form_model(tmp_path, examples_dir) -> str:
+    model_dir = tmp_path / "basic"
+    shutil.copytree(os.path.join(examples_dir, "models", "basic"), model_dir)
+    with open(model_dir / MODEL_FILE_NAME) as f:
+        model = json.load(f)
+    variants = model["styles"]["default"]["expressions"]["idle"]
+    variants["0"] = {"images": variants["0"], THRESHOLDS_KEY: [0.1, 0.2]}
+    model["styles"]["default"]["expressions"]["idle"] = {"variants": variants, THRESHOLDS_KEY: {"closed": 0.05}}
+    model[THRESHOLDS_KEY] = {"open": 0.5}
+    with open(model_dir / MODEL_FILE_NAME, "w") as f:
+        f.write(json.dumps(model, indent=2))
+    return str(model_dir)
+
+
+def test_inspector_keeps_object_forms(object_form_model):
+    with open(os.path.join(object_form_model, MODEL_FILE_NAME)) as f:
+        existing = json.load(f)
+    inspector = ModelInspector("basic")
+    assert not inspector.analyze_directory(object_form_model)
+    assert inspector.get_model_data() == existing
+
+
+def test_packed_model_keeps_object_forms(object_form_model):
+    model_file = os.path.join(object_form_model, MODEL_FILE_NAME)
+    packed = pack_model(model_file)
+    assert sorted(packed["atlas"]["images"]) == ["default/idle/0/" + image for image in IMAGES]
+    assert get_model_threshold_errors(packed) == []
+    model = LivePNG(model_file, shared=False)
+    assert model.get_current_variant().get_thresholds() == {"0.png": (0, 0.1), "1.png": (0.1, 0.2), "2.png": (0.2, 1)}
+    inspector = ModelInspector("basic")
+    assert not inspector.analyze_directory(object_form_model)
+    assert inspector.get_model_data() == packed
+
+
+def test_calibration_follows_the_bound_variant():
+    calibration = Calibration(0.01, 0.03)
+    assert calibration.apply(0.01) == pytest.approx(MOUTH_CLOSED_THRESHOLD)
+    assert calibration.apply(0.03) == pytest.approx(MOUTH_OPEN_THRESHOLD)
+    cache = CalibrationCache()
+    cache.put("voice", calibration)
+    variant = Variant("0", IMAGES, thresholds={"closed": 0.1, "open": 0.3})
+    analyzer = CalibratedAnalyzer(voice="voice", min_frames=1000, cache=cache).start(variant)
+    assert analyzer.thresholds == pytest.approx((0.1, 0.3))
+    # The voice amplitudes are mapped to the thresholds of the variant
+    values = analyzer.process_amplitudes([0.005, 0.01, 0.02, 0.03])
+    assert values == pytest.approx([0.05, 0.1, 0.2, 0.3])
+    assert variant.get_image_indexes(values) == [0, 1, 1, 2]
+    # With the default thresholds the variant with a list override uses its first and last boundary
+    listed = Variant("0", ["a", "b", "c", "d"], thresholds=[0.05, 0.1, 0.4])
+    assert CalibratedAnalyzer(cache=cache).start(listed).thresholds == pytest.approx((0.05, 0.4))
+    assert CalibratedAnalyzer(cache=cache).start(Variant("0", ["a"])).thresholds == (MOUTH_CLOSED_THRESHOLD, MOUTH_OPEN_THRESHOLD)
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from livepng.validator import ModelValidator
+
+
+@pytest.fixture
+def model_dir(tmp_path, examples_dir):
+    path = tmp_path / "basic"
+    shutil.copytree(os.path.join(examples_dir, "models", "basic"), path)
+    return path
+
+
+def load(model_dir) -> dict:
+    with open(model_dir / "model.json") as f:
+        return json.load(f)
+
+
+def test_valid_model_has_no_errors(model_dir):
+    assert ModelValidator.get_file_errors(str(model_dir / "model.json")) == []
+
+
+def test_subpath_image_names_are_accepted(model_dir):
+    variant = model_dir / "assets" / "default" / "idle" / "0"
+    os.mkdir(variant / "sub")
+    shutil.move(str(variant / "0.png"), str(variant / "sub" / "0.png"))
+    json_data = load(model_dir)
+    json_data["styles"]["default"]["expressions"]["idle"]["0"][0] = "sub/0.png"
+    assert ModelValidator.get_errors(json_data, str(model_dir)) == []
+    json_data["styles"]["default"]["expressions"]["idle"]["0"][0] = "sub/missing.png"
+    assert len(ModelValidator.get_errors(json_data, str(model_dir))) == 1
+
+
+def test_errors_are_aggregated(model_dir):
+    variant = model_dir / "assets" / "default" / "idle" / "0"
+    os.remove(variant / "0.png")
+    os.remove(variant / "1.png")
+    assert len(ModelValidator.get_file_errors(str(model_dir / "model.json"))) == 2
+
+
+def test_unreadable_directory_is_reported(model_dir, monkeypatch):
+    scandir = os.scandir
+
+    def denied(path):
+        if os.path.basename(path) == "idle":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", denied)
+    errors = ModelValidator.get_errors(load(model_dir), str(model_dir), workers=1)
+    assert len(errors) == 1
+    assert "Permission denied" in errors[0]
+    assert not ModelValidator.is_model_valid(load(model_dir), str(model_dir))
+
+
+def set_styles(model_dir, styles) -> str:
+    json_data = load(model_dir)
+    json_data["styles"] = styles
+    path = model_dir / "model.json"
+    with open(path, "w") as f:
+        json.dump(json_data, f)
+    return str(path)
+
+
+@pytest.mark.parametrize("styles, expected", [
+    (["a"], ["The styles of the model are not an object"]),
+    ({"s": 5}, ["Style s is not an object"]),
+    ({"default": {"expressions": ["idle"]}}, ["The expressions of style default are not an object"]),
+    ({"default": {"expressions": {"idle": ["0.png"]}}}, ["Expression idle of style default is not an object"]),
+    ({"default": {"expressions": {"idle": {"0": 5}}}}, ["The images of variant default/idle/0 must be a list"]),
+    ({"default": {"expressions": {"idle": {"0": {"images": "0.png"}}}}}, ["The images of variant default/idle/0 must be a list"]),
+    ({"default": {"expressions": {"idle": {"0": [5, None, "0.png"]}}}}, ["Image 5 of variant default/idle/0 is not a string", "Image None of variant default/idle/0 is not a string"]),
+])
+def test_wrong_types_are_reported(model_dir, styles, expected):
+    assert ModelValidator.get_file_errors(set_styles(model_dir, styles)) == expected
+
+
+def test_wrong_types_in_packed_models(model_dir):
+    json_data = load(model_dir)
+    json_data["atlas"] = {"file": "model.json", "images": {}}
+    json_data["styles"] = {"default": {"expressions": {"idle": {"0": [5]}, "talk": 3}}, "s": 5}
+    assert ModelValidator.get_errors(json_data, str(model_dir)) == [
+        "Image 5 of variant default/idle/0 is not a string",
+        "Style s is not an object",
+        "Expression talk of style default is not an object",
+    ]
+
+
+def test_broken_uploads_do_not_stop_the_batch(model_dir, tmp_path, monkeypatch):
+    valid = str(model_dir / "model.json")
+    not_object = tmp_path / "list.json"
+    not_object.write_text("[1, 2]")
+    broken = shutil.copytree(model_dir, tmp_path / "broken")
+    broken_path = set_styles(broken, ["a"])
+    results = ModelValidator.validate_files([valid, str(not_object), broken_path], workers=2)
+    assert results == {valid: [], str(not_object): ["The model is not an object"], broken_path: ["The styles of the model are not an object"]}
+    # Unexpected errors are reported for their file only
+    get_errors = ModelValidator.get_errors
+    def failing(json_data, path, workers=None):
+        if path == str(broken):
+            raise RecursionError("too deep")
+        return get_errors(json_data, path, workers)
+    monkeypatch.setattr(ModelValidator, "get_errors", staticmethod(failing))
+    results = ModelValidator.validate_files([valid, broken_path])
+    assert results == {valid: [], broken_path: ["Unable to validate " + broken_path + ": RecursionError: too deep"]}
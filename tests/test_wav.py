@@ -0,0 +1,151 @@
+import os
+import struct
+import wave
+
+import pytest
+from pydub import AudioSegment
+
+from livepng.wav import WAVE_FORMAT_EXTENSIBLE, WAVE_FORMAT_PCM, WavAudio, load_audio, load_wav, parse_wav_header
+
+
+def make_fmt(channels=1, sample_rate=8000, sample_width=2, audio_format=WAVE_FORMAT_PCM) -> bytes:
+    block_align = channels * sample_width
+    fmt = struct.pack("<HHIIHH", audio_format, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8)
+    return b"fmt " + struct.pack("<I", len(fmt)) + fmt
+
+
+def make_extensible_fmt(sub_format: int, channels=1, sample_rate=8000, sample_width=2) -> bytes:
+    block_align = channels * sample_width
+    fmt = struct.pack("<HHIIHH", WAVE_FORMAT_EXTENSIBLE, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8)
+    # cbSize, valid bits, channel mask and the sub format GUID
+    fmt += struct.pack("<HHI", 22, sample_width * 8, 0) + struct.pack("<H", sub_format) + bytes(14)
+    return b"fmt " + struct.pack("<I", len(fmt)) + fmt
+
+
+def make_chunk(chunk_id: bytes, data: bytes, size: int | None = None) -> bytes:
+    chunk = chunk_id + struct.pack("<I", len(data) if size is None else size) + data
+    return chunk + (b"\0" if len(data) & 1 else b"")
+
+
+def make_riff(*chunks: bytes) -> bytes:
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def test_plain_header():
+    data = make_riff(make_fmt(channels=2, sample_rate=44100), make_chunk(b"data", bytes(16)))
+    assert parse_wav_header(data) == (44100, 2, 2, 44, 16)
+
+
+def test_skips_other_chunks():
+    # An odd sized chunk is followed by a padding byte
+    data = make_riff(make_chunk(b"LIST", b"abc"), make_fmt(), make_chunk(b"fact", bytes(4)), make_chunk(b"data", bytes(8)))
+    sample_rate, sample_width, channels, offset, length = parse_wav_header(data)
+    assert (sample_rate, sample_width, channels, length) == (8000, 2, 1, 8)
+    assert data[offset - 8:offset - 4] == b"data"
+
+
+def test_extensible_header():
+    data = make_riff(make_extensible_fmt(WAVE_FORMAT_PCM, channels=2, sample_width=3), make_chunk(b"data", bytes(12)))
+    assert parse_wav_header(data)[:3] == (8000, 3, 2)
+    # IEEE float
+    assert parse_wav_header(make_riff(make_extensible_fmt(3), make_chunk(b"data", bytes(4)))) is None
+
+
+def test_streamed_sizes():
+    # An unknown size goes to the end of the file, the last incomplete frame is dropped
+    data = make_riff(make_fmt(channels=2), make_chunk(b"data", bytes(10), size=0xFFFFFFFF))
+    assert parse_wav_header(data)[3:] == (44, 8)
+    data = make_riff(make_fmt(), make_chunk(b"data", bytes(6), size=100))
+    assert parse_wav_header(data)[3:] == (44, 6)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"RIFF",
+    b"RIFX" + bytes(4) + b"WAVE",
+    b"RIFF" + bytes(4) + b"AVI ",
+    make_riff(make_fmt()),
+    make_riff(make_chunk(b"data", bytes(4)), make_fmt()),
+    make_riff(make_fmt(audio_format=3), make_chunk(b"data", bytes(4))),
+    make_riff(make_fmt(channels=0), make_chunk(b"data", bytes(4))),
+    make_riff(make_fmt(sample_width=8), make_chunk(b"data", bytes(8))),
+    make_riff(make_chunk(b"fmt ", make_extensible_fmt(WAVE_FORMAT_PCM)[8:24]), make_chunk(b"data", bytes(4))),
+])
+def test_unsupported_files(data):
+    assert parse_wav_header(data) is None
+
+
+def test_wrong_block_align():
+    fmt = struct.pack("<HHIIHH", WAVE_FORMAT_PCM, 2, 8000, 32000, 2, 16)
+    assert parse_wav_header(make_riff(make_chunk(b"fmt ", fmt), make_chunk(b"data", bytes(4)))) is None
+
+
+def write_wav(path, samples: list[int], channels=1, sample_width=2, sample_rate=8000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        if sample_width == 1:
+            # 8 bit samples are unsigned
+            f.writeframes(bytes(sample + 128 for sample in samples))
+        else:
+            f.writeframes(b"".join(sample.to_bytes(sample_width, "little", signed=True) for sample in samples))
+
+
+@pytest.mark.parametrize("sample_width, samples", [
+    (1, [-128, -1, 0, 1, 127, 5]),
+    (2, [-32768, -1, 0, 1, 32767, 5]),
+    (3, [-8388608, -1, 0, 1, 8388607, 5]),
+    (4, [-2147483648, -1, 0, 1, 2147483647, 5]),
+])
+def test_load_wav_samples(tmp_path, sample_width, samples):
+    path = tmp_path / "audio.wav"
+    write_wav(path, samples, channels=2, sample_width=sample_width)
+    audio = load_wav(str(path))
+    assert isinstance(audio, WavAudio)
+    assert (audio.frame_rate, audio.sample_width, audio.channels, audio.frame_count) == (8000, sample_width, 2, 3)
+    assert audio.duration_seconds == pytest.approx(3 / 8000)
+    # 24 bit samples are padded to 32 bit, like pydub does
+    assert list(audio.get_array_of_samples()) == ([sample << 8 for sample in samples] if sample_width == 3 else samples)
+    decoded = list(AudioSegment.from_file(str(path)).get_array_of_samples())
+    if sample_width == 3:
+        # pydub fills the low byte of negative 24 bit samples with ones
+        assert list(audio.get_array_of_samples()) == pytest.approx(decoded, abs=255)
+    else:
+        assert list(audio.get_array_of_samples()) == decoded
+    audio.close()
+
+
+def test_close_with_referenced_samples(tmp_path):
+    path = tmp_path / "audio.wav"
+    write_wav(path, [1, 2, 3, 4])
+    audio = load_wav(str(path))
+    samples = audio.get_array_of_samples()
+    with pytest.raises(BufferError):
+        audio.close()
+    samples.release()
+    audio.close()
+
+
+def test_load_audio(tmp_path, examples_dir, monkeypatch):
+    empty = tmp_path / "empty.wav"
+    empty.touch()
+    assert load_wav(str(empty)) is None
+    text = tmp_path / "text.wav"
+    text.write_bytes(b"not a wave file")
+    assert load_wav(str(text)) is None
+    example = os.path.join(examples_dir, "audio", "kuri.wav")
+    audio = load_audio(example)
+    assert isinstance(audio, WavAudio)
+    decoded = AudioSegment.from_file(example)
+    assert bytes(audio.raw_data) == decoded.raw_data
+    assert audio.duration_seconds == pytest.approx(decoded.duration_seconds)
+    audio.close()
+    # Not PCM, decoded by pydub
+    floats = tmp_path / "float.wav"
+    floats.write_bytes(make_riff(make_fmt(sample_width=4, audio_format=3), make_chunk(b"data", struct.pack("<ff", 0.5, -0.5))))
+    decoded_paths = []
+    monkeypatch.setattr(AudioSegment, "from_file", lambda path: decoded_paths.append(path) or decoded)
+    assert load_audio(str(floats)) is decoded
+    assert decoded_paths == [str(floats)]